@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+"""
+Startskript für den Lastgenerator der Fernsteuerung. Betreibt ein Fahrzeug mit
+Motor-Attrappen und misst über localhost Durchsatz, Verluste und Latenz der
+Steuerbefehle. Benötigt keine GPIO-Hardware. Siehe `carbot/benchmark.py`.
+"""
+
+import argparse, json, sys
+from carbot import benchmark
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("-c", "--clients", type=int, default=4, help="Anzahl der steuernden Clients (Standard: 4)")
+    parser.add_argument("-r", "--rate", type=float, default=100, help="Befehle je Sekunde und Client (Standard: 100)")
+    parser.add_argument("-d", "--duration", type=float, default=5.0, help="Dauer der Messung in Sekunden (Standard: 5)")
+    parser.add_argument("-o", "--observers", type=int, default=0, help="Anzahl zusätzlicher Beobachter mit Status-Abonnement")
+    parser.add_argument("--observer-rate", type=float, default=50, help="Aktualisierungen je Sekunde und Beobachter (Standard: 50)")
+    parser.add_argument("--json", action="store_true", help="JSON statt Binärformat verwenden")
+    parser.add_argument("--frequency", type=int, default=200, help="Takt des Fahrzeugs (Standard: 200)")
+    parser.add_argument("--asyncio", action="store_true", help="Fahrzeug mit loop_async() betreiben")
+    parser.add_argument("--port", type=int, default=19876, help="UDP-Port auf localhost (Standard: 19876)")
+    parser.add_argument("--raw", action="store_true", help="Ergebnisse als JSON ausgeben")
+    parser.add_argument("--check-observers", action="store_true", help="Nur prüfen, ob reine Beobachter den vollständigen Status erhalten")
+    args = parser.parse_args()
+
+    if args.check_observers:
+        results = benchmark.check_observers(use_asyncio=args.asyncio, port=args.port)
+
+        if args.raw:
+            json.dump(results, sys.stdout, indent=4)
+            print()
+            ok = all(missing == [] for missing in results.values())
+        else:
+            ok = benchmark.report_observers(results)
+
+        if not ok:
+            sys.exit(1)
+
+        return
+
+    result = benchmark.run(
+        clients          = args.clients,
+        rate             = args.rate,
+        duration_s       = args.duration,
+        observers        = args.observers,
+        observer_rate    = args.observer_rate,
+        binary           = not args.json,
+        update_frequency = args.frequency,
+        use_asyncio      = args.asyncio,
+        port             = args.port,
+    )
+
+    if args.raw:
+        json.dump(result, sys.stdout, indent=4)
+        print()
+    else:
+        benchmark.report(result)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -1,11 +1,16 @@
 """
 Geklautes Beispiel von pycamera2: Auf dem Port 8000 kann im Browser
 ein Livestream von der Fahrzeugkamera betrachtet werden.
+
+Jedes Bild des Streams enthält im Header `X-Timestamp` den Zeitpunkt (time.time),
+an dem es fertig kodiert war. Die Fernsteuerung berechnet daraus die Verzögerung
+von der Kamera bis zum Bildschirm.
 """
 
 import io
 import logging
 import socketserver
+import time
 from http import server
 from threading import Condition
 
@@ -45,11 +50,13 @@ output = None
 class StreamingOutput(io.BufferedIOBase):
     def __init__(self):
         self.frame = None
+        self.timestamp = None
         self.condition = Condition()
 
     def write(self, buf):
         with self.condition:
             self.frame = buf
+            self.timestamp = time.time()
             self.condition.notify_all()
 
 class StreamingHandler(server.BaseHTTPRequestHandler):
@@ -80,10 +87,12 @@ class StreamingHandler(server.BaseHTTPRequestHandler):
                     with output.condition:
                         output.condition.wait()
                         frame = output.frame
+                        timestamp = output.timestamp
 
                     self.wfile.write(b'--FRAME\r\n')
                     self.send_header('Content-Type', 'image/jpeg')
                     self.send_header('Content-Length', len(frame))
+                    self.send_header('X-Timestamp', f'{timestamp:.6f}')
                     self.end_headers()
                     self.wfile.write(frame)
                     self.wfile.write(b'\r\n')
@@ -0,0 +1,415 @@
+"""
+Lastgenerator und Latenzmessung für die Fernsteuerung über UDP. Startet ein echtes `Vehicle`
+mit `UDPRemoteControl`, dessen Motoren durch `MockMotor`-Objekte ersetzt werden, und lässt
+es von mehreren synthetischen Clients über localhost steuern. Es wird somit weder ein
+Raspberry Pi noch GPIO-Hardware benötigt, um Änderungen an der Netzwerkschicht vor dem
+Aufspielen auf ein Fahrzeug zu prüfen.
+
+Jeder Client läuft in einem eigenen Prozess, damit er nicht mit dem Fahrzeug um das GIL
+konkurriert, und sendet wie `RemoteConnection` fortlaufend nummerierte `set`-Befehle für
+`target_speed` mit der gewünschten Frequenz. Die gesendeten Werte sind dabei eindeutig und
+so gewählt, dass sie unverändert beim linken Motor ankommen. Aus dem Sendezeitpunkt eines
+Werts und dem Zeitpunkt, zu dem das Fahrzeug ihn an den Motor schreibt, ergibt sich die
+Latenz vom Befehl bis zum Motor. Optional melden sich zusätzliche Beobachter für
+Statusaktualisierungen an, um auch diesen Pfad zu belasten.
+
+Zusätzlich prüft `check_observers()`, ob reine Beobachter (ein Client, der nur `subscribe`
+sendet, und die Multicast-Gruppe) den vollständigen Status erhalten, ohne dass irgendein
+Client einen Steuerbefehl oder eine Statusabfrage sendet.
+
+Aufruf über das Startskript `benchmark.py`, siehe `./benchmark.py --help`.
+"""
+
+import asyncio, multiprocessing, queue, socket, threading, time
+from carbot.remote import protocol
+from carbot.remote.udp import UDPRemoteControl
+from carbot.state import VehicleState
+from carbot.vehicle import Vehicle
+
+class MockMotor:
+    """
+    Ersatz für `gpiozero.Motor` ohne Hardwarezugriff. Merkt sich jeden geschriebenen Wert
+    zusammen mit dem Zeitpunkt des Schreibens (time.perf_counter).
+    """
+
+    def __init__(self):
+        """
+        Konstruktor.
+        """
+        self._value = 0.0
+        self.writes = []
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self.writes.append((time.perf_counter(), value))
+        self._value = value
+
+# Eindeutige Geschwindigkeiten im Bereich [0.5, 1.0), die das Fahrzeug unverändert an den
+# Motor weitergibt (über der Mindestgeschwindigkeit von 0.4, ohne Lenkung). Jeder Client
+# erhält einen eigenen Bereich.
+_VALUE_BASE  = 0.5
+_VALUE_STEP  = 1e-10
+_VALUE_RANGE = 10_000_000
+
+MAX_CLIENTS = int(0.5 / (_VALUE_STEP * _VALUE_RANGE))
+
+def _value(client, count):
+    """
+    Eindeutiger Geschwindigkeitswert für den `count`-ten Befehl eines Clients.
+    """
+    return _VALUE_BASE + (client * _VALUE_RANGE + count % _VALUE_RANGE) * _VALUE_STEP
+
+def _negotiate(socket_, address, binary):
+    """
+    Nachrichtenformat wie `RemoteConnection` aushandeln. Gibt das vereinbarte Format zurück.
+    """
+    if not binary:
+        return protocol.JSON
+
+    hello = {"cmd": "hello", "protocols": [protocol.BINARY, protocol.JSON], "version": protocol.VERSION}
+    socket_.settimeout(0.2)
+
+    for _ in range(25):
+        socket_.sendto(protocol.encode(hello)[0], address)
+
+        try:
+            while True:
+                message = protocol.decode(socket_.recvfrom(65535)[0])[0]
+
+                if message.get("cmd") == "hello_response":
+                    return message.get("protocol", protocol.JSON)
+        except socket.timeout:
+            continue
+
+    return protocol.JSON
+
+def _client_process(client, address, rate, duration_s, binary, start, results):
+    """
+    Prozess eines synthetischen Clients, der Steuerbefehle mit fester Frequenz sendet.
+    Liefert über die Queue `results` das vereinbarte Format, die Anzahl verspäteter
+    Sendezeitpunkte und ein Dictionary mit den Sendezeitpunkten je Wert.
+    """
+    socket_   = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    protocol_ = _negotiate(socket_, address, binary)
+    sent      = {}
+    late      = 0
+    period_s  = 1.0 / rate
+
+    start.wait()
+
+    next_s = time.perf_counter()
+    end_s  = next_s + duration_s
+    count  = 0
+
+    while True:
+        now_s = time.perf_counter()
+
+        if now_s >= end_s:
+            break
+
+        if now_s < next_s:
+            time.sleep(next_s - now_s)
+        elif now_s - next_s > period_s:
+            # Client kommt nicht hinterher: Nicht nachholen, sondern neu takten
+            late  += 1
+            next_s = now_s
+
+        next_s += period_s
+
+        value    = _value(client, count)
+        count   += 1
+        datagram = protocol.encode({"cmd": "set", "attr": "target_speed", "value": value, "seq": count}, protocol_)[0]
+
+        sent[value] = time.perf_counter()
+        socket_.sendto(datagram, address)
+
+    results.put(("client", client, protocol_, late, sent))
+
+def _observer_process(observer, address, rate, duration_s, binary, start, results):
+    """
+    Prozess eines Beobachters, der den Fahrzeugstatus abonniert und jede Aktualisierung
+    bestätigt. Liefert über die Queue `results` die Anzahl empfangener Aktualisierungen.
+    """
+    socket_   = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    protocol_ = _negotiate(socket_, address, binary)
+    updates   = 0
+    sequence  = 0
+
+    start.wait()
+
+    def _send(command):
+        nonlocal sequence
+        sequence += 1
+
+        for datagram in protocol.encode(dict(command, seq=sequence), protocol_):
+            socket_.sendto(datagram, address)
+
+    _send({"cmd": "subscribe", "rate": rate})
+
+    socket_.settimeout(0.1)
+    reassembler = protocol.Reassembler()
+    end_s = time.perf_counter() + duration_s
+
+    while time.perf_counter() < end_s:
+        try:
+            message = reassembler.add(socket_.recvfrom(65535)[0])
+        except socket.timeout:
+            continue
+
+        if message and message.get("cmd") == "status_update":
+            updates += 1
+            _send({"cmd": "ack", "frame": message.get("frame", 0)})
+
+    _send({"cmd": "unsubscribe"})
+    results.put(("observer", observer, protocol_, 0, updates))
+
+def percentile(sorted_values, fraction):
+    """
+    Perzentil einer aufsteigend sortierten Liste (nächstgelegener Rang).
+    """
+    if not sorted_values:
+        return float("nan")
+
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+def run(clients=4, rate=100, duration_s=5.0, observers=0, observer_rate=50, binary=True,
+        update_frequency=200, use_asyncio=False, port=19876):
+    """
+    Benchmark durchführen und die Ergebnisse als Dictionary zurückgeben. Parameter:
+        * clients: Anzahl der Clients, die Steuerbefehle senden
+        * rate: Befehle je Sekunde und Client
+        * duration_s: Dauer der Messung in Sekunden
+        * observers: Anzahl zusätzlicher Clients, die nur den Status abonnieren
+        * observer_rate: Abonnierte Aktualisierungen je Sekunde und Beobachter
+        * binary: Binärformat aushandeln statt JSON zu verwenden
+        * update_frequency: Takt des Fahrzeugs
+        * use_asyncio: Fahrzeug mit `loop_async()` statt `loop_forever()` betreiben
+        * port: UDP-Port des Fahrzeugs auf localhost
+    """
+    if not 1 <= clients <= MAX_CLIENTS:
+        raise ValueError(f"Anzahl der Clients muss zwischen 1 und {MAX_CLIENTS} liegen")
+
+    # Fahrzeug mit Attrappen statt echter Motoren
+    motor_left     = MockMotor()
+    motor_right    = MockMotor()
+    vehicle        = Vehicle(motor_left, motor_right)
+    remote_control = UDPRemoteControl("127.0.0.1", port)
+    vehicle.add_sensor("remote:udp", remote_control)
+
+    if use_asyncio:
+        target = lambda: asyncio.run(vehicle.loop_async(update_frequency))
+    else:
+        target = lambda: vehicle.loop_forever(update_frequency)
+
+    vehicle_thread = threading.Thread(target=target)
+    vehicle_thread.daemon = True
+    vehicle_thread.start()
+
+    # Clients in eigenen Prozessen starten. "spawn" statt "fork", da der Prozess bereits
+    # mehrere Threads besitzt.
+    # https://docs.python.org/3/library/multiprocessing.html#contexts-and-start-methods
+    context   = multiprocessing.get_context("spawn")
+    start     = context.Event()
+    results   = context.Queue()
+    address   = ("127.0.0.1", port)
+    processes = []
+
+    for client in range(clients):
+        processes.append(context.Process(target=_client_process, args=(client, address, rate, duration_s, binary, start, results)))
+
+    for observer in range(observers):
+        processes.append(context.Process(target=_observer_process, args=(observer, address, observer_rate, duration_s, binary, start, results)))
+
+    for process in processes:
+        process.daemon = True
+        process.start()
+
+    # Warten, bis sich alle Clients angemeldet haben, dann gemeinsam loslegen
+    time.sleep(0.5)
+    vehicle.reset_perf_stats()
+    stats_before = remote_control.command_stats
+    start.set()
+
+    sent      = {}
+    late      = 0
+    updates   = 0
+    protocols = set()
+
+    for _ in processes:
+        try:
+            kind, _, protocol_, late_, data = results.get(timeout=duration_s + 30)
+        except queue.Empty:
+            raise RuntimeError("Zeitüberschreitung beim Warten auf die Clients")
+
+        protocols.add(protocol_)
+
+        if kind == "client":
+            sent.update(data)
+            late += late_
+        else:
+            updates += data
+
+    for process in processes:
+        process.join()
+
+    # Letzte Befehle noch abarbeiten lassen
+    time.sleep(max(0.1, 5.0 / update_frequency))
+
+    stats_after = remote_control.command_stats
+    commands    = {key: stats_after[key] - stats_before[key] for key in stats_after if key != "queued"}
+
+    # Latenz aller Werte, die beim Motor angekommen sind
+    latencies_s = sorted(
+        written_s - sent[value]
+        for written_s, value in list(motor_left.writes)
+        if value in sent
+    )
+
+    perf_stats = vehicle.perf_stats()
+
+    return {
+        "clients":          clients,
+        "rate":             rate,
+        "duration_s":       duration_s,
+        "observers":        observers,
+        "protocols":        sorted(protocols),
+        "sent":             len(sent),
+        "late":             late,
+        "received":         commands["received"],
+        "lost":             len(sent) - commands["received"],
+        "dropped_stale":    commands["dropped_stale"],
+        "dropped_overflow": commands["dropped_overflow"],
+        "coalesced":        commands["coalesced"],
+        "applied":          len(latencies_s),
+        "latency_s": {
+            "p50": percentile(latencies_s, 0.50),
+            "p90": percentile(latencies_s, 0.90),
+            "p99": percentile(latencies_s, 0.99),
+            "max": latencies_s[-1] if latencies_s else float("nan"),
+        },
+        "status_updates":   updates,
+        "tick":             perf_stats["tick"],
+        "scheduler":        perf_stats["scheduler"],
+    }
+
+def check_observers(use_asyncio=False, port=19877, multicast=("239.255.67.67", 19878), timeout_s=2.0):
+    """
+    Prüfen, ob reine Beobachter die Fahrzeugparameter erhalten. Hierfür wird ein Fahrzeug mit
+    Statusmeldungen an die Multicast-Gruppe `multicast` gestartet. Ein Client sendet nur
+    `subscribe`, ein zweiter tritt nur der Multicast-Gruppe bei. Keiner sendet einen anderen
+    Befehl. Parameter:
+        * use_asyncio: Fahrzeug mit `loop_async()` statt `loop_forever()` betreiben
+        * port: UDP-Port des Fahrzeugs auf localhost
+        * multicast: Tupel (Gruppe, Port) für die Statusmeldungen per Multicast
+        * timeout_s: Maximale Wartezeit auf den ersten Keyframe
+
+    Gibt je Empfänger (`subscriber` und `multicast`) die Liste der im ersten Keyframe
+    fehlenden Einträge zurück, oder `None`, wenn kein Keyframe eingetroffen ist.
+    """
+    vehicle        = Vehicle(MockMotor(), MockMotor())
+    remote_control = UDPRemoteControl("127.0.0.1", port, multicast=multicast)
+    vehicle.add_sensor("remote:udp", remote_control)
+    vehicle.target_speed = 0.5
+
+    if use_asyncio:
+        target = lambda: asyncio.run(vehicle.loop_async())
+    else:
+        target = lambda: vehicle.loop_forever()
+
+    vehicle_thread = threading.Thread(target=target)
+    vehicle_thread.daemon = True
+    vehicle_thread.start()
+
+    expected = VehicleState.FIELDS + ("sensor_status", "sound_status")
+    results  = {"subscriber": None, "multicast": None}
+
+    def _receive(name, socket_):
+        reassembler = protocol.Reassembler()
+        end_s = time.monotonic() + timeout_s
+        socket_.settimeout(0.1)
+
+        while time.monotonic() < end_s:
+            try:
+                message = reassembler.add(socket_.recvfrom(65535)[0])
+            except socket.timeout:
+                continue
+
+            if message and message.get("cmd") == "status_update" and message.get("base", 0) == 0:
+                results[name] = [field for field in expected if field not in message.get("data", {})]
+                break
+
+        socket_.close()
+
+    multicast_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    multicast_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    multicast_socket.bind(("", multicast[1]))
+    multicast_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+        socket.inet_aton(multicast[0]) + socket.inet_aton("0.0.0.0"))
+
+    subscriber_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    threads = [
+        threading.Thread(target=_receive, args=("multicast", multicast_socket)),
+        threading.Thread(target=_receive, args=("subscriber", subscriber_socket)),
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    # Warten, bis das Fahrzeug läuft, dann nur abonnieren
+    time.sleep(0.2)
+    subscriber_socket.sendto(protocol.encode({"cmd": "subscribe", "rate": 20}, protocol.JSON)[0], ("127.0.0.1", port))
+
+    for thread in threads:
+        thread.join()
+
+    return results
+
+def report_observers(results):
+    """
+    Ergebnis von `check_observers()` lesbar ausgeben. Gibt True zurück, wenn alle
+    Beobachter den vollständigen Status erhalten haben.
+    """
+    ok = True
+
+    for name, missing in results.items():
+        if missing is None:
+            print(f"{name:<12} kein Keyframe empfangen")
+            ok = False
+        elif missing:
+            print(f"{name:<12} fehlende Einträge: {', '.join(missing)}")
+            ok = False
+        else:
+            print(f"{name:<12} vollständig")
+
+    return ok
+
+def report(result):
+    """
+    Ergebnisse eines Benchmarks lesbar ausgeben.
+    """
+    sent = max(result["sent"], 1)
+
+    print(f"{result['clients']} Clients × {result['rate']} Befehle/s, {result['duration_s']:.1f} s, "
+          f"Format: {', '.join(result['protocols'])}, Beobachter: {result['observers']}")
+    print()
+    print(f"Gesendet:              {result['sent']:>10} ({result['sent'] / result['duration_s']:.0f}/s, {result['late']} verspätet)")
+    print(f"Empfangen:             {result['received']:>10} ({result['received'] / result['duration_s']:.0f}/s)")
+    print(f"Verloren (Netzwerk):   {result['lost']:>10} ({100 * result['lost'] / sent:.2f} %)")
+    print(f"Verworfen (veraltet):  {result['dropped_stale']:>10} ({100 * result['dropped_stale'] / sent:.2f} %)")
+    print(f"Verworfen (Überlauf):  {result['dropped_overflow']:>10} ({100 * result['dropped_overflow'] / sent:.2f} %)")
+    print(f"Zusammengefasst:       {result['coalesced']:>10}")
+    print(f"Beim Motor angekommen: {result['applied']:>10}")
+
+    if result["observers"]:
+        print(f"Statusaktualisierungen:{result['status_updates']:>10} ({result['status_updates'] / result['duration_s'] / result['observers']:.1f}/s je Beobachter)")
+
+    print()
+    print("Latenz Befehl → Motor: " + "  ".join(f"{name} {value * 1000:.2f} ms" for name, value in result["latency_s"].items()))
+    print("Laufzeit je Takt:      " + "  ".join(f"{name[:-2]} {result['tick'][name] * 1000:.3f} ms" for name in ("p50_s", "p99_s", "max_s")))
+    print(f"Takte:                 {result['scheduler'].get('ticks', 0)} (Überschreitungen: {result['scheduler'].get('overruns', 0)}, "
+          f"ausgelassen: {result['scheduler'].get('skipped_ticks', 0)})")
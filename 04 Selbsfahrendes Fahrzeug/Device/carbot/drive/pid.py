@@ -0,0 +1,73 @@
+from carbot.vehicle import clip
+
+# https://de.wikipedia.org/wiki/Regler#PID-Regler
+# https://en.wikipedia.org/wiki/Integral_windup
+
+class PIDController:
+    """
+    Einfacher PID-Regler, der aus einer Regelabweichung eine Stellgröße berechnet:
+
+        Stellgröße = kp * Abweichung + ki * Integral + kd * Ableitung
+
+    Der D-Anteil wird mit einem Tiefpass erster Ordnung geglättet, damit das Rauschen
+    der Messwerte bei hohen Taktraten nicht zu unruhigem Lenken führt. Gegen ein
+    Aufschaukeln des I-Anteils (Windup) wird das Integral begrenzt und nicht weiter
+    aufsummiert, solange die Stellgröße am Anschlag steht und die Abweichung weiter
+    in dieselbe Richtung zeigt.
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, derivative_tau_s=0.02, output_limits=(-1.0, 1.0), integral_limit=1.0):
+        """
+        Konstruktor. Parameter:
+            * kp: Verstärkung des P-Anteils
+            * ki: Verstärkung des I-Anteils
+            * kd: Verstärkung des D-Anteils
+            * derivative_tau_s: Zeitkonstante des Tiefpasses für den D-Anteil in Sekunden
+            * output_limits: Minimale und maximale Stellgröße
+            * integral_limit: Betragsmäßige Obergrenze für den I-Anteil (nach Multiplikation mit ki)
+        """
+        self.kp               = kp
+        self.ki               = ki
+        self.kd               = kd
+        self.derivative_tau_s = derivative_tau_s
+        self.output_limits    = output_limits
+        self.integral_limit   = integral_limit
+
+        self.reset()
+
+    def reset(self):
+        """
+        Internen Zustand zurücksetzen, z.B. nachdem die Regelung unterbrochen war.
+        """
+        self._integral   = 0.0
+        self._derivative = 0.0
+        self._prev_error = None
+        self.output      = 0.0
+
+    def update(self, error, dt_s):
+        """
+        Neue Regelabweichung verarbeiten und die neue Stellgröße zurückgeben. `dt_s` ist
+        die seit dem letzten Aufruf vergangene Zeit in Sekunden.
+        """
+        min_output, max_output = self.output_limits
+
+        # D-Anteil mit Tiefpass glätten
+        if self._prev_error is not None and dt_s > 0:
+            raw_derivative = (error - self._prev_error) / dt_s
+            alpha = dt_s / (self.derivative_tau_s + dt_s)
+            self._derivative += alpha * (raw_derivative - self._derivative)
+
+        self._prev_error = error
+
+        # I-Anteil nur aufsummieren, wenn die Stellgröße dadurch nicht weiter in die Sättigung läuft
+        if self.ki and dt_s > 0:
+            saturated = self.output >= max_output and error > 0 \
+                     or self.output <= min_output and error < 0
+
+            if not saturated:
+                limit = self.integral_limit / self.ki
+                self._integral = clip(self._integral + error * dt_s, -abs(limit), abs(limit))
+
+        output = self.kp * error + self.ki * self._integral + self.kd * self._derivative
+        self.output = clip(output, min_output, max_output)
+        return self.output
@@ -1,11 +1,15 @@
 import random, time
 
+from carbot.drive.pid import PIDController
 from carbot.sensors.base import SensorBase
+from carbot.state import LINE_SENSOR_COUNT
 
 class BackAndForthDrive(SensorBase):
     """
     Fahrstrategie: Vor- und zurück ohne zu lenken.
     """
+    update_frequency = 10
+
     def __init__(self, direction_change):
         """
         Konsturktor. Parameter:
@@ -36,6 +40,8 @@ class RandomDrive(SensorBase):
     """
     Fahrstrategie: Willkürlich rumkurven.
     """
+    update_frequency = 10
+
     def __init__(self, direction_change):
         """
         Konstruktor. Parameter:
@@ -66,88 +72,90 @@ class RandomDrive(SensorBase):
             speed = random.randint(4, 10) / 10.0
             vehicle.target_speed = speed
 
+def _line_error(mask):
+    """
+    Berechnet die seitliche Abweichung der Fahrlinie [-1...1] aus der Bitmaske des
+    Linesensors als Schwerpunkt der aktiven Messpunkte. Positive Werte bedeuten, dass
+    die Linie unter den ersten Messpunkten liegt und nach rechts gelenkt werden muss.
+    Gibt None zurück, wenn keine Linie erkannt wurde.
+    """
+    bits = [bit for bit in range(LINE_SENSOR_COUNT) if mask & (1 << bit)]
+
+    if not bits:
+        return None
+
+    center = (LINE_SENSOR_COUNT - 1) / 2
+    return (center - sum(bits) / len(bits)) / center
+
+# Vorberechnete Abweichung für jede mögliche Bitmaske
+LINE_ERRORS = tuple(_line_error(mask) for mask in range(1 << LINE_SENSOR_COUNT))
+
 class FollowLineDrive(SensorBase):
     """
     Fahrstrategie: Bodenlinie folgen. Funktioniert nur, wenn der LineSensor
     aktiv ist und die Fahrlinie erkennt. Das Fahrzeug wird entsprechend der
     erkannten Bodenlinie vorwärts gelenkt. Bei nicht erkannter Linie fährt
     es für ein paar Sekunden langsam rückwärts, um die Linie zu suchen.
+
+    Die Lenkung erfolgt stufenlos mit einem PID-Regler. Die Abweichung von der
+    Linie wird hierfür in jedem Takt aus einer vorberechneten Tabelle mit einem
+    Eintrag je möglicher Bitmaske des Linesensors gelesen.
     """
 
     STATUS_DRIVING, STATUS_SEARCHING, STATUS_LOST = 0, 1, 2
 
-    def __init__(self, forward_speed=1.0, backward_speed=-0.5, search_timeout_s=5):
+    def __init__(self, forward_speed=1.0, backward_speed=-0.5, search_timeout_s=5, kp=0.8, ki=0.0, kd=0.01, derivative_tau_s=0.05):
         """
         Konstruktor. Parameter:
 
             * forward_speed: Normale Vorwärtsfahrgeschwindigkeit
             * backward_speed: Rückwärtsfahrgeschwindigkeit beim Suchen der Fahrlinie
             * search_timeout_s: Maximale Zeit zum Suchen der Fahrlinie in Sekunden
+            * kp, ki, kd: Verstärkungen des PID-Reglers für die Lenkung
+            * derivative_tau_s: Zeitkonstante zur Glättung des D-Anteils in Sekunden
         """
-        self._forward_speed     = forward_speed
-        self._backward_speed    = backward_speed
+        super().__init__()
+
+        self._forward_speed     = abs(forward_speed)
+        self._backward_speed    = -abs(backward_speed)
         self._search_timeout_s  = search_timeout_s
         self._search_start_time = 0
+        self._prev_time_s       = None
 
-        if self._forward_speed < 1:
-            self._forward_speed *= -1
-        
-        if self._backward_speed > 1:
-            self._backward_speed *= -1
-
+        self.pid = PIDController(kp, ki, kd, derivative_tau_s=derivative_tau_s)
         self.status = self.STATUS_DRIVING
 
     def update(self, vehicle):
         """
         Sensor prüfen und Fahrzeugparameter anpassen.
         """
-        if self.status == self.STATUS_SEARCHING:
-            # Fahrlinie suchen, aber nur innerhalb der gegebenen Zeit.
-            # Sonst wechselt der Status auf STATUS_LOST, da die Fahrlinie nicht gefunden wurde.
-            if time.monotonic() - self._search_start_time > self._search_timeout_s:
-                self.status = self.STATUS_LOST
-            else:
-                vehicle.target_speed = self._backward_speed
-                vehicle.direction = 0
-        else:
-            # Normale Vorwärtsfahrt, sofern eine Fahrlinie erkannt wurde.
-            # Falls nein, Suche starten. Es sei denn, es wurde schon erfolglos gesucht.
-            if vehicle.line_pattern == (0,0,0,0,0):
-                if self.status != self.STATUS_LOST:
-                    self.status = self.STATUS_SEARCHING
-                return
-
-            self.status = self.STATUS_DRIVING
-            vehicle.target_speed = self._forward_speed
-
-            # Vorwärts fahren
-            if vehicle.line_pattern == (1,1,1,1,1) \
-            or vehicle.line_pattern == (0,1,1,1,0) \
-            or vehicle.line_pattern == (0,0,1,0,0):
-                vehicle.direction = 0
-
-            # Nach links korrigieren
-            elif vehicle.line_pattern == (0,1,1,1,1):
-                vehicle.direction = -0.2
-            elif vehicle.line_pattern == (0,0,1,1,1):
-                vehicle.direction = -0.4
-            elif vehicle.line_pattern == (0,0,0,1,1):
-                vehicle.direction = -0.6
-            elif vehicle.line_pattern == (0,0,0,0,1):
-                vehicle.direction = -0.8
-            elif vehicle.line_pattern == (0,0,1,1,0) \
-              or vehicle.line_pattern == (0,0,0,1,0):
-                vehicle.direction = -0.5
-            
-            # Nach rechts korrigieren
-            elif vehicle.line_pattern == (1,1,1,1,0):
-                vehicle.direction = 0.2
-            elif vehicle.line_pattern == (1,1,1,0,0):
-                vehicle.direction = 0.4
-            elif vehicle.line_pattern == (1,1,0,0,0):
-                vehicle.direction = 0.6
-            elif vehicle.line_pattern == (1,0,0,0,0):
-                vehicle.direction = 0.8
-            elif vehicle.line_pattern == (0,1,1,0,0) \
-              or vehicle.line_pattern == (0,1,0,0,0):
-                vehicle.direction = 0.5
+        error = LINE_ERRORS[vehicle.line_mask]
+
+        if error is None:
+            # Keine Fahrlinie erkannt: Suche starten. Es sei denn, es wurde schon erfolglos gesucht.
+            # Die Suche dauert nur innerhalb der gegebenen Zeit. Sonst wechselt der Status auf
+            # STATUS_LOST, da die Fahrlinie nicht gefunden wurde.
+            if self.status == self.STATUS_DRIVING:
+                self.status = self.STATUS_SEARCHING
+                self._search_start_time = time.monotonic()
+                self._prev_time_s = None
+                self.pid.reset()
+
+            if self.status == self.STATUS_SEARCHING:
+                if time.monotonic() - self._search_start_time > self._search_timeout_s:
+                    self.status = self.STATUS_LOST
+                else:
+                    vehicle.target_speed = self._backward_speed
+                    vehicle.direction = 0
+
+            return
+
+        # Normale Vorwärtsfahrt, da eine Fahrlinie erkannt wurde
+        self.status = self.STATUS_DRIVING
+        vehicle.target_speed = self._forward_speed
+
+        now_s = time.monotonic()
+        dt_s  = now_s - self._prev_time_s if self._prev_time_s is not None else 0.0
+        self._prev_time_s = now_s
+
+        vehicle.direction = self.pid.update(error, dt_s)
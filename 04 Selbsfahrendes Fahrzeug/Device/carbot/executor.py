@@ -0,0 +1,161 @@
+import math, time
+from carbot.profiler import TimingHistogram
+
+class SensorExecutor:
+    """
+    Ruft die Sensoren des Fahrzeugs mit ihrer jeweils eigenen Frequenz auf. Hierfür
+    wird einmalig ein Ablaufplan berechnet, der für jeden Sensor das Aufrufintervall in
+    Takten der Hauptschleife und den Takt seines nächsten Aufrufs enthält. Im laufenden
+    Betrieb muss dann je Takt nur noch der Taktzähler verglichen werden, ohne die Sensoren
+    einzeln nach ihren Eigenschaften zu befragen.
+
+    Sensoren mit gleicher Frequenz werden dabei möglichst auf unterschiedliche Takte
+    verteilt, damit langsame Sensoren nicht alle im selben Durchlauf Rechenzeit benötigen.
+    Innerhalb eines Takts werden die Sensoren in der Reihenfolge aufgerufen, in der sie
+    dem Fahrzeug hinzugefügt wurden.
+
+    Der Plan wird neu berechnet, sobald ein Sensor hinzugefügt, aktiviert oder deaktiviert
+    wird.
+
+    Die Laufzeit jedes Aufrufs wird gemessen und je Sensor in einem `TimingHistogram`
+    im Dictionary `timings` gesammelt.
+    """
+
+    def __init__(self, tick_frequency=10):
+        """
+        Konstruktor. Parameter:
+            * tick_frequency: Anzahl der Durchläufe der Hauptschleife pro Sekunde
+        """
+        self._sensors        = []
+        self._tick_frequency = tick_frequency
+        self._tick           = 0
+        self._schedule       = None
+        self._on_demand      = ()
+
+        # Wird bei jeder Änderung an den Sensoren erhöht
+        self.version = 0
+
+        # Laufzeitmessung je Sensorname
+        self.timings = {}
+
+    @property
+    def tick_frequency(self):
+        """
+        Anzahl der Durchläufe der Hauptschleife pro Sekunde, für die der Plan berechnet wird.
+        """
+        return self._tick_frequency
+
+    @tick_frequency.setter
+    def tick_frequency(self, tick_frequency):
+        self._tick_frequency = tick_frequency
+        self.invalidate()
+
+    def add(self, name, sensor):
+        """
+        Sensor unter dem angegebenen Namen in den Ablaufplan aufnehmen.
+        """
+        self._sensors.append((name, sensor))
+        self.timings[name] = TimingHistogram()
+
+        sensor.on_state_change = self.invalidate
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Ablaufplan verwerfen, damit er vor dem nächsten Takt neu berechnet wird.
+        """
+        self._schedule = None
+        self.version  += 1
+
+    def interval(self, sensor):
+        """
+        Gibt zurück, alle wie viele Takte der Sensor aufgerufen wird. 0 bedeutet,
+        dass der Sensor nur bei Bedarf aufgerufen wird.
+        """
+        frequency = getattr(sensor, "update_frequency", None)
+
+        if frequency is None:
+            return 1
+        elif frequency <= 0:
+            return 0
+        else:
+            return max(1, round(self._tick_frequency / frequency))
+
+    def _build(self):
+        """
+        Ablaufplan berechnen. Für jeden regelmäßig aufgerufenen Sensor wird eine Liste aus dem
+        Takt des nächsten Aufrufs, dem Aufrufintervall, der `update()`-Methode und dem
+        dazugehörigen Laufzeithistogramm angelegt. Im Betrieb wird je Takt nur noch der fällige
+        Takt mit dem Taktzähler verglichen und nach dem Aufruf um das Intervall erhöht. Die
+        Länge des Plans hängt damit nicht von der Kombination der Sensorfrequenzen ab.
+        """
+        periodic  = []
+        on_demand = []
+
+        for name, sensor in self._sensors:
+            if not getattr(sensor, "is_active", True) or not hasattr(sensor, "update"):
+                continue
+
+            interval = self.interval(sensor)
+
+            if interval == 0:
+                on_demand.append((sensor, self.timings[name]))
+            else:
+                periodic.append((sensor, interval, self.timings[name]))
+
+        # Taktversatz je Sensor wählen, so dass die Last möglichst gleichmäßig verteilt wird.
+        # Zwei Sensoren treffen genau dann im selben Takt aufeinander, wenn ihr Versatz modulo
+        # dem größten gemeinsamen Teiler der Intervalle gleich ist, und zwar in jedem
+        # kgV-ten Takt.
+        placed  = []
+        offsets = {}
+
+        for sensor, interval, _ in sorted(periodic, key=lambda entry: entry[1]):
+            def _load(offset):
+                return sum(
+                    1 / math.lcm(interval, other_interval)
+                    for other_offset, other_interval in placed
+                    if (offset - other_offset) % math.gcd(interval, other_interval) == 0
+                )
+
+            offset = min(range(interval), key=_load)
+            offsets[id(sensor)] = offset
+            placed.append((offset, interval))
+
+        # Plan in der ursprünglichen Reihenfolge der Sensoren aufbauen, ab dem nächsten Takt
+        tick = self._tick + 1
+
+        self._schedule = [
+            [tick + (offsets[id(sensor)] - tick) % interval, interval, sensor.update, timing]
+            for sensor, interval, timing in periodic
+        ]
+
+        self._on_demand = tuple(on_demand)
+
+    def run(self, vehicle):
+        """
+        Alle im aktuellen Takt fälligen Sensoren aufrufen. Muss einmal je Durchlauf der
+        Hauptschleife aufgerufen werden.
+        """
+        if self._schedule is None:
+            self._build()
+
+        perf_counter = time.perf_counter
+        self._tick  += 1
+        tick         = self._tick
+
+        for entry in self._schedule:
+            if entry[0] <= tick:
+                entry[0] += entry[1]
+
+                start_s = perf_counter()
+                entry[2](vehicle)
+                entry[3].add(perf_counter() - start_s)
+
+        for sensor, timing in self._on_demand:
+            if sensor.pending:
+                sensor.pending = False
+
+                start_s = perf_counter()
+                sensor.update(vehicle)
+                timing.add(perf_counter() - start_s)
@@ -1,11 +1,13 @@
 # https://docs.circuitpython.org/en/latest/shared-bindings/board/index.html
 # https://docs.circuitpython.org/en/latest/shared-bindings/busio/index.html
 # https://docs.circuitpython.org/projects/pca9685/en/latest/index.html
-import busio
+import asyncio, busio, os
 from board import SCL, SDA
 from adafruit_pca9685 import PCA9685
 
 from carbot.motor import PCA9685Motor
+from carbot.pwm import PCA9685Outputs
+from carbot.recorder import FlightRecorder
 from carbot.vehicle import Vehicle
 from carbot.sensors.obstacle import ObstacleSensor
 from carbot.sensors.direction import DirectionServo
@@ -20,7 +22,9 @@ def main():
     Vom Startskript aufgerufene Hauptfunktion des Programms. Hier werden die
     Objekte zur Steuerung des Fahrzeug konfiguriert und miteinander verknüpft.
     Anschließend wird die in der Klasse `Vehicle` implementierte Hauptschleife
-    gestartet.
+    gestartet. Alle Sensoren, die Fernsteuerung und die Audiowiedergabe laufen
+    dabei in einer gemeinsamen asyncio Event Loop. Alternativ kann mit
+    `vehicle.loop_forever()` die Variante mit Hintergrundthreads genutzt werden.
     """
     print("carbot sagt Hallo!")
 
@@ -38,26 +42,40 @@ def main():
     pca = PCA9685(i2c)
     pca.frequency = 60
 
+    # Änderungen an den PWM-Kanälen sammeln und einmal je Takt gebündelt übertragen
+    pwm = PCA9685Outputs(pca)
+
     # Fahrzeug starten
-    motor_left  = PCA9685Motor(pca, forward=24, backward=23, pwmChannel=0)
-    motor_right = PCA9685Motor(pca, forward=22, backward=27, pwmChannel=1)
+    motor_left  = PCA9685Motor(pwm, forward=24, backward=23, pwmChannel=0)
+    motor_right = PCA9685Motor(pwm, forward=22, backward=27, pwmChannel=1)
 
     vehicle = Vehicle(motor_left, motor_right)
+    vehicle.add_output(pwm)
+
+    # Flugschreiber für die spätere Fehlersuche, siehe Startskript flightrecorder.py. Die Datei
+    # liegt im Arbeitsspeicher, da sie in jedem Takt beschrieben wird, und wird erst bei Programmende
+    # auf die Speicherkarte kopiert. Bei einem Stromausfall geht die Aufzeichnung somit verloren.
+    vehicle.recorder = FlightRecorder(FlightRecorder.DEFAULT_PATH)
 
     vehicle.add_sensor("sensor:line", LineSensor([5, 6, 13, 19, 26], line_color=LineSensor.BLACK))
     vehicle.add_sensor("sensor:obstacle", ObstacleSensor(trigger=20, echo=21, min_cm=10, max_cm=100))
-    vehicle.add_sensor("sensor:direction", DirectionServo(pca, pwmChannel=15))
+    vehicle.add_sensor("sensor:direction", DirectionServo(pwm, pwmChannel=15))
     vehicle.add_sensor("drive:random", RandomDrive(print_change(limit(any(on_obstacle(vehicle, 0.75), random_interval(10, 30))))))
     vehicle.add_sensor("drive:backforth", BackAndForthDrive(print_change(limit(any(on_obstacle(vehicle, 0.9), random_interval(10, 30))))))
     vehicle.add_sensor("drive:line", FollowLineDrive())
     vehicle.add_sensor("sound:player", SoundPlayer())
-    vehicle.add_sensor("remote:udp", UDPRemoteControl("", 9876))
+    vehicle.add_sensor("remote:udp", UDPRemoteControl("", 9876, deadman_timeout_ms=1000))
 
     vehicle.get_sensor("drive:random").disable()
     vehicle.get_sensor("drive:backforth").disable()
     vehicle.get_sensor("drive:line").disable()
 
     try:
-        vehicle.loop_forever()
+        asyncio.run(vehicle.loop_async(update_frequency=200))
     except:
         vehicle.stop()
+
+        try:
+            vehicle.recorder.save(os.path.expanduser("~/carbot-flightrecorder.bin"))
+        except OSError as exc:
+            print(f"Flugschreiber konnte nicht gespeichert werden: {exc}")
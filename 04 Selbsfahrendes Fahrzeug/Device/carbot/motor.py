@@ -27,12 +27,15 @@ class PCA9685Motor:
         * Methode `reverse()`: Fahrtrichtung umkehren
         * Methode `stop()`: Anhalten
         * Zuweisung an Attribut `value` = -1.0 ... 1.0
+
+    Die Hardware wird nur angesprochen, wenn sich der Wert tatsächlich ändert. Die
+    Richtungspins werden sogar nur bei einem Wechsel der Drehrichtung umgeschaltet.
     """
     def __init__(self, pca, forward, backward, pwmChannel):
         """
         Konstruktor.
 
-            * pca: PCA9685-Objekt für die PWM-Steuerung
+            * pca: PCA9685- oder PCA9685Outputs-Objekt für die PWM-Steuerung
             * forward: Nummer des GPIO-Pins für Vorwärtsfahrt
             * backward: Nummer des GPIO-Pins für Rückwärtsfahrt
             * pwmChannel: Nummer des PWM-Kanals für die Geschwindigkeitsregelung
@@ -41,6 +44,7 @@ class PCA9685Motor:
         self._backward   = DigitalOutputDevice(backward)
         self._pwmChannel = pca.channels[pwmChannel]
         self._value      = 0
+        self._direction  = 0
     
     def forward(self, speed):
         """
@@ -80,15 +84,25 @@ class PCA9685Motor:
         Richtung und Geschwindigkeit des Motors ändern durch einfache
         Wertzuweiseung statt Aufruf der obigen Methoden.
         """
+        if value == self._value:
+            return
+
         self._value = value
         self._pwmChannel.duty_cycle = int(0xFFFF * abs(value))
 
-        if value > 0:
+        direction = (value > 0) - (value < 0)
+
+        if direction == self._direction:
+            return
+
+        self._direction = direction
+
+        if direction > 0:
             self._forward.on()
             self._backward.off()
-        elif value < 0:
+        elif direction < 0:
             self._forward.off()
             self._backward.on()
         else:
             self._forward.off()
-            self._backward.off()
\ No newline at end of file
+            self._backward.off()
@@ -0,0 +1,91 @@
+import math
+
+class TimingHistogram:
+    """
+    Histogramm für gemessene Laufzeiten. Die Messwerte werden nicht einzeln gespeichert,
+    sondern nur in logarithmisch verteilten Klassen gezählt (20 Klassen je Zehnerpotenz
+    von 1 µs bis 10 s). Das Hinzufügen eines Messwerts ist dadurch sehr günstig und der
+    Speicherbedarf bleibt konstant, so dass die Messung dauerhaft eingeschaltet bleiben
+    kann. Perzentile können so auf etwa 12% genau bestimmt werden.
+    """
+
+    _MIN_S              = 1e-6
+    _BUCKETS_PER_DECADE = 20
+    _BUCKET_COUNT       = 7 * _BUCKETS_PER_DECADE + 2
+
+    __slots__ = ("count", "total_s", "max_s", "last_s", "_buckets")
+
+    def __init__(self):
+        """
+        Konstruktor.
+        """
+        self._buckets = [0] * self._BUCKET_COUNT
+        self.reset()
+
+    def reset(self):
+        """
+        Alle Messwerte verwerfen.
+        """
+        self.count   = 0
+        self.total_s = 0.0
+        self.max_s   = 0.0
+        self.last_s  = 0.0
+
+        for index in range(self._BUCKET_COUNT):
+            self._buckets[index] = 0
+
+    def add(self, duration_s):
+        """
+        Neuen Messwert in Sekunden hinzufügen.
+        """
+        self.count   += 1
+        self.total_s += duration_s
+        self.last_s   = duration_s
+
+        if duration_s > self.max_s:
+            self.max_s = duration_s
+
+        if duration_s <= self._MIN_S:
+            index = 0
+        else:
+            index = min(int(math.log10(duration_s / self._MIN_S) * self._BUCKETS_PER_DECADE) + 1, self._BUCKET_COUNT - 1)
+
+        self._buckets[index] += 1
+
+    def percentile(self, percent):
+        """
+        Gibt die obere Grenze der Klasse zurück, in die das angegebene Perzentil [0...100] fällt.
+        """
+        if not self.count:
+            return 0.0
+
+        remaining = self.count * percent / 100.0
+
+        for index, count in enumerate(self._buckets):
+            remaining -= count
+
+            if remaining <= 0:
+                break
+
+        upper_s = self._MIN_S * 10 ** (index / self._BUCKETS_PER_DECADE)
+        return min(upper_s, self.max_s)
+
+    @property
+    def mean_s(self):
+        """
+        Durchschnittliche Laufzeit in Sekunden.
+        """
+        return self.total_s / self.count if self.count else 0.0
+
+    @property
+    def stats(self):
+        """
+        Kennzahlen des Histogramms als Dictionary.
+        """
+        return {
+            "count":  self.count,
+            "mean_s": self.mean_s,
+            "p50_s":  self.percentile(50),
+            "p99_s":  self.percentile(99),
+            "max_s":  self.max_s,
+        }
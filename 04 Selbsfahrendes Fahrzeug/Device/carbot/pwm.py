@@ -0,0 +1,180 @@
+import struct
+
+# https://cdn-shop.adafruit.com/datasheets/PCA9685.pdf
+# https://github.com/adafruit/Adafruit_CircuitPython_PCA9685/blob/main/adafruit_pca9685.py
+
+class PCA9685Outputs:
+    """
+    Verwaltung der PWM-Ausgänge eines PCA9685-Bausteins. Kann überall dort verwendet
+    werden, wo sonst das `PCA9685`-Objekt der Adafruit-Bibliothek übergeben wird, da es
+    ebenfalls ein Attribut `channels` mit den 16 Kanälen besitzt.
+
+    Im Gegensatz zur Adafruit-Bibliothek wird beim Ändern eines Kanals aber nicht sofort
+    über I2C geschrieben. Stattdessen merkt sich das Objekt die neuen Registerwerte und
+    überträgt sie erst beim Aufruf von `flush()`, den das Fahrzeug einmal am Ende jedes
+    Takts ausführt. Dabei gilt:
+
+        * Werte, die sich gegenüber dem zuletzt geschriebenen Wert nicht geändert haben,
+          werden gar nicht übertragen.
+
+        * Alle geänderten Kanäle werden mit der Auto-Increment-Funktion des Bausteins in
+          einem einzigen I2C-Schreibvorgang übertragen, sofern die Werte aller dazwischen
+          liegenden Kanäle bekannt sind. Ansonsten wird je zusammenhängendem Block einmal
+          geschrieben.
+
+    Die Zähler `writes` und `skipped_writes` geben Auskunft über die Anzahl der
+    I2C-Schreibvorgänge und der eingesparten Kanaländerungen.
+    """
+
+    _MODE1_AUTO_INCR = 0x20
+    _LED0_ON_L_REG   = 0x06
+    _CHANNEL_COUNT   = 16
+
+    def __init__(self, pca):
+        """
+        Konstruktor. Parameter:
+            * pca: PCA9685-Objekt der Adafruit-Bibliothek
+        """
+        self._pca     = pca
+        self._written = [None] * self._CHANNEL_COUNT
+        self._pending = [None] * self._CHANNEL_COUNT
+        self._dirty   = False
+
+        self.channels       = tuple(PCA9685Channel(self, index) for index in range(self._CHANNEL_COUNT))
+        self.writes         = 0
+        self.skipped_writes = 0
+
+        # Auto-Increment einschalten, damit mehrere Register am Stück geschrieben werden können
+        self._pca.mode1_reg = self._pca.mode1_reg | self._MODE1_AUTO_INCR
+
+    @property
+    def frequency(self):
+        """
+        PWM-Frequenz des Bausteins. Wird z.B. von `adafruit_motor.servo` benötigt.
+        """
+        return self._pca.frequency
+
+    @frequency.setter
+    def frequency(self, frequency):
+        self._pca.frequency = frequency
+
+    def set_duty_cycle(self, index, duty_cycle):
+        """
+        Neues Tastverhältnis [0...0xFFFF] für einen Kanal vormerken. Die Umrechnung in die
+        12-Bit-Register entspricht der Adafruit-Bibliothek.
+        """
+        if not 0 <= duty_cycle <= 0xFFFF:
+            raise ValueError(f"Ungültiges Tastverhältnis: {duty_cycle}")
+
+        if duty_cycle == 0xFFFF:
+            registers = (0x1000, 0)     # Dauerhaft an
+        elif duty_cycle < 0x0010:
+            registers = (0, 0x1000)     # Dauerhaft aus
+        else:
+            registers = (0, duty_cycle >> 4)
+
+        if registers == self._pending[index] \
+        or self._pending[index] is None and registers == self._written[index]:
+            self.skipped_writes += 1
+            return
+
+        self._pending[index] = registers
+        self._dirty = True
+
+    def flush(self):
+        """
+        Alle geänderten Kanäle an den Baustein übertragen.
+        """
+        if not self._dirty:
+            return
+
+        self._dirty = False
+        changed = []
+
+        for index in range(self._CHANNEL_COUNT):
+            registers = self._pending[index]
+
+            if registers is None:
+                continue
+
+            self._pending[index] = None
+
+            if registers != self._written[index]:
+                self._written[index] = registers
+                changed.append(index)
+
+        if not changed:
+            return
+
+        # Vom ersten bis zum letzten geänderten Kanal alles in einem Block schreiben.
+        # Kanäle mit unbekanntem Inhalt dürfen dabei aber nicht überschrieben werden,
+        # weshalb der Block an diesen Stellen aufgeteilt wird.
+        first = None
+        last  = None
+
+        for index in changed:
+            if first is not None and None in self._written[last + 1:index]:
+                self._write_block(first, last)
+                first = None
+
+            if first is None:
+                first = index
+
+            last = index
+
+        self._write_block(first, last)
+
+    def _write_block(self, first, last):
+        """
+        Die Register der Kanäle `first` bis einschließlich `last` in einem
+        einzigen I2C-Schreibvorgang übertragen.
+        """
+        buffer = bytearray(1 + 4 * (last - first + 1))
+        buffer[0] = self._LED0_ON_L_REG + 4 * first
+
+        for index in range(first, last + 1):
+            struct.pack_into("<HH", buffer, 1 + 4 * (index - first), *self._written[index])
+
+        with self._pca.i2c_device as i2c:
+            i2c.write(buffer)
+
+        self.writes += 1
+
+class PCA9685Channel:
+    """
+    Einzelner Kanal eines `PCA9685Outputs`-Objekts. Bietet dieselbe Schnittstelle wie
+    ein Kanal der Adafruit-Bibliothek, merkt Änderungen aber nur zur späteren Übertragung vor.
+    """
+
+    def __init__(self, outputs, index):
+        """
+        Konstruktor. Parameter:
+            * outputs: Zugehöriges PCA9685Outputs-Objekt
+            * index: Nummer des Kanals [0...15]
+        """
+        self._outputs    = outputs
+        self._index      = index
+        self._duty_cycle = 0
+
+    @property
+    def frequency(self):
+        """
+        PWM-Frequenz des Bausteins.
+        """
+        return self._outputs.frequency
+
+    @frequency.setter
+    def frequency(self, frequency):
+        self._outputs.frequency = frequency
+
+    @property
+    def duty_cycle(self):
+        """
+        Tastverhältnis des Kanals [0...0xFFFF].
+        """
+        return self._duty_cycle
+
+    @duty_cycle.setter
+    def duty_cycle(self, duty_cycle):
+        self._outputs.set_duty_cycle(self._index, duty_cycle)
+        self._duty_cycle = duty_cycle
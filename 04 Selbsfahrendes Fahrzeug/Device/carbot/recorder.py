@@ -0,0 +1,255 @@
+import math, mmap, shutil, struct
+
+# https://docs.python.org/3/library/mmap.html
+# https://docs.python.org/3/library/struct.html
+# https://numpy.org/doc/stable/user/basics.rec.html
+
+class FlightRecorder:
+    """
+    Flugschreiber für das Fahrzeug. Schreibt in jedem Takt einen Datensatz fester Länge
+    mit den wichtigsten Fahrzeugparametern in eine Ringpuffer-Datei, die per `mmap` in den
+    Speicher eingeblendet wird. Ist der Ringpuffer voll, werden die ältesten Datensätze
+    überschrieben. Die Datei enthält somit immer die letzten `capacity` Takte und kann
+    nach einem Fehlverhalten des Fahrzeugs mit `load()` ausgewertet werden.
+
+    Das Schreiben eines Datensatzes kopiert nur wenige Zahlen mit einem vorab kompilierten
+    `struct.Struct` direkt in den eingeblendeten Speicher. Es werden weder Dateizugriffe
+    ausgeführt noch Puffer angelegt, so dass der Flugschreiber dauerhaft eingeschaltet
+    bleiben kann.
+
+    Das Zurückschreiben der geänderten Seiten übernimmt das Betriebssystem. Liegt die Datei
+    auf der Speicherkarte, wird diese somit ständig beschrieben, was sie abnutzt und beim
+    Zurückschreiben zu Verzögerungen führen kann. Standardmäßig liegt die Datei deshalb unter
+    `DEFAULT_PATH` im Arbeitsspeicher (tmpfs) und wird bei Bedarf mit `save()` auf die
+    Speicherkarte kopiert. Dafür geht die Aufzeichnung bei einem Stromausfall verloren.
+
+    Aufbau der Datei:
+
+        * Dateikopf (`HEADER_SIZE` Bytes): Kennung, Version, Länge eines Datensatzes,
+          Anzahl der Datensätze, Anzahl der Sensoren, Anzahl der bisher geschriebenen
+          Datensätze und die Sensornamen als mit Nullbytes getrennte UTF-8 Zeichenketten
+
+        * Datensätze: Takt, Zeitpunkt, Zielgeschwindigkeit, Verlangsamung, Richtung,
+          Motorgeschwindigkeiten, Linienmuster als Bitmaske, Laufzeit des Takts sowie
+          die Laufzeit jedes Sensors in Sekunden. Sensoren, die im jeweiligen Takt nicht
+          aufgerufen wurden, erhalten den Wert NaN.
+    """
+
+    MAGIC       = b"CBFR"
+    VERSION     = 1
+    HEADER_SIZE = 4096
+
+    # Datei im Arbeitsspeicher, um die Speicherkarte zu schonen
+    DEFAULT_PATH = "/dev/shm/carbot-flightrecorder.bin"
+
+    # Kennung, Version, Kopflänge, Datensatzlänge, Kapazität, Sensoranzahl, geschriebene Datensätze
+    _HEADER       = struct.Struct("<4sHHIIH2xQ")
+    _COUNT_OFFSET = 20
+
+    # Takt, Zeitpunkt, 6 Fahrzeugparameter, Linienmuster, Laufzeit des Takts
+    _RECORD_FIELDS = (
+        ("tick",              "Q"),
+        ("timestamp_s",       "d"),
+        ("target_speed",      "f"),
+        ("obstacle_pushback", "f"),
+        ("direction",         "f"),
+        ("speed_total",       "f"),
+        ("speed_left",        "f"),
+        ("speed_right",       "f"),
+        ("line_mask",         "B"),
+        ("",                  "3x"),
+        ("tick_s",            "f"),
+    )
+
+    def __init__(self, path=DEFAULT_PATH, capacity=60000):
+        """
+        Konstruktor. Parameter:
+            * path: Pfad der Ringpuffer-Datei. Eine vorhandene Datei wird überschrieben.
+              Siehe die Klassenbeschreibung zur Wahl des Speicherorts.
+            * capacity: Anzahl der Datensätze im Ringpuffer (Default: 5 Minuten bei 200 Hz)
+
+        Die Datei wird erst mit `open()` angelegt, sobald die Namen der Sensoren feststehen.
+        Dies übernimmt das Fahrzeug beim Start der Hauptschleife.
+        """
+        self.path     = path
+        self.capacity = capacity
+        self.count    = 0
+
+        self._file    = None
+        self._mmap    = None
+        self._record  = None
+        self._timings = ()
+        self._counts  = []
+        self._values  = []
+
+    def open(self, timings):
+        """
+        Datei anlegen und in den Speicher einblenden. Parameter:
+            * timings: Dictionary mit Sensorname und `TimingHistogram` je Sensor,
+              siehe `SensorExecutor.timings`
+        """
+        self.close()
+
+        names = list(timings.keys())
+        encoded_names = b"\0".join(name.encode() for name in names)
+
+        if self._HEADER.size + len(encoded_names) > self.HEADER_SIZE:
+            raise ValueError("Zu viele Sensoren für den Dateikopf des Flugschreibers")
+
+        self._record  = struct.Struct(self.record_format(len(names)))
+        self._timings = tuple(timings.values())
+        self._counts  = [timing.count for timing in self._timings]
+        self.count    = 0
+
+        # Vorab angelegte Liste für die Werte eines Datensatzes, wird in jedem Takt überschrieben
+        self._values  = [0] * (len(self._RECORD_FIELDS) - 1 + len(names))
+
+        size = self.HEADER_SIZE + self.capacity * self._record.size
+
+        self._file = open(self.path, "w+b")
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+        self._HEADER.pack_into(self._mmap, 0,
+            self.MAGIC, self.VERSION, self.HEADER_SIZE, self._record.size, self.capacity, len(names), 0
+        )
+
+        self._mmap[self._HEADER.size:self._HEADER.size + len(encoded_names)] = encoded_names
+
+    @classmethod
+    def record_format(cls, sensor_count):
+        """
+        Gibt das `struct`-Format eines Datensatzes mit der angegebenen Anzahl Sensoren zurück.
+        """
+        return "<" + "".join(format_ for _, format_ in cls._RECORD_FIELDS) + "f" * sensor_count
+
+    def record(self, vehicle, timestamp_s, tick_s):
+        """
+        Einen Datensatz für den gerade beendeten Takt schreiben. Parameter:
+            * vehicle: Fahrzeugobjekt
+            * timestamp_s: Zeitpunkt des Takts (time.monotonic)
+            * tick_s: Laufzeit des Takts in Sekunden
+        """
+        mmap_ = self._mmap
+
+        if mmap_ is None:
+            return
+
+        count  = self.count
+        offset = self.HEADER_SIZE + (count % self.capacity) * self._record.size
+
+        values = self._values
+        values[0] = count + 1
+        values[1] = timestamp_s
+        values[2] = vehicle.target_speed
+        values[3] = vehicle.obstacle_pushback
+        values[4] = vehicle.direction
+        values[5] = vehicle.speed_total
+        values[6] = vehicle.speed_left
+        values[7] = vehicle.speed_right
+        values[8] = vehicle.line_mask
+        values[9] = tick_s
+
+        # Laufzeit nur für die Sensoren eintragen, die in diesem Takt aufgerufen wurden
+        counts = self._counts
+        index  = 0
+
+        for timing in self._timings:
+            if timing.count != counts[index]:
+                counts[index] = timing.count
+                values[10 + index] = timing.last_s
+            else:
+                values[10 + index] = math.nan
+
+            index += 1
+
+        self._record.pack_into(mmap_, offset, *values)
+
+        # Erst danach den Zähler erhöhen, damit der Datensatz vollständig ist
+        self.count = count + 1
+        struct.pack_into("<Q", mmap_, self._COUNT_OFFSET, self.count)
+
+    def flush(self):
+        """
+        Geänderte Speicherseiten sofort in die Datei zurückschreiben.
+        """
+        if self._mmap is not None:
+            self._mmap.flush()
+
+    def save(self, path):
+        """
+        Aktuellen Inhalt des Ringpuffers in eine andere Datei kopieren, z.B. von tmpfs auf
+        die Speicherkarte. Kann auch während der Aufzeichnung aufgerufen werden. Der zuletzt
+        geschriebene Datensatz ist dann möglicherweise unvollständig.
+        """
+        if self._mmap is not None:
+            self._mmap.flush()
+
+        shutil.copyfile(self.path, path)
+
+    def close(self):
+        """
+        Datei schließen.
+        """
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def load(path):
+    """
+    Liest eine vom `FlightRecorder` geschriebene Datei und gibt die Datensätze in zeitlicher
+    Reihenfolge als strukturiertes NumPy-Array zurück. Die Laufzeit der Sensoren ist darin
+    unter dem jeweiligen Sensornamen abgelegt, also z.B. `records["sensor:line"]`.
+
+    Benötigt das Paket `numpy`, das auf dem Fahrzeug selbst nicht installiert sein muss.
+    Die Datei kann hierfür auch auf einen anderen Rechner kopiert werden.
+    """
+    import numpy as np
+
+    with open(path, "rb") as file:
+        data = file.read()
+
+    magic, version, header_size, record_size, capacity, sensor_count, count = FlightRecorder._HEADER.unpack_from(data)
+
+    if magic != FlightRecorder.MAGIC:
+        raise ValueError(f"{path} ist keine Flugschreiber-Datei")
+
+    if version != FlightRecorder.VERSION:
+        raise ValueError(f"Version {version} der Flugschreiber-Datei wird nicht unterstützt")
+
+    names = data[FlightRecorder._HEADER.size:header_size].rstrip(b"\0").decode().split("\0") if sensor_count else []
+
+    # Datentyp mit denselben Feldern wie `FlightRecorder.record_format()`
+    numpy_types = {"Q": "<u8", "d": "<f8", "f": "<f4", "B": "u1"}
+    fields  = []
+    offsets = []
+    offset  = 0
+
+    for name, format_ in FlightRecorder._RECORD_FIELDS + tuple((name, "f") for name in names):
+        size = struct.calcsize("<" + format_)
+
+        if name:
+            fields.append((name, numpy_types[format_]))
+            offsets.append(offset)
+
+        offset += size
+
+    dtype = np.dtype({
+        "names":    [name for name, _ in fields],
+        "formats":  [format_ for _, format_ in fields],
+        "offsets":  offsets,
+        "itemsize": record_size,
+    })
+
+    records = np.frombuffer(data, dtype=dtype, count=capacity, offset=header_size)
+
+    # Ringpuffer in zeitliche Reihenfolge bringen
+    if count <= capacity:
+        return records[:count].copy()
+    else:
+        return np.roll(records, -(count % capacity)).copy()
@@ -0,0 +1,218 @@
+import traceback
+from carbot.remote.subscription import StatusStream, Subscription
+
+class ClientRegistry:
+    """
+    Verzeichnis aller Clients, die den Fahrzeugstatus abonniert haben. Die Clients werden
+    anhand der abonnierten Einträge und ihres Nachrichtenformats in `StatusStream`-Objekte
+    gruppiert. Je Stream und Durchlauf wird der Status nur einmal zusammengestellt und jede
+    Nachricht nur einmal kodiert, bevor sie an alle fälligen Clients gesendet wird. Weitere
+    Beobachter kosten das Fahrzeug somit nur noch den eigentlichen Sendevorgang.
+
+    Optional können die Aktualisierungen zusätzlich an eine Multicast-Gruppe gesendet
+    werden. Diese wird wie ein Client behandelt, der jeden gesendeten Stand sofort bestätigt.
+    Empfänger, die eine Nachricht verpasst haben, warten dann auf den nächsten Keyframe.
+
+    Clients, die sich länger als `timeout_s` nicht gemeldet haben, werden entfernt.
+
+    Scheitert das Senden mit einem `OSError` (z.B. ohne Route zur Multicast-Gruppe oder wenn
+    ein Client nicht mehr erreichbar ist), wird dies nur gezählt und höchstens alle
+    `_SEND_WARNING_INTERVAL_S` Sekunden als Warnung ausgegeben, da es sonst bei jeder
+    Aktualisierung erneut gemeldet würde.
+    """
+
+    # Mindestabstand der Warnungen bei fehlgeschlagenem Senden
+    _SEND_WARNING_INTERVAL_S = 10.0
+
+    def __init__(self, encode, keyframe_interval_s=1.0, timeout_s=5.0, budget_bytes_s=65536):
+        """
+        Konstruktor. Parameter:
+            * encode: Funktion zum Kodieren einer Nachricht mit den Parametern (message, protocol),
+              die eine Liste von Datagrammen zurückgibt
+            * keyframe_interval_s: Abstand der vollständigen Aktualisierungen in Sekunden
+            * timeout_s: Zeit ohne Bestätigung, nach der ein Client entfernt wird
+            * budget_bytes_s: Standard-Sendebudget je Client in Bytes je Sekunde
+        """
+        self._encode    = encode
+        self._clients   = {}
+        self._streams   = {}
+        self._multicast = []
+
+        self.keyframe_interval_s = keyframe_interval_s
+        self.timeout_s           = timeout_s
+        self.budget_bytes_s      = budget_bytes_s
+
+        self.expired     = 0
+        self.sent        = 0
+        self.sent_bytes  = 0
+        self.send_errors = 0
+
+        self._send_errors_warned = 0
+        self._send_warning_s     = None
+
+    def __len__(self):
+        return len(self._clients) + len(self._multicast)
+
+    @property
+    def stats(self):
+        """
+        Zähler als Dictionary, z.B. zur Übertragung an die Fernsteuerung.
+        """
+        return {
+            "clients":     len(self._clients),
+            "multicast":   len(self._multicast),
+            "streams":     len(self._streams),
+            "sent":        self.sent,
+            "sent_bytes":  self.sent_bytes,
+            "send_errors": self.send_errors,
+            "throttled":   sum(client.throttled for client in self._subscriptions()),
+            "expired":     self.expired,
+        }
+
+    def subscribe(self, address, sendto, protocol, rate, fields, now_s, budget_bytes_s=None):
+        """
+        Client anmelden bzw. sein Abonnement erneuern. Parameter:
+            * address: Adresse des Clients
+            * sendto: Funktion zum Senden an den Client mit den Parametern (data, address)
+            * protocol: Nachrichtenformat des Clients
+            * rate: Anzahl Aktualisierungen je Sekunde
+            * fields: Abonnierte Einträge oder `None` für alle
+            * now_s: Aktueller Zeitpunkt (time.monotonic)
+            * budget_bytes_s: Sendebudget des Clients, sonst gilt der Standardwert
+        """
+        self._clients[address] = Subscription(
+            address, sendto, self._stream(fields, protocol), rate,
+            budget_bytes_s or self.budget_bytes_s, self.keyframe_interval_s, now_s
+        )
+
+    def add_multicast(self, address, sendto, protocol, rate, now_s):
+        """
+        Multicast-Gruppe als dauerhaften Empfänger aller Einträge hinzufügen.
+        """
+        self._multicast.append(Subscription(
+            address, sendto, self._stream(None, protocol), rate,
+            float("inf"), self.keyframe_interval_s, now_s, auto_ack=True
+        ))
+
+    def unsubscribe(self, address):
+        """
+        Client abmelden.
+        """
+        self._clients.pop(address, None)
+
+    def ack(self, address, frame, now_s):
+        """
+        Bestätigung eines Clients verarbeiten.
+        """
+        client = self._clients.get(address)
+
+        if client:
+            client.ack(frame, now_s)
+
+    def _stream(self, fields, protocol):
+        """
+        Gibt den gemeinsamen Stream für die angegebenen Einträge und das Nachrichtenformat zurück.
+        """
+        key = (tuple(sorted(fields)) if fields is not None else None, protocol)
+
+        try:
+            return self._streams[key]
+        except KeyError:
+            self._streams[key] = StatusStream(key[0], protocol)
+            return self._streams[key]
+
+    def _subscriptions(self):
+        """
+        Alle Abonnements einschließlich der Multicast-Gruppen.
+        """
+        return list(self._clients.values()) + self._multicast
+
+    def push(self, status, now_s):
+        """
+        Fällige Aktualisierungen an alle Clients senden. Parameter:
+            * status: Funktion, die zu einem Tupel von Einträgen (oder `None` für alle) den
+              aktuellen Status als neues Dictionary zurückgibt
+            * now_s: Aktueller Zeitpunkt (time.monotonic)
+
+        Gibt den Zeitpunkt der nächsten fälligen Aktualisierung zurück oder `None`, wenn
+        keine Clients angemeldet sind.
+        """
+        # Abgelaufene Clients entfernen
+        for address, client in list(self._clients.items()):
+            if now_s - client.last_seen_s > self.timeout_s:
+                del self._clients[address]
+                self.expired += 1
+
+        # Fällige Clients je Stream sammeln
+        due = {}
+        next_due_s = None
+
+        for client in self._subscriptions():
+            if client.is_due(now_s):
+                due.setdefault(id(client.stream), []).append(client)
+
+            if next_due_s is None or client.next_due_s < next_due_s:
+                next_due_s = client.next_due_s
+
+        for clients in due.values():
+            stream = clients[0].stream
+
+            # Status nur einmal je Stream zusammenstellen
+            stream.update(status(stream.fields))
+
+            for client in clients:
+                try:
+                    base = client.base_frame(now_s)
+
+                    if base == stream.frame:
+                        # Client kennt den aktuellen Stand bereits
+                        continue
+
+                    datagrams, size = stream.datagrams(base, self._encode)
+
+                    if not client.consume_budget(size, now_s):
+                        continue
+
+                    for datagram in datagrams:
+                        client.sendto(datagram, client.address)
+
+                    self.sent       += 1
+                    self.sent_bytes += size
+
+                    if client.auto_ack:
+                        client.ack(stream.frame, now_s)
+                except OSError as exc:
+                    self._send_failed(client, exc, now_s)
+                except Exception as exc:
+                    print(f"Fehler beim Senden einer Aktualisierung an {client.address}: {exc}")
+                    traceback.print_exc()
+
+        # Nicht mehr benötigte Stände vergessen und Streams ohne Clients entfernen
+        used = {}
+
+        for client in self._subscriptions():
+            used[id(client.stream)] = min(used.get(id(client.stream), client.acked), client.acked)
+
+        for key, stream in list(self._streams.items()):
+            if id(stream) in used:
+                stream.prune(used[id(stream)])
+            else:
+                del self._streams[key]
+
+        return next_due_s
+
+    def _send_failed(self, client, exc, now_s):
+        """
+        Fehlgeschlagenes Senden an einen Client zählen und höchstens alle
+        `_SEND_WARNING_INTERVAL_S` Sekunden eine Warnung ausgeben.
+        """
+        self.send_errors += 1
+
+        if self._send_warning_s is not None and now_s - self._send_warning_s < self._SEND_WARNING_INTERVAL_S:
+            return
+
+        count = self.send_errors - self._send_errors_warned
+        print(f"Senden einer Aktualisierung an {client.address} fehlgeschlagen ({count}x seit der letzten Warnung): {exc}")
+
+        self._send_errors_warned = self.send_errors
+        self._send_warning_s     = now_s
@@ -0,0 +1,149 @@
+import collections
+
+class CommandQueue:
+    """
+    Warteschlange für die über das Netzwerk empfangenen Steuerbefehle. Der Netzwerk-Thread
+    fügt die Befehle mit `put()` hinzu, das Fahrzeug holt sie einmal je Takt mit `drain()`
+    ab. Dabei gilt:
+
+        * Die Befehle werden in der Reihenfolge ihres Eintreffens (FIFO) ausgeführt.
+
+        * Befehle mit dem Attribut `seq` werden verworfen, wenn vom selben Absender bereits
+          ein Befehl mit höherer Sequenznummer eingetroffen ist. Verspätete Datagramme
+          können so keine neueren Befehle überschreiben. Die Sequenznummern sind 32-Bit-
+          Zahlen und dürfen überlaufen. Liegt eine Sequenznummer sehr weit zurück, wird
+          von einem Neustart des Clients ausgegangen und der Befehl angenommen.
+
+        * Ein `batch`-Befehl wird als ein einziger Eintrag in die Warteschlange gestellt und
+          erst von `drain()` in seine einzelnen Befehle zerlegt. Da `drain()` immer alle
+          wartenden Befehle auf einmal liefert, werden die Befehle eines Batches garantiert
+          im selben Takt ausgeführt und das Fahrzeug fährt nie mit einer halb übernommenen
+          Änderung, z.B. neuer Geschwindigkeit aber alter Richtung.
+
+        * Von mehreren `set`-Befehlen für dasselbe Attribut innerhalb eines Takts wird nur
+          der letzte ausgeführt, da die vorherigen ohnehin sofort überschrieben würden.
+
+        * Die Warteschlange hat eine feste Höchstlänge. Ist sie voll, wird der älteste
+          Befehl verworfen.
+
+    Die Zähler `dropped_stale`, `dropped_overflow` und `coalesced` geben Auskunft über
+    die verworfenen Befehle, `received` über die Anzahl aller empfangenen Befehle.
+    """
+
+    _SEQUENCE_MASK   = 0xFFFFFFFF
+    _SEQUENCE_WINDOW = 1024
+
+    def __init__(self, max_size=256):
+        """
+        Konstruktor. Parameter:
+            * max_size: Höchstlänge der Warteschlange
+        """
+        self._queue          = collections.deque(maxlen=max_size)
+        self._last_sequence  = {}
+
+        self.received         = 0
+        self.dropped_stale    = 0
+        self.dropped_overflow = 0
+        self.coalesced        = 0
+
+    @property
+    def stats(self):
+        """
+        Zähler als Dictionary, z.B. zur Übertragung an die Fernsteuerung.
+        """
+        return {
+            "queued":           len(self._queue),
+            "received":         self.received,
+            "dropped_stale":    self.dropped_stale,
+            "dropped_overflow": self.dropped_overflow,
+            "coalesced":        self.coalesced,
+        }
+
+    def reset_source(self, source):
+        """
+        Sequenznummer eines Absenders vergessen, z.B. wenn sich dieser neu anmeldet.
+        """
+        self._last_sequence.pop(source, None)
+
+    def is_stale(self, command, source):
+        """
+        Prüft anhand der Sequenznummer, ob ein Befehl älter als der zuletzt vom selben
+        Absender empfangene Befehl ist, und merkt sich andernfalls die neue Sequenznummer.
+        """
+        sequence = command.get("seq")
+
+        if sequence is None:
+            return False
+
+        last_sequence = self._last_sequence.get(source)
+        self._last_sequence[source] = sequence
+
+        if last_sequence is None:
+            return False
+
+        behind = (last_sequence - sequence) & self._SEQUENCE_MASK
+
+        if behind == 0 or behind < self._SEQUENCE_WINDOW:
+            # Gleich alt oder älter: Die neuere Sequenznummer bleibt gültig
+            self._last_sequence[source] = last_sequence
+            return True
+
+        return False
+
+    def put(self, command, source=None):
+        """
+        Befehl hinzufügen. Aufruf aus dem Netzwerk-Thread. Gibt `False` zurück, wenn der
+        Befehl veraltet ist und verworfen wurde.
+        """
+        self.received += 1
+
+        if self.is_stale(command, source):
+            self.dropped_stale += 1
+            return False
+
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped_overflow += 1
+
+        self._queue.append(command)
+        return True
+
+    def drain(self):
+        """
+        Alle wartenden Befehle in der Reihenfolge ihres Eintreffens als Liste zurückgeben.
+        Aufruf aus dem Fahrzeug-Thread. Batches werden dabei in ihre einzelnen Befehle
+        zerlegt. Überholte `set`-Befehle sind darin nicht enthalten.
+        """
+        commands = []
+
+        while True:
+            try:
+                command = self._queue.popleft()
+            except IndexError:
+                break
+
+            if command.get("cmd") == "batch":
+                commands.extend(command.get("ops", []))
+            else:
+                commands.append(command)
+
+        if len(commands) < 2:
+            return commands
+
+        # Nur den letzten `set`-Befehl je Attribut behalten
+        result = []
+        seen   = set()
+
+        for command in reversed(commands):
+            if command.get("cmd") == "set":
+                attribute = command.get("attr")
+
+                if attribute in seen:
+                    self.coalesced += 1
+                    continue
+
+                seen.add(attribute)
+
+            result.append(command)
+
+        result.reverse()
+        return result
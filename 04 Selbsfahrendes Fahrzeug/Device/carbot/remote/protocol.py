@@ -0,0 +1,561 @@
+"""
+Kompaktes Binärformat für die Nachrichten zwischen Fernsteuerung und Fahrzeug. Das Format
+wird zwischen beiden Seiten ausgehandelt: Die Fernsteuerung sendet hierfür zunächst ein
+`{"cmd": "hello", "protocols": ["binary", "json"], "version": 1}` als JSON. Unterstützt das
+Fahrzeug das Binärformat, antwortet es mit `{"cmd": "hello_response", "protocol": "binary"}`
+und die Fernsteuerung sendet ab dann im Binärformat. Das Fahrzeug antwortet immer im Format
+der Anfrage, so dass ältere Clients weiterhin JSON verwenden können.
+
+Jedes Datagramm beginnt mit einem Kopf aus Kennung (2 Bytes), Version, Nachrichtentyp,
+Sequenznummer sowie Nummer und Anzahl der Fragmente. Der Nachrichtentyp ersetzt das Attribut
+`cmd`. Die übrigen Attribute der Nachricht folgen in einem einfachen, selbstbeschreibenden
+Format mit einem Typ-Byte je Wert. Häufig verwendete Zeichenketten wie Attributnamen werden
+dabei als einzelnes Byte übertragen. Die Fahrzeugparameter (`vehicle_status_response`)
+werden mit einem festen `struct`-Format übertragen, da sie mit Abstand am häufigsten
+gesendet werden.
+
+Nachrichten, die größer als `MAX_DATAGRAM_SIZE` sind, werden auf mehrere Datagramme
+aufgeteilt. Aufgeteilt wird dabei das Dictionary im Attribut `data` (bei Bedarf auch
+darin enthaltene Listen), so dass jedes Fragment für sich eine gültige Nachricht ist.
+Der Empfänger fügt die Fragmente mit `Reassembler` wieder zusammen.
+
+Mehrere Befehle können als `{"cmd": "batch", "ops": [{"cmd": "set", …}, …]}` in einer
+einzigen Nachricht gesendet werden. Das Fahrzeug führt die Befehle eines Batches immer
+gemeinsam im selben Takt aus. Ob das Fahrzeug Batches versteht, teilt es in der Liste
+`features` seiner `hello_response` mit.
+
+Fahrzeuge im lokalen Netz können mit `{"cmd": "discover"}` gefunden werden, das per Broadcast
+oder an die Multicast-Gruppe `DISCOVERY_GROUP` gesendet wird. Jedes Fahrzeug antwortet direkt
+mit einer `discover_response`, die unter anderem seinen Namen enthält.
+"""
+
+import json, struct
+
+# https://docs.python.org/3/library/struct.html
+
+# WICHTIG: Diese Datei existiert in identischer Form im Fahrzeug (carbot/remote/protocol.py)
+# und in der Fernsteuerung (carbot_rc/protocol.py). Änderungen bitte immer an beiden Stellen
+# vornehmen. Die Tabellen unten dürfen nur am Ende erweitert werden, da sich sonst die
+# Bedeutung der bereits vergebenen Nummern ändert. Andernfalls muss `VERSION` erhöht werden.
+
+MAGIC             = b"CB"
+VERSION           = 1
+MAX_DATAGRAM_SIZE = 1400
+
+BINARY, JSON = "binary", "json"
+
+# Multicast-Gruppe, der die Fahrzeuge zum Auffinden mit `discover` beitreten
+DISCOVERY_GROUP = "239.255.67.66"
+
+# Nachrichtentypen. Typ 0 steht für Nachrichten, deren `cmd` hier nicht aufgeführt ist.
+MESSAGE_TYPES = (
+    "",
+    "hello",
+    "hello_response",
+    "vehicle_status",
+    "vehicle_status_response",
+    "sensor_status",
+    "sensor_status_response",
+    "sound_status",
+    "sound_status_response",
+    "perf_stats",
+    "perf_stats_response",
+    "set",
+    "enable_sensor",
+    "disable_sensor",
+    "play_sound",
+    "stop_sound",
+    "subscribe",
+    "unsubscribe",
+    "status_update",
+    "ack",
+    "batch",
+    "ping",
+    "pong",
+    "discover",
+    "discover_response",
+)
+
+# Häufig übertragene Zeichenketten, die als einzelnes Byte kodiert werden
+KNOWN_STRINGS = (
+    "",
+    "hello",
+    "hello_response",
+    "vehicle_status",
+    "vehicle_status_response",
+    "sensor_status",
+    "sensor_status_response",
+    "sound_status",
+    "sound_status_response",
+    "perf_stats",
+    "perf_stats_response",
+    "set",
+    "enable_sensor",
+    "disable_sensor",
+    "play_sound",
+    "stop_sound",
+    "cmd",
+    "data",
+    "attr",
+    "value",
+    "name",
+    "reset",
+    "protocol",
+    "protocols",
+    "version",
+    "binary",
+    "json",
+    "soundfiles",
+    "playing",
+    "line_pattern",
+    "target_speed",
+    "obstacle_pushback",
+    "direction",
+    "speed_total",
+    "speed_left",
+    "speed_right",
+    "tick",
+    "sensors",
+    "scheduler",
+    "count",
+    "mean_s",
+    "p50_s",
+    "p99_s",
+    "max_s",
+    "frame",
+    "base",
+    "rate",
+    "fields",
+    "seq",
+    "ops",
+    "features",
+    "t0",
+    "t1",
+    "t2",
+    "rtt_s",
+    "offset_s",
+    "discover",
+    "discover_response",
+)
+
+_TYPE_BY_CMD   = {cmd: index for index, cmd in enumerate(MESSAGE_TYPES) if cmd}
+_STRING_BY_ID  = KNOWN_STRINGS
+_ID_BY_STRING  = {string: index for index, string in enumerate(KNOWN_STRINGS)}
+
+# Kennung, Version, Nachrichtentyp, Sequenznummer, Fragmentnummer, Fragmentanzahl
+_HEADER = struct.Struct("<2sBBIHH")
+
+# Kennzeichen der Werte im selbstbeschreibenden Format
+_NONE, _FALSE, _TRUE, _INT8, _INT32, _INT64, _FLOAT, _STR, _KNOWN_STR, _LIST, _DICT = range(11)
+
+_INT8_S   = struct.Struct("<Bb")
+_INT32_S  = struct.Struct("<Bi")
+_INT64_S  = struct.Struct("<Bq")
+_FLOAT_S  = struct.Struct("<Bd")
+_STR_S    = struct.Struct("<BH")
+_KNOWN_S  = struct.Struct("<BB")
+_LIST_S   = struct.Struct("<BH")
+
+# Fahrzeugparameter mit festem Format. Ein Byte gibt an, welche Parameter enthalten sind,
+# so dass auch nur ein Teil der Parameter übertragen werden kann.
+VEHICLE_FIELDS = (
+    "line_pattern",
+    "target_speed",
+    "obstacle_pushback",
+    "direction",
+    "speed_total",
+    "speed_left",
+    "speed_right",
+)
+
+_VEHICLE_FORMATS = {}
+
+def _vehicle_struct(fields_mask):
+    """
+    Gibt das `struct.Struct` für die Fahrzeugparameter mit den angegebenen Feldern zurück.
+    Die Objekte werden einmalig erzeugt und danach wiederverwendet.
+    """
+    try:
+        return _VEHICLE_FORMATS[fields_mask]
+    except KeyError:
+        format_ = "<B"
+
+        for index in range(len(VEHICLE_FIELDS)):
+            if fields_mask & (1 << index):
+                format_ += "B" if index == 0 else "f"
+
+        _VEHICLE_FORMATS[fields_mask] = struct.Struct(format_)
+        return _VEHICLE_FORMATS[fields_mask]
+
+def is_binary(data):
+    """
+    Prüft, ob ein empfangenes Datagramm im Binärformat vorliegt.
+    """
+    return data[:2] == MAGIC
+
+def encode(message, protocol=JSON, sequence=0, max_size=MAX_DATAGRAM_SIZE):
+    """
+    Nachricht im angegebenen Format kodieren. Gibt eine Liste mit einem oder, bei zu großen
+    Nachrichten im Binärformat, mehreren Datagrammen zurück. Parameter:
+        * message: Dictionary mit dem Attribut `cmd` und weiteren Attributen
+        * protocol: `BINARY` oder `JSON`
+        * sequence: Sequenznummer, sofern die Nachricht kein Attribut `seq` besitzt
+        * max_size: Maximale Größe eines Datagramms im Binärformat
+    """
+    if protocol != BINARY:
+        return [json.dumps(message).encode()]
+
+    cmd      = message.get("cmd", "")
+    type_    = _TYPE_BY_CMD.get(cmd, 0)
+    sequence = message.get("seq", sequence)
+    body     = {key: value for key, value in message.items() if key != "seq" and (key != "cmd" or not type_)}
+
+    payload = _encode_body(type_, body)
+    max_payload = max_size - _HEADER.size
+
+    if len(payload) <= max_payload:
+        return [_HEADER.pack(MAGIC, VERSION, type_, sequence & 0xFFFFFFFF, 0, 1) + payload]
+
+    # Zu groß für ein Datagramm: Das Attribut `data` auf mehrere Nachrichten verteilen
+    if not isinstance(body.get("data"), dict):
+        raise ValueError(f"Nachricht {cmd} ist zu groß für ein Datagramm")
+
+    payloads = [_encode_body(type_, dict(body, data=part)) for part in _split(body["data"], body, type_, max_payload)]
+
+    if len(payloads) > 0xFFFF:
+        raise ValueError(f"Nachricht {cmd} ist zu groß")
+
+    return [
+        _HEADER.pack(MAGIC, VERSION, type_, sequence & 0xFFFFFFFF, index, len(payloads)) + payload
+        for index, payload in enumerate(payloads)
+    ]
+
+def decode(data):
+    """
+    Einzelnes Datagramm dekodieren. Gibt ein Tupel aus Nachricht, Sequenznummer, Fragmentnummer
+    und Fragmentanzahl zurück. JSON-Nachrichten bestehen immer aus einem Fragment und haben die
+    Sequenznummer aus ihrem Attribut `seq` bzw. 0. Im Binärformat wird die Sequenznummer aus
+    dem Nachrichtenkopf als Attribut `seq` in die Nachricht übernommen. Wirft einen `ValueError`
+    bei ungültigen Daten.
+    """
+    if not is_binary(data):
+        message = json.loads(data.decode())
+        return message, message.get("seq", 0) if isinstance(message, dict) else 0, 0, 1
+
+    if len(data) < _HEADER.size:
+        raise ValueError("Unvollständiger Nachrichtenkopf")
+
+    _, version, type_, sequence, index, count = _HEADER.unpack_from(data)
+
+    if version != VERSION:
+        raise ValueError(f"Protokollversion {version} wird nicht unterstützt")
+
+    if type_ >= len(MESSAGE_TYPES):
+        raise ValueError(f"Unbekannter Nachrichtentyp {type_}")
+
+    if type_ == _TYPE_BY_CMD["vehicle_status_response"]:
+        message = {"data": _decode_vehicle(data, _HEADER.size)}
+    else:
+        message, _ = _decode_value(data, _HEADER.size)
+
+    if type_:
+        message["cmd"] = MESSAGE_TYPES[type_]
+
+    message["seq"] = sequence
+    return message, sequence, index, count
+
+class Reassembler:
+    """
+    Setzt auf mehrere Datagramme aufgeteilte Nachrichten wieder zusammen. Je Absender und
+    Nachrichtentyp wird nur die neueste Nachricht gesammelt. Treffen Fragmente einer neueren
+    Nachricht ein, bevor die vorherige vollständig ist, wird die vorherige verworfen.
+    """
+
+    def __init__(self):
+        """
+        Konstruktor.
+        """
+        self._partial = {}
+
+    def add(self, data, source=None):
+        """
+        Empfangenes Datagramm hinzufügen. Gibt die vollständige Nachricht zurück, sobald
+        alle Fragmente empfangen wurden, ansonsten `None`. Parameter:
+            * data: Empfangene Bytes
+            * source: Absenderadresse
+        """
+        message, sequence, index, count = decode(data)
+
+        if count <= 1:
+            return message
+
+        key = (source, message.get("cmd", ""))
+        partial = self._partial.get(key)
+
+        if partial is None or partial[0] != sequence:
+            partial = (sequence, [None] * count)
+            self._partial[key] = partial
+
+        fragments = partial[1]
+
+        if index >= len(fragments):
+            return None
+
+        fragments[index] = message
+
+        if None in fragments:
+            return None
+
+        del self._partial[key]
+
+        result = fragments[0]
+
+        for fragment in fragments[1:]:
+            _merge(result["data"], fragment["data"])
+
+        return result
+
+def _merge(target, source):
+    """
+    Aufgeteiltes Attribut `data` eines Fragments in das Ergebnis übernehmen.
+    Listen werden dabei aneinandergehängt und Dictionaries zusammengeführt.
+    """
+    for key, value in source.items():
+        if isinstance(value, list) and isinstance(target.get(key), list):
+            target[key].extend(value)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+def _split(data, body, type_, max_payload):
+    """
+    Dictionary `data` so auf mehrere Teile aufteilen, dass jeder Teil zusammen mit den
+    übrigen Attributen der Nachricht in ein Datagramm passt. Zu große Listen und
+    Dictionaries werden dabei, auch verschachtelt, ebenfalls aufgeteilt.
+    """
+    # Platz, der neben `data` für die übrigen Attribute der Nachricht benötigt wird
+    empty_size = len(_encode_body(type_, dict(body, data={})))
+    limit = max_payload - empty_size + _encoded_size({"data": {}}) - 8
+
+    return [part["data"] for part, _ in _split_entry("data", data, limit)]
+
+def _split_entry(key, value, limit):
+    """
+    Eintrag `{key: value}` in Teile aufteilen, die kodiert jeweils höchstens `limit` Bytes
+    groß sind. Gibt eine Liste mit Tupeln aus Teil und Größe zurück. Werden alle Teile
+    mit `_merge()` zusammengeführt, ergibt sich wieder der ursprüngliche Eintrag.
+    """
+    size = _encoded_size({key: value})
+
+    if size <= limit:
+        return [({key: value}, size)]
+
+    if not isinstance(value, (list, dict)):
+        raise ValueError(f"Attribut {key} ist zu groß für ein Datagramm")
+
+    # Größe des Eintrags mit leerer Liste bzw. leerem Dictionary
+    is_dict    = isinstance(value, dict)
+    empty_size = _encoded_size({key: {} if is_dict else []})
+    elements   = []
+
+    if is_dict:
+        # Verschachtelte Einträge bei Bedarf selbst wieder aufteilen. Ein Eintrag
+        # {k: v} ist dabei 3 Bytes größer als sein Anteil am Dictionary.
+        for sub_key, sub_value in value.items():
+            for part, part_size in _split_entry(sub_key, sub_value, limit - empty_size + 3):
+                elements.append((part, part_size - 3))
+    else:
+        for element in value:
+            element_size = _encoded_size(element)
+
+            if empty_size + element_size > limit:
+                raise ValueError(f"Element in {key} ist zu groß für ein Datagramm")
+
+            elements.append((element, element_size))
+
+    # Elemente zu möglichst großen Teilen zusammenfassen
+    parts      = []
+    chunk      = {} if is_dict else []
+    chunk_size = empty_size
+
+    for element, element_size in elements:
+        # Teile desselben verschachtelten Eintrags gehören in unterschiedliche Datagramme
+        collision = is_dict and any(sub_key in chunk for sub_key in element)
+
+        if chunk and (chunk_size + element_size > limit or collision):
+            parts.append(({key: chunk}, chunk_size))
+            chunk      = {} if is_dict else []
+            chunk_size = empty_size
+
+        if is_dict:
+            chunk.update(element)
+        else:
+            chunk.append(element)
+
+        chunk_size += element_size
+
+    parts.append(({key: chunk}, chunk_size))
+    return parts
+
+def _encoded_size(value):
+    """
+    Größe eines Werts im selbstbeschreibenden Format in Bytes.
+    """
+    buffer = bytearray()
+    _encode_value(value, buffer)
+    return len(buffer)
+
+def _encode_body(type_, body):
+    """
+    Attribute einer Nachricht (ohne `cmd`) kodieren.
+    """
+    buffer = bytearray()
+
+    if type_ == _TYPE_BY_CMD["vehicle_status_response"]:
+        _encode_vehicle(body.get("data", {}), buffer)
+    else:
+        _encode_value(body, buffer)
+
+    return bytes(buffer)
+
+def _encode_vehicle(data, buffer):
+    """
+    Fahrzeugparameter mit festem `struct`-Format kodieren.
+    """
+    fields_mask = 0
+    values = []
+
+    for index, field in enumerate(VEHICLE_FIELDS):
+        if field not in data:
+            continue
+
+        fields_mask |= 1 << index
+
+        if index == 0:
+            line_mask = 0
+
+            for bit, value in enumerate(data[field]):
+                if value:
+                    line_mask |= 1 << bit
+
+            values.append(line_mask)
+        else:
+            values.append(data[field])
+
+    buffer += _vehicle_struct(fields_mask).pack(fields_mask, *values)
+
+def _decode_vehicle(data, offset):
+    """
+    Gegenstück zu `_encode_vehicle()`.
+    """
+    fields_mask = data[offset]
+    values = _vehicle_struct(fields_mask).unpack_from(data, offset)
+    result = {}
+    value_index = 1
+
+    for index, field in enumerate(VEHICLE_FIELDS):
+        if not fields_mask & (1 << index):
+            continue
+
+        value = values[value_index]
+        value_index += 1
+
+        if index == 0:
+            result[field] = [(value >> bit) & 1 for bit in range(5)]
+        else:
+            result[field] = value
+
+    return result
+
+def _encode_value(value, buffer):
+    """
+    Einzelnen Wert im selbstbeschreibenden Format an `buffer` anhängen.
+    """
+    if value is None:
+        buffer.append(_NONE)
+    elif value is True:
+        buffer.append(_TRUE)
+    elif value is False:
+        buffer.append(_FALSE)
+    elif isinstance(value, int):
+        if -0x80 <= value < 0x80:
+            buffer += _INT8_S.pack(_INT8, value)
+        elif -0x80000000 <= value < 0x80000000:
+            buffer += _INT32_S.pack(_INT32, value)
+        else:
+            buffer += _INT64_S.pack(_INT64, value)
+    elif isinstance(value, float):
+        buffer += _FLOAT_S.pack(_FLOAT, value)
+    elif isinstance(value, str):
+        known = _ID_BY_STRING.get(value)
+
+        if known is not None:
+            buffer += _KNOWN_S.pack(_KNOWN_STR, known)
+        else:
+            encoded = value.encode()
+            buffer += _STR_S.pack(_STR, len(encoded))
+            buffer += encoded
+    elif isinstance(value, (list, tuple)):
+        buffer += _LIST_S.pack(_LIST, len(value))
+
+        for element in value:
+            _encode_value(element, buffer)
+    elif isinstance(value, dict):
+        buffer += _LIST_S.pack(_DICT, len(value))
+
+        for key, element in value.items():
+            _encode_value(str(key), buffer)
+            _encode_value(element, buffer)
+    else:
+        raise ValueError(f"Wert vom Typ {type(value).__name__} kann nicht kodiert werden")
+
+def _decode_value(data, offset):
+    """
+    Gegenstück zu `_encode_value()`. Gibt den Wert und die Position danach zurück.
+    """
+    tag = data[offset]
+
+    if tag == _NONE:
+        return None, offset + 1
+    elif tag == _TRUE:
+        return True, offset + 1
+    elif tag == _FALSE:
+        return False, offset + 1
+    elif tag == _INT8:
+        return _INT8_S.unpack_from(data, offset)[1], offset + _INT8_S.size
+    elif tag == _INT32:
+        return _INT32_S.unpack_from(data, offset)[1], offset + _INT32_S.size
+    elif tag == _INT64:
+        return _INT64_S.unpack_from(data, offset)[1], offset + _INT64_S.size
+    elif tag == _FLOAT:
+        return _FLOAT_S.unpack_from(data, offset)[1], offset + _FLOAT_S.size
+    elif tag == _KNOWN_STR:
+        return _STRING_BY_ID[_KNOWN_S.unpack_from(data, offset)[1]], offset + _KNOWN_S.size
+    elif tag == _STR:
+        length = _STR_S.unpack_from(data, offset)[1]
+        offset += _STR_S.size
+        return bytes(data[offset:offset + length]).decode(), offset + length
+    elif tag == _LIST:
+        count = _LIST_S.unpack_from(data, offset)[1]
+        offset += _LIST_S.size
+        result = []
+
+        for _ in range(count):
+            value, offset = _decode_value(data, offset)
+            result.append(value)
+
+        return result, offset
+    elif tag == _DICT:
+        count = _LIST_S.unpack_from(data, offset)[1]
+        offset += _LIST_S.size
+        result = {}
+
+        for _ in range(count):
+            key, offset = _decode_value(data, offset)
+            value, offset = _decode_value(data, offset)
+            result[key] = value
+
+        return result, offset
+    else:
+        raise ValueError(f"Ungültiges Typkennzeichen {tag}")
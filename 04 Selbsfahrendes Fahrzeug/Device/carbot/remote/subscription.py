@@ -0,0 +1,186 @@
+import math
+
+class Subscription:
+    """
+    Abonnement eines Clients der Fernsteuerung. Statt den Status periodisch abzufragen,
+    meldet sich der Client einmalig mit dem Kommando `subscribe` an und bekommt danach
+    mit der gewünschten Frequenz `status_update`-Nachrichten zugesendet.
+
+    Übertragen werden dabei nur die Einträge des Status, die sich gegenüber dem zuletzt
+    vom Client bestätigten Stand (Attribut `base` der Nachricht) geändert haben. Hat sich
+    nichts geändert, wird keine Änderung gesendet. Unabhängig davon wird alle
+    `keyframe_interval_s` Sekunden sowie immer dann, wenn kein bestätigter Stand vorliegt,
+    der vollständige Status als Keyframe (`base` = 0) übertragen, auch wenn er sich nicht
+    geändert hat. Ein ruhendes Fahrzeug sendet somit je Client einen Keyframe pro Intervall.
+
+    Die Stände selbst werden nicht hier, sondern im gemeinsamen `StatusStream` aller Clients
+    mit denselben Einträgen und demselben Nachrichtenformat verwaltet. Zusätzlich besitzt
+    jedes Abonnement ein Sendebudget in Bytes je Sekunde. Ist es aufgebraucht, wird die
+    Aktualisierung für diesen Client übersprungen. Verloren geht dabei nichts, da sich die
+    nächste Aktualisierung wieder auf den zuletzt bestätigten Stand bezieht.
+    """
+
+    def __init__(self, address, sendto, stream, rate, budget_bytes_s, keyframe_interval_s, now_s, auto_ack=False):
+        """
+        Konstruktor. Parameter:
+            * address: Adresse des Clients
+            * sendto: Funktion zum Senden an den Client mit den Parametern (data, address)
+            * stream: Gemeinsamer `StatusStream` für den Client
+            * rate: Anzahl Aktualisierungen je Sekunde
+            * budget_bytes_s: Sendebudget in Bytes je Sekunde
+            * keyframe_interval_s: Abstand der vollständigen Aktualisierungen in Sekunden
+            * now_s: Aktueller Zeitpunkt (time.monotonic)
+            * auto_ack: Gesendete Stände sofort als bestätigt betrachten (für Multicast)
+        """
+        self.address  = address
+        self.sendto   = sendto
+        self.stream   = stream
+        self.period_s = 1.0 / rate
+        self.auto_ack = auto_ack
+
+        self.budget_bytes_s      = budget_bytes_s
+        self.keyframe_interval_s = keyframe_interval_s
+        self.next_due_s          = now_s
+        self.last_seen_s         = now_s
+        self.last_keyframe_s     = -math.inf
+
+        self.acked = 0
+
+        # Token-Bucket für das Sendebudget, anfangs für eine Sekunde gefüllt
+        self._tokens          = budget_bytes_s
+        self._tokens_update_s = now_s
+
+        self.throttled = 0
+
+    def ack(self, frame, now_s):
+        """
+        Bestätigung des Clients für die Nachricht `frame` verarbeiten.
+        """
+        self.last_seen_s = now_s
+
+        if frame > self.acked and self.stream.has_frame(frame):
+            self.acked = frame
+
+    def is_due(self, now_s):
+        """
+        Prüft, ob die nächste Aktualisierung fällig ist, und berechnet ggf. den
+        nächsten Fälligkeitszeitpunkt.
+        """
+        if now_s < self.next_due_s:
+            return False
+
+        self.next_due_s += self.period_s
+
+        if self.next_due_s < now_s:
+            # Zu weit zurück (z.B. nach einer Pause): Neu synchronisieren statt nachzuholen
+            self.next_due_s = now_s + self.period_s
+
+        return True
+
+    def base_frame(self, now_s):
+        """
+        Gibt den Stand zurück, auf den sich die nächste Aktualisierung beziehen soll,
+        oder 0 für einen Keyframe.
+        """
+        if now_s - self.last_keyframe_s >= self.keyframe_interval_s or not self.stream.has_frame(self.acked):
+            self.last_keyframe_s = now_s
+            return 0
+
+        return self.acked
+
+    def consume_budget(self, size, now_s):
+        """
+        Prüft, ob noch genügend Sendebudget für `size` Bytes vorhanden ist, und zieht
+        es in diesem Fall ab.
+        """
+        self._tokens = min(self._tokens + (now_s - self._tokens_update_s) * self.budget_bytes_s, self.budget_bytes_s)
+        self._tokens_update_s = now_s
+
+        if size > self._tokens:
+            self.throttled += 1
+            return False
+
+        self._tokens -= size
+        return True
+
+class StatusStream:
+    """
+    Gemeinsame Abfolge von Ständen (Frames) für alle Abonnements mit denselben Einträgen
+    und demselben Nachrichtenformat. Ein neuer Stand wird nur angelegt, wenn sich der
+    Status geändert hat. Die kodierten Datagramme des aktuellen Stands werden je Bezugsstand
+    zwischengespeichert, so dass jede Nachricht nur einmal kodiert werden muss, egal wie
+    viele Clients sie erhalten. Da die meisten Clients den jeweils letzten Stand bestätigt
+    haben, genügt dafür meist eine einzige Kodierung je Stand und ein gemeinsamer Keyframe.
+    """
+
+    _MAX_HISTORY = 32
+
+    def __init__(self, fields, protocol):
+        """
+        Konstruktor. Parameter:
+            * fields: Tupel mit den Einträgen des Status oder `None` für alle
+            * protocol: Nachrichtenformat (`protocol.BINARY` oder `protocol.JSON`)
+        """
+        self.fields   = fields
+        self.protocol = protocol
+        self.frame    = 0
+
+        self._history = {}
+        self._encoded = {}
+
+    def has_frame(self, frame):
+        """
+        Prüft, ob der angegebene Stand noch bekannt ist.
+        """
+        return frame in self._history
+
+    def update(self, status):
+        """
+        Neuen Status übernehmen. Es wird nur dann ein neuer Stand angelegt, wenn sich der
+        Status vom letzten Stand unterscheidet. Das Dictionary darf danach nicht mehr
+        verändert werden.
+        """
+        if self.frame and self._history[self.frame] == status:
+            return
+
+        self.frame += 1
+        self._history[self.frame] = status
+        self._encoded = {}
+
+        if len(self._history) > self._MAX_HISTORY:
+            del self._history[min(self._history)]
+
+    def prune(self, oldest_frame):
+        """
+        Stände vor `oldest_frame` vergessen, da sie von keinem Client mehr benötigt werden.
+        """
+        for frame in [frame for frame in self._history if frame < oldest_frame and frame != self.frame]:
+            del self._history[frame]
+
+    def message(self, base):
+        """
+        Gibt die `status_update`-Nachricht für den aktuellen Stand bezogen auf den Stand
+        `base` zurück (0 = Keyframe).
+        """
+        status = self._history[self.frame]
+
+        if base == 0:
+            data = status
+        else:
+            base_status = self._history[base]
+            data = {key: value for key, value in status.items() if base_status.get(key) != value}
+
+        return {"cmd": "status_update", "frame": self.frame, "base": base, "data": data}
+
+    def datagrams(self, base, encode):
+        """
+        Kodierte Datagramme für den aktuellen Stand bezogen auf den Stand `base`. Werden
+        nur beim ersten Aufruf je Bezugsstand mit der Funktion `encode(message, protocol)`
+        kodiert und danach wiederverwendet.
+        """
+        try:
+            return self._encoded[base]
+        except KeyError:
+            datagrams = encode(self.message(base), self.protocol)
+            self._encoded[base] = (datagrams, sum(len(datagram) for datagram in datagrams))
+            return self._encoded[base]
@@ -1,5 +1,9 @@
-import collections, errno, json, socket, threading, time, traceback
+import asyncio, selectors, socket, threading, time, traceback
+from carbot.remote import protocol
+from carbot.remote.commands import CommandQueue
+from carbot.remote.clients import ClientRegistry
 from carbot.sensors.base import SensorBase
+from carbot.state import VehicleState
 
 # https://docs.python.org/3/library/socketserver.html#asynchronous-mixins
 # https://wiki.python.org/moin/UdpCommunication
@@ -8,11 +12,14 @@ from carbot.sensors.base import SensorBase
 # https://docs.python.org/3/library/collections.html#collections.deque
 # https://docs.python.org/3/library/threading.html#lock-objects
 # https://docs.python.org/3/library/json.html#module-json
+# https://docs.python.org/3/library/asyncio-protocol.html#datagram-protocols
+# https://docs.python.org/3/library/selectors.html
 
 class UDPRemoteControl(SensorBase):
     """
-    Fernsteuerung des Fahrzeugs durch entfernte UDP-Clients. Startet einen Hintergrundthread,
-    in dem ein UDP-Socket zum Empfangen von Steuerbefehlen geöffnet wird. Folgende Befehle
+    Fernsteuerung des Fahrzeugs durch entfernte UDP-Clients. Öffnet einen UDP-Socket zum
+    Empfangen von Steuerbefehlen, der entweder in einem Hintergrundthread oder in der asyncio
+    Event Loop des Fahrzeugs überwacht wird. Folgende Befehle
     werden dabei unterstützt:
 
         * Abruf der Fahrzeugparameter
@@ -23,7 +30,10 @@ class UDPRemoteControl(SensorBase):
         * Soundfile abspielen/stoppen
     
     Die Kommandos werden als UTF-8 kodiertes JSON-Objekt der Form `{"cmd": "...", ...}`
-    übertragen, wobei auf die meisten Kommandos keine Antwort erfolgt.
+    übertragen, wobei auf die meisten Kommandos keine Antwort erfolgt. Optional kann jedes
+    Kommando eine fortlaufende Sequenznummer `seq` enthalten (im Binärformat steht sie im
+    Nachrichtenkopf). Verspätet eintreffende, ältere Steuerbefehle werden dann verworfen,
+    siehe `CommandQueue`.
 
     Kommandos ohne direkte Antwort:
 
@@ -33,6 +43,10 @@ class UDPRemoteControl(SensorBase):
         * `{"cmd": "disable_sensor", "name": "…"}`
         * `{"cmd": "play_sound", "name": "…"}`
         * `{"cmd": "stop_sound", "name": "…"}`
+        * `{"cmd": "batch", "ops": [{"cmd": "set", …}, {"cmd": "set", …}, …]}`:
+          Mehrere Befehle in einem Datagramm. Die Steuerbefehle eines Batches werden
+          gemeinsam im selben Takt ausgeführt. Enthaltene Abfragen werden wie einzeln
+          gesendete Abfragen direkt beantwortet.
     
     Kommandos mit direkter Antwort:
 
@@ -45,186 +59,628 @@ class UDPRemoteControl(SensorBase):
         * `{"cmd": "sound_status"}`:
           liefert als Antwort ein Dictionary mit den beiden Attributen soundfiles
           und playing. Beide beinhalten jeweils eine Liste mit den Namen der Audiodateien.
+
+        * `{"cmd": "perf_stats"}` bzw. `{"cmd": "perf_stats", "reset": true}`:
+          liefert als Antwort die Laufzeitstatistik der Hauptschleife, siehe
+          `Vehicle.perf_stats()`. Mit `reset` wird die Statistik danach zurückgesetzt.
     
-    Die Nachrichten in beide Richtungen dürfen nicht größer als 4096 Bytes sein.
+        * `{"cmd": "ping", "t0": 1700000000.0, "rtt_s": 0.004, "offset_s": 0.12}`:
+          Liefert als Antwort `{"cmd": "pong", "t0": …, "t1": …, "t2": …}` mit dem Empfangs-
+          und Sendezeitpunkt nach der Uhr des Fahrzeugs, aus denen der Client die Paketlaufzeit
+          und die Uhrenabweichung berechnen kann. Die optionalen Attribute `rtt_s` und `offset_s`
+          enthalten die letzte Schätzung des Clients und werden in `perf_stats` ausgegeben.
+
+        * `{"cmd": "hello", "protocols": ["binary", "json"]}`:
+          Aushandlung des Nachrichtenformats. Liefert als Antwort `{"cmd": "hello_response",
+          "protocol": "binary", "version": 1, "features": ["batch"]}`, wenn das Binärformat
+          aus `protocol.py` angeboten wurde, ansonsten `"protocol": "json"`. `features`
+          enthält die optional unterstützten Erweiterungen.
+
+        * `{"cmd": "discover"}`:
+          Suche nach Fahrzeugen im lokalen Netz per Broadcast oder Multicast an die Gruppe
+          `protocol.DISCOVERY_GROUP`. Liefert als Antwort `{"cmd": "discover_response",
+          "name": "carbot", "version": 1, "protocols": […], "features": […]}`.
+
+    Statt die Statusabfragen periodisch zu senden, kann der Status auch abonniert werden:
+
+        * `{"cmd": "subscribe", "rate": 50, "fields": ["target_speed", "sensor_status", …]}`:
+          Meldet den Client für regelmäßige `status_update`-Nachrichten mit der angegebenen
+          Frequenz an. `fields` enthält die gewünschten Fahrzeugparameter sowie optional
+          `sensor_status` und `sound_status`. Ohne `fields` wird alles abonniert.
+
+        * `{"cmd": "status_update", "frame": 17, "base": 15, "data": {…}}`:
+          Vom Fahrzeug gesendete Aktualisierung. `data` enthält nur die Einträge, die sich
+          seit der Nachricht `base` geändert haben. Bei `base` = 0 handelt es sich um einen
+          vollständigen Keyframe. Siehe `Subscription`.
+          Mit dem optionalen Attribut `budget` kann beim Abonnieren ein eigenes Sendebudget in
+          Bytes je Sekunde festgelegt werden. Siehe `ClientRegistry`.
+
+        * `{"cmd": "ack", "frame": 17}`:
+          Bestätigt den Empfang einer Aktualisierung. Künftige Aktualisierungen beziehen
+          sich dann auf diesen Stand. Ohne Bestätigung oder erneute Anmeldung wird das
+          Abonnement nach einigen Sekunden beendet.
+
+        * `{"cmd": "unsubscribe"}`:
+          Beendet das Abonnement.
+
+    Clients mit denselben abonnierten Einträgen teilen sich dabei eine einmal kodierte
+    Nachricht, so dass zusätzliche Beobachter kaum Rechenzeit kosten. Ist eine Multicast-Gruppe
+    angegeben, wird der vollständige Status außerdem im Binärformat an diese gesendet. Beliebig
+    viele Empfänger können so ohne Anmeldung mitlesen.
+
+    Alle Kommandos können statt als JSON auch im Binärformat aus `protocol.py` gesendet
+    werden. Die Antwort erfolgt immer im Format der Anfrage. Im Binärformat werden große
+    Antworten dabei auf mehrere Datagramme aufgeteilt, als JSON dürfen die Nachrichten in
+    beide Richtungen nicht größer als 4096 Bytes sein.
+
+    Optional kann ein Totmannschalter aktiviert werden: Treffen vom Client, der zuletzt einen
+    Steuerbefehl gesendet hat, länger als `deadman_timeout_ms` keine Datagramme mehr ein (auch
+    keine `ping` oder `ack`), wird die Zielgeschwindigkeit auf 0 gesetzt. Bricht die Verbindung
+    zur Fernsteuerung ab, fährt das Fahrzeug somit nicht unkontrolliert weiter.
+
+    Die Methode `update()` wird nur aufgerufen, wenn der Netzwerk-Thread neue Daten
+    empfangen hat. Ohne Netzwerkverkehr kostet die Fernsteuerung daher keine Rechenzeit
+    in der Hauptschleife.
     """
+    update_frequency = SensorBase.ON_DEMAND
 
     _BUFFER_SIZE = 4096
-    _TIMEOUT_S = 0.05
 
-    def __init__(self, host, port):
-        """
-        Konstruktor. Startet einen Server-Thread und öffnet darin einen UDP-Socket für die
-        Abwicklung des entfernten Datenaustauschs.
+    # Abonnements: Höchste Frequenz, Abstand der Keyframes, Ablauf ohne Bestätigung
+    _MAX_SUBSCRIPTION_RATE  = 100
+    _KEYFRAME_INTERVAL_S    = 1.0
+    _SUBSCRIPTION_TIMEOUT_S = 5.0
+    _MULTICAST_TTL          = 1
+
+    # Mögliche Einträge eines abonnierten Status
+    _STATUS_FIELDS = VehicleState.FIELDS + ("sensor_status", "sound_status")
+
+    # Direkt im Netzwerk-Thread beantwortete Kommandos, alle anderen führt das Fahrzeug aus
+    _DIRECT_COMMANDS = (
+        "hello", "subscribe", "unsubscribe", "ack", "ping", "discover",
+        "vehicle_status", "sensor_status", "sound_status", "perf_stats",
+    )
+
+    # Vergessen der von den Clients gemeldeten Laufzeiten, wenn kein `ping` mehr eintrifft
+    _LINK_TIMEOUT_S = 60.0
+
+    # Optional unterstützte Erweiterungen, die in der `hello_response` mitgeteilt werden
+    _FEATURES = ["batch"]
 
-        Parameter:
+    def __init__(self, host, port, multicast=None, multicast_rate=20, deadman_timeout_ms=None, name=None):
+        """
+        Konstruktor. Parameter:
             * host: Hostname, an den der UDP-Socket gebunden wird
             * port: Portnummer, an den der UDP-Socket gebunden wird
+            * multicast: Optional Tupel (Gruppe, Port) für Statusmeldungen per Multicast
+            * multicast_rate: Anzahl Statusmeldungen je Sekunde an die Multicast-Gruppe
+            * deadman_timeout_ms: Zeit ohne Lebenszeichen der Fernsteuerung, nach der das
+              Fahrzeug angehalten wird, oder `None`, um den Totmannschalter zu deaktivieren
+            * name: Name des Fahrzeugs für die Suche mit `discover`, sonst der Hostname
         
         Wird für `host` ein leerer String übergeben, lauscht der Server auf allen Adressen und
         allen Netzwerkschnittstellen, wodurch er von entfernten Clients angesprochen werden kann.
         Wird stattdessen der Wert "localhost" oder eine IP-Adresse übergeben, kann der Server nur
         aus dem dazugehörigen IP-Netz (bei "localhost" also nur von der eigenen Maschine) erreicht
         werden.
+
+        Der Socket wird erst mit `start()` (eigener Netzwerk-Thread) oder `start_async()`
+        (asyncio Event Loop) geöffnet.
         """
         super().__init__()
 
         self._host = host or None
         self._port = port
+        self._name = name or socket.gethostname()
 
-        self._pending_commands = collections.deque()
-        self._vehicle_status   = {}
-        self._sensor_status    = {}
+        self._commands         = CommandQueue()
+        self._vehicle          = None
+        self._vehicle_state    = VehicleState()
         self._sound_player     = None
         self._available_sounds = []
         self._playing_sounds   = []
-        self._status_lock      = threading.Lock()
-        self._network_thread   = threading.Thread(target=self._network_thread_loop)
+        self._network_thread   = None
+        self._transports       = []
+        self._reassembler      = protocol.Reassembler()
+        self._sequence         = 0
+        self._wakeup           = None
+        self._task             = None
+        self._links            = {}
+        self._controller       = None
+        self._last_command_s   = None
+        self._multicast        = multicast
+        self._multicast_socket = None
+        self._multicast_rate   = min(max(float(multicast_rate), 0.1), self._MAX_SUBSCRIPTION_RATE)
+
+        self._clients = ClientRegistry(self._encode, self._KEYFRAME_INTERVAL_S, self._SUBSCRIPTION_TIMEOUT_S)
 
-        self._network_thread.setDaemon(True)
+        self._deadman_timeout_s = deadman_timeout_ms / 1000.0 if deadman_timeout_ms else None
+        self.deadman_trips      = 0
+
+    def start(self):
+        """
+        Server-Thread starten und darin einen UDP-Socket für die Abwicklung des entfernten
+        Datenaustauschs öffnen.
+        """
+        if self._network_thread:
+            return
+
+        self._open_multicast()
+
+        self._network_thread = threading.Thread(target=self._network_thread_loop)
+        self._network_thread.daemon = True
         self._network_thread.start()
-    
-    def _network_thread_loop(self):
+
+    async def start_async(self):
         """
-        Hauptschleife des Netzwerk-Threads. Öffnet den UDP-Socket und bearbeitet die darüber empfangenen
-        Kommandos. Anfragen nach dem Fahrzeugstatus werden anhand der letzten internen Kopie des
-        Fahrzeugstatus direkt beantwortet. Alle anderen Anfragen werden in einer FIFO-Queue gesammelt
-        und vom Fahrzeug-Thread bei nächster Gelegenheit abgearbeitet.
+        UDP-Socket öffnen und in der laufenden asyncio Event Loop überwachen. Die empfangenen
+        Datagramme werden dann direkt in der Event Loop bearbeitet, ein eigener Thread wird
+        nicht benötigt.
+        """
+        if self._transports:
+            return
+
+        loop = asyncio.get_running_loop()
+
+        for socket_ in self._open_sockets():
+            transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramProtocol(self), sock=socket_)
+            self._transports.append(transport)
+
+        self._open_multicast()
+
+        self._wakeup = asyncio.Event()
+        self._task   = loop.create_task(self._housekeeping_task())
+
+    def _open_sockets(self):
+        """
+        Nicht-blockierende UDP-Sockets für den Empfang der Kommandos öffnen. Für jede
+        Adressfamilie (IPv4 und IPv6) wird ein eigener Socket geöffnet. Damit sich beide
+        nicht in die Quere kommen, wird der IPv6-Socket mit `IPV6_V6ONLY` auf IPv6
+        beschränkt. Ohne diese Option würde er auch IPv4 annehmen und das Binden des
+        IPv4-Sockets an denselben Port mit „Address already in use” scheitern.
         """
-        # Sockets öffnen sowohl für IPv6 als auch IPv4
         sockets = []
+        bound   = set()
 
-        # FIXME: Wirft OSError: [Errno 98] Address already in use, wenn IPv4 und IPv6 verwendet wird.
-        # FIXME: Aktuell unklar, wie sowohl IPv4 als auch IPv6 unterstützt werden kann. Deshalb zunächst nur IPv4.
-        # for address_info in socket.getaddrinfo(self._host, self._port, proto=socket.IPPROTO_UDP):
-        #     try:
-        #         socket_ = socket.socket(
-        #             family = address_info[0],
-        #             type   = address_info[1] | socket.SOCK_NONBLOCK,
-        #             proto  = address_info[2]
-        #         )
-        #
-        #         socket_.bind((self._host if self._host else "", self._port))
-        #         sockets.append(socket_)
-        #     except Exception as exc:
-        #         print(f"Socket-Fehler: {exc}")
-        #         traceback.print_exc()
         try:
-            socket_ = socket.socket(
-                family = socket.AF_INET,
-                type   = socket.SOCK_DGRAM | socket.SOCK_NONBLOCK
-            )
+            address_infos = socket.getaddrinfo(self._host, self._port, type=socket.SOCK_DGRAM, flags=socket.AI_PASSIVE)
+        except Exception as exc:
+            print(f"Socket-Fehler: {exc}")
+            traceback.print_exc()
+            return sockets
+
+        for family, type_, proto, _, address in address_infos:
+            if (family, address) in bound:
+                continue
+
+            try:
+                socket_ = socket.socket(family, type_ | socket.SOCK_NONBLOCK, proto)
+
+                if family == socket.AF_INET6:
+                    socket_.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
 
-            socket_.bind((self._host if self._host else "", self._port))
-            sockets.append(socket_)
+                socket_.bind(address)
+                sockets.append(socket_)
+                bound.add((family, address))
+
+                if family == socket.AF_INET and self._host is None:
+                    self._join_discovery_group(socket_)
+            except Exception as exc:
+                print(f"Socket-Fehler: {exc}")
+                traceback.print_exc()
+
+        return sockets
+
+    def _join_discovery_group(self, socket_):
+        """
+        IPv4-Socket zusätzlich der Multicast-Gruppe für `discover` beitreten lassen. Ohne
+        Multicast-Route (z.B. ohne Netzwerkverbindung) schlägt dies fehl, das Fahrzeug ist
+        dann aber weiterhin per Broadcast und direkt erreichbar.
+        """
+        try:
+            membership = socket.inet_aton(protocol.DISCOVERY_GROUP) + socket.inet_aton("0.0.0.0")
+            socket_.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        except OSError as exc:
+            print(f"Multicast-Gruppe für die Fahrzeugsuche nicht verfügbar: {exc}")
+
+    def _open_multicast(self):
+        """
+        Socket zum Senden an die Multicast-Gruppe öffnen, sofern eine angegeben wurde, und
+        die Gruppe als Empfänger aller Statusmeldungen anmelden. Die Gültigkeitsdauer (TTL)
+        der Datagramme ist auf das lokale Netz beschränkt.
+        """
+        if not self._multicast or self._multicast_socket:
+            return
+
+        try:
+            self._multicast_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK)
+            self._multicast_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self._MULTICAST_TTL)
+
+            self._clients.add_multicast(
+                tuple(self._multicast), self._multicast_socket.sendto, protocol.BINARY, self._multicast_rate, time.monotonic()
+            )
         except Exception as exc:
             print(f"Socket-Fehler: {exc}")
             traceback.print_exc()
-        
-        # UDP-Pakete über die Sockets empfangen und verarbeiten
-        sockets_without_data = 0
+
+            if self._multicast_socket:
+                self._multicast_socket.close()
+                self._multicast_socket = None
+
+    def _network_thread_loop(self):
+        """
+        Hauptschleife des Netzwerk-Threads. Öffnet die UDP-Sockets und wartet blockierend,
+        bis auf mindestens einem davon Daten eintreffen. Danach werden alle bis dahin
+        empfangenen Datagramme abgeholt und bearbeitet, bevor wieder gewartet wird. Der
+        Thread benötigt somit keine Rechenzeit, solange keine Kommandos empfangen werden,
+        und reagiert ohne Verzögerung, sobald Kommandos eintreffen.
+        """
+        selector = selectors.DefaultSelector()
+
+        for socket_ in self._open_sockets():
+            selector.register(socket_, selectors.EVENT_READ)
+
+        if not selector.get_map():
+            return
 
         while True:
-            # FIXME: Prüfen
-            if sockets_without_data == len(sockets):
-                # Kleine Pause zur Entlastung der CPU, wenn kein Socket Daten liefert
-                time.sleep(self._TIMEOUT_S)
+            # Warten, bis Daten eintreffen oder die nächste Aktualisierung fällig ist
+            timeout_s = self._housekeeping()
 
-            sockets_without_data = 0
+            for key, _ in selector.select(timeout_s):
+                self._drain(key.fileobj)
+
+    async def _housekeeping_task(self):
+        """
+        Task zum Versenden der abonnierten Aktualisierungen und zur Überwachung des
+        Totmannschalters im asyncio-Betrieb. Ruht, solange es nichts zu tun gibt.
+        """
+        try:
+            while True:
+                timeout_s = self._housekeeping()
 
-            for socket_ in sockets:
                 try:
-                    # Neue Daten vom Socket empfangen und verarbeiten
-                    data, address = socket_.recvfrom(self._BUFFER_SIZE)
-                    command = json.loads(data.decode())
-
-                    if not "cmd" in command:
-                        continue
-
-                    if command["cmd"] == "vehicle_status":
-                        # Abfrage des Fahrzeugstatus direkt beantworten
-                        # FIXME: Prüfen
-                        # with self._status_lock:
-                        response = json.dumps({"cmd": "vehicle_status_response", "data": self._vehicle_status})
-                        socket_.sendto(response.encode(), address)
-                    elif command["cmd"] == "sensor_status":
-                        # Abfrage des Sensorstatus direkt beantworten
-                        # FIXME: Prüfen
-                        # with self._status_lock:
-                        response = json.dumps({"cmd": "sensor_status_response", "data": self._sensor_status})
-                        socket_.sendto(response.encode(), address)
-                    elif command["cmd"] == "sound_status":
-                        # Abfrage nach verfügbaren Soundfiles direkt beantworten
-                        # FIXME: Prüfen
-                        # with self._status_lock:
-                        sound_status = {"soundfiles": self._available_sounds, "playing": self._playing_sounds}
-                        response = json.dumps({"cmd": "sound_status_response", "data": sound_status})
-                        socket_.sendto(response.encode(), address)
-                    else:
-                        # Alle anderen Steuerbefehle im Fahrzeug-Thread bearbeiten
-                        self._pending_commands.append(command)
-                except OSError as err:
-                    if err.errno == errno.EAGAIN or err.errno == errno.EWOULDBLOCK:
-                        sockets_without_data += 1
-                        continue
-                    else:
-                        print(f"Socket-Fehler: {err}")
-                        traceback.print_exc()
-                except Exception as exc:
-                    print(f"Fehler im Netzwerk-Thread: {exc}")
-                    traceback.print_exc()
+                    await asyncio.wait_for(self._wakeup.wait(), timeout_s)
+                except asyncio.TimeoutError:
+                    pass
 
-    def update(self, vehicle):
+                self._wakeup.clear()
+        except Exception as exc:
+            print(f"Fehler im Netzwerk-Task, Abonnements und Totmannschalter sind ausgefallen: {exc}")
+            traceback.print_exc()
+
+    def _housekeeping(self):
         """
-        Im Fahrzeug-Thread regelmäßig aufgerufene Methode, in der der aktuelle Fahrzeugstatus ermittelt
-        sowie das Fahrzeug gesteuert werden kann. Der aktuelle Fahrzeugstatus wird als internes Objekt
-        zwischengespeichert, um Anfragen nach dem Status direkt im Server-Thread bearbeiten zu können.
-        Anschließend werden die vom Server-Thread zwischenzeitlich gesammelten Steuerbefehle abgearbeitet.
-        """
-        # Aktuellen Fahrzeugstatus merken
-        if self._status_lock.acquire(blocking=False):
-            # Fahrzeugstatus ermitteln
-            self._vehicle_status = {
-                "line_pattern":      vehicle.line_pattern,
-                "target_speed":      vehicle.target_speed,
-                "obstacle_pushback": vehicle.obstacle_pushback,
-                "direction":         vehicle.direction,
-                "speed_total":       vehicle.speed_total,
-                "speed_left":        vehicle.speed_left,
-                "speed_right":       vehicle.speed_right,
-            }
+        Zeitgesteuerte Aufgaben erledigen. Gibt die Zeit in Sekunden zurück, nach der die
+        Methode spätestens wieder aufgerufen werden muss, oder `None`, wenn erst wieder
+        beim Eintreffen neuer Daten etwas zu tun ist.
+        """
+        timeouts_s = [timeout_s for timeout_s in (self._push_subscriptions(), self._check_deadman()) if timeout_s is not None]
+        return min(timeouts_s) if timeouts_s else None
 
-            self._sensor_status = vehicle.sensor_status.copy()
-        
-            # Soundplayer-Objekt merken und ggf. verfügbare Sounds einlesen, wenn der Player aktiviert wird
-            if not self._sound_player:
-                try:
-                    sound_player = vehicle.get_sensor("sound:player")
-                except KeyError:
-                    sound_player = None
-
-                if sound_player and sound_player.is_active:
-                    self._sound_player     = sound_player
-                    self._available_sounds = self._sound_player.soundfiles
-                    self._playing_sounds   = self._sound_player.playing
-            else:
-                if self._sound_player.is_active:
-                    self._playing_sounds = self._sound_player.playing
-                else:
-                    self._sound_player     = None
-                    self._available_sounds = []
-                    self._playing_sounds   = []
-
-            # Sperre aufheben
-            self._status_lock.release()
-        
-        # Empfangene Steuerbefehle verarbeiten
+    def _arm_deadman(self, address):
+        """
+        Totmannschalter für den Client scharf schalten, der gerade einen Steuerbefehl
+        gesendet hat.
+        """
+        if not self._deadman_timeout_s:
+            return
+
+        armed = self._controller is not None
+
+        self._controller     = address
+        self._last_command_s = time.monotonic()
+
+        if not armed and self._wakeup:
+            self._wakeup.set()
+
+    def _check_deadman(self):
+        """
+        Prüft, ob die steuernde Fernsteuerung noch Lebenszeichen sendet, und hält das
+        Fahrzeug andernfalls an. Gibt die verbleibende Zeit bis zur nächsten Prüfung
+        zurück oder `None`, wenn der Totmannschalter nicht scharf ist.
+        """
+        if self._controller is None:
+            return None
+
+        remaining_s = self._last_command_s + self._deadman_timeout_s - time.monotonic()
+
+        if remaining_s > 0:
+            return remaining_s
+
+        print(f"Keine Lebenszeichen mehr von {self._controller}: Fahrzeug wird angehalten")
+
+        self._controller    = None
+        self.deadman_trips += 1
+
+        self._commands.put({"cmd": "set", "attr": "target_speed", "value": 0.0})
+        self.pending = True
+        return None
+
+    def _push_subscriptions(self):
+        """
+        Fällige Aktualisierungen an alle Abonnenten senden und abgelaufene Abonnements
+        entfernen. Gibt die Zeit bis zur nächsten fälligen Aktualisierung in Sekunden
+        zurück oder `None`, wenn keine Abonnements bestehen.
+        """
+        if not len(self._clients):
+            return None
+
+        now_s = time.monotonic()
+        next_due_s = self._clients.push(self._status, now_s)
+
+        return max(next_due_s - now_s, 0.0) if next_due_s is not None else None
+
+    def _status(self, fields):
+        """
+        Aktuellen Status mit den angegebenen Einträgen als flaches Dictionary zusammenstellen.
+        """
+        status  = {}
+        vehicle = self._vehicle
+
+        if vehicle:
+            state = vehicle.snapshot(self._vehicle_state)
+
+            for field in VehicleState.FIELDS:
+                if fields is None or field in fields:
+                    status[field] = getattr(state, field)
+
+            if fields is None or "sensor_status" in fields:
+                status["sensor_status"] = vehicle.sensor_status
+
+        if fields is None or "sound_status" in fields:
+            status["sound_status"] = {"soundfiles": self._available_sounds, "playing": self._playing_sounds}
+
+        return status
+
+    def _encode(self, message, protocol_):
+        """
+        Nachricht mit der nächsten Sequenznummer im angegebenen Format kodieren.
+        """
+        self._sequence += 1
+        return protocol.encode(message, protocol_, self._sequence)
+
+    def _send(self, message, protocol_, address, sendto):
+        """
+        Nachricht im angegebenen Format an einen Client senden.
+        """
+        for datagram in self._encode(message, protocol_):
+            sendto(datagram, address)
+
+    def _drain(self, socket_):
+        """
+        Alle wartenden Datagramme eines nicht-blockierenden Sockets abholen und bearbeiten.
+        """
         while True:
             try:
-                command = self._pending_commands.pop()
-            except IndexError:
-                break
+                data, address = socket_.recvfrom(self._BUFFER_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as err:
+                print(f"Socket-Fehler: {err}")
+                traceback.print_exc()
+                return
+
+            self._handle_datagram(data, address, socket_.sendto)
+
+    def _handle_datagram(self, data, address, sendto):
+        """
+        Einzelnes empfangenes Datagramm bearbeiten. Parameter:
+            * data: Empfangene Bytes
+            * address: Absenderadresse
+            * sendto: Funktion zum Senden einer Antwort mit den Parametern (data, address)
+        """
+        try:
+            command = self._reassembler.add(data, address)
+
+            if not command or not "cmd" in command:
+                return
+
+            if address == self._controller:
+                # Lebenszeichen der steuernden Fernsteuerung
+                self._last_command_s = time.monotonic()
+
+            reply_protocol = protocol.BINARY if protocol.is_binary(data) else protocol.JSON
+            self._handle_command(command, reply_protocol, address, sendto)
+        except Exception as exc:
+            print(f"Fehler beim Bearbeiten eines Datagramms: {exc}")
+            traceback.print_exc()
+
+    def _handle_command(self, command, reply_protocol, address, sendto):
+        """
+        Empfangenes Kommando bearbeiten. Anfragen nach dem Fahrzeugstatus werden anhand der
+        letzten vom Fahrzeug veröffentlichten Momentaufnahme direkt beantwortet. Alle anderen
+        Anfragen werden in einer `CommandQueue` gesammelt und vom Fahrzeug bei nächster
+        Gelegenheit abgearbeitet. Parameter:
+            * command: Dekodiertes Kommando
+            * reply_protocol: Nachrichtenformat für Antworten
+            * address: Absenderadresse
+            * sendto: Funktion zum Senden einer Antwort mit den Parametern (data, address)
+        """
+        vehicle = self._vehicle
+
+        def _reply(response):
+            self._send(response, reply_protocol, address, sendto)
+
+        if command["cmd"] == "hello":
+            # Nachrichtenformat aushandeln. Der Client hat sich neu angemeldet,
+            # weshalb seine Sequenznummern wieder von vorne beginnen dürfen.
+            self._commands.reset_source(address)
+            binary = protocol.BINARY in command.get("protocols", [])
+            _reply({
+                "cmd": "hello_response",
+                "protocol": protocol.BINARY if binary else protocol.JSON,
+                "version": protocol.VERSION,
+                "features": self._FEATURES,
+            })
+            return
+        elif command["cmd"] == "discover":
+            # Suche nach Fahrzeugen im lokalen Netz
+            _reply({
+                "cmd": "discover_response",
+                "name": self._name,
+                "version": protocol.VERSION,
+                "protocols": [protocol.BINARY, protocol.JSON],
+                "features": self._FEATURES,
+            })
+            return
+        elif command["cmd"] == "subscribe":
+            # Status abonnieren bzw. bestehendes Abonnement erneuern
+            rate   = min(max(float(command.get("rate", 10)), 0.1), self._MAX_SUBSCRIPTION_RATE)
+            fields = command.get("fields")
+
+            if fields is not None:
+                fields = [field for field in fields if field in self._STATUS_FIELDS]
+
+            budget = command.get("budget")
+
+            self._clients.subscribe(
+                address, sendto, reply_protocol, rate, fields, time.monotonic(),
+                budget_bytes_s=max(float(budget), 1.0) if budget else None,
+            )
+
+            if self._wakeup:
+                self._wakeup.set()
+
+            # Fahrzeug benachrichtigen, damit es den Status des Soundplayers ermittelt
+            self.pending = True
+            return
+        elif command["cmd"] == "unsubscribe":
+            self._clients.unsubscribe(address)
+            return
+        elif command["cmd"] == "ack":
+            self._clients.ack(address, int(command.get("frame", 0)), time.monotonic())
+            return
+        elif command["cmd"] == "ping":
+            # Zeitstempel für die Messung der Laufzeit und der Uhrenabweichung zurücksenden
+            received_s = time.time()
+
+            if "rtt_s" in command:
+                self._links[address] = {
+                    "rtt_s":    command.get("rtt_s"),
+                    "offset_s": command.get("offset_s"),
+                    "seen_s":   time.monotonic(),
+                }
+
+            _reply({"cmd": "pong", "t0": command.get("t0", 0.0), "t1": received_s, "t2": time.time()})
+            return
+        elif command["cmd"] == "vehicle_status":
+            # Abfrage des Fahrzeugstatus direkt beantworten
+            vehicle_status = vehicle.snapshot(self._vehicle_state).as_dict() if vehicle else {}
+            _reply({"cmd": "vehicle_status_response", "data": vehicle_status})
+        elif command["cmd"] == "sensor_status":
+            # Abfrage des Sensorstatus direkt beantworten
+            sensor_status = vehicle.sensor_status if vehicle else {}
+            _reply({"cmd": "sensor_status_response", "data": sensor_status})
+        elif command["cmd"] == "sound_status":
+            # Abfrage nach verfügbaren Soundfiles direkt beantworten
+            sound_status = {"soundfiles": self._available_sounds, "playing": self._playing_sounds}
+            _reply({"cmd": "sound_status_response", "data": sound_status})
+        elif command["cmd"] == "perf_stats":
+            # Laufzeitstatistik direkt beantworten und ggf. zurücksetzen
+            perf_stats = vehicle.perf_stats() if vehicle else {}
+            perf_stats["commands"] = self._commands.stats
+            perf_stats["clients"]  = self._clients.stats
+            perf_stats["link"]     = self._link_stats()
+            _reply({"cmd": "perf_stats_response", "data": perf_stats})
+
+            if vehicle and command.get("reset", False):
+                vehicle.reset_perf_stats()
+        elif command["cmd"] == "batch":
+            # Enthaltene Abfragen direkt beantworten, die Steuerbefehle dagegen als
+            # Ganzes an das Fahrzeug weiterreichen, damit sie im selben Takt wirken
+            ops = [op for op in command.get("ops", []) if isinstance(op, dict) and "cmd" in op]
+
+            for op in ops:
+                if op["cmd"] in self._DIRECT_COMMANDS:
+                    self._handle_command(op, reply_protocol, address, sendto)
+
+            ops = [op for op in ops if not op["cmd"] in self._DIRECT_COMMANDS and op["cmd"] != "batch"]
+
+            if not ops or not self._commands.put(dict(command, ops=ops), address):
+                return
+
+            self._arm_deadman(address)
+        else:
+            # Alle anderen Steuerbefehle im Fahrzeug-Thread bearbeiten, sofern sie
+            # nicht von einem neueren Befehl desselben Clients überholt wurden
+            if not self._commands.put(command, address):
+                return
+
+            self._arm_deadman(address)
+
+        # Fahrzeug benachrichtigen, damit es die Befehle abarbeitet
+        # und den Status des Soundplayers aktualisiert
+        self.pending = True
+
+    @property
+    def command_stats(self):
+        """
+        Zähler der Befehlswarteschlange als Dictionary, siehe `CommandQueue.stats`.
+        """
+        return self._commands.stats
+
+    def _link_stats(self):
+        """
+        Von den Clients gemeldete Laufzeiten sowie den Zustand des Totmannschalters als
+        Dictionary zusammenstellen.
+        """
+        now_s = time.monotonic()
+
+        for address in [address for address, link in self._links.items() if now_s - link["seen_s"] > self._LINK_TIMEOUT_S]:
+            del self._links[address]
+
+        return {
+            "deadman_timeout_s":  self._deadman_timeout_s,
+            "deadman_trips":      self.deadman_trips,
+            "last_command_age_s": now_s - self._last_command_s if self._last_command_s is not None else None,
+            "clients": {
+                f"{address[0]}:{address[1]}": {"rtt_s": link["rtt_s"], "offset_s": link["offset_s"]}
+                for address, link in self._links.items()
+            },
+        }
+
+    def attach(self, vehicle):
+        """
+        Fahrzeug für den Netzwerk-Thread merken, sobald die Fernsteuerung dem Fahrzeug
+        hinzugefügt wird. Statusabfragen und Abonnements werden damit auch dann vollständig
+        beantwortet, wenn noch kein Steuerbefehl eingetroffen ist. Im ersten Takt wird
+        außerdem der Soundplayer gesucht, auch für die Multicast-Gruppe.
+        """
+        self._vehicle = vehicle
+        self.pending  = True
+
+    def update(self, vehicle):
+        """
+        Im Fahrzeug-Thread bei Bedarf aufgerufene Methode, in der das Fahrzeug gesteuert werden kann.
+        Der Fahrzeugstatus muss hier nicht mehr zwischengespeichert werden, da der Netzwerk-Thread
+        direkt die vom Fahrzeug veröffentlichten Momentaufnahmen liest. Lediglich der Status des
+        Soundplayers wird aktualisiert. Anschließend werden die vom Server-Thread zwischenzeitlich
+        gesammelten Steuerbefehle abgearbeitet.
+        """
+        # Soundplayer-Objekt merken und ggf. verfügbare Sounds einlesen, wenn der Player aktiviert wird.
+        # Die Listen werden dabei immer als Ganzes ersetzt, so dass der Netzwerk-Thread sie ohne Sperre
+        # lesen kann.
+        if not self._sound_player:
+            try:
+                sound_player = vehicle.get_sensor("sound:player")
+            except KeyError:
+                sound_player = None
 
+            if sound_player and sound_player.is_active:
+                self._sound_player     = sound_player
+                self._available_sounds = self._sound_player.soundfiles
+                self._playing_sounds   = self._sound_player.playing
+        else:
+            if self._sound_player.is_active:
+                self._playing_sounds = self._sound_player.playing
+            else:
+                self._sound_player     = None
+                self._available_sounds = []
+                self._playing_sounds   = []
+        
+        # Empfangene Steuerbefehle in der Reihenfolge ihres Eintreffens verarbeiten
+        for command in self._commands.drain():
             command_ = {
                 "cmd":   command.get("cmd", ""),
                 "attr":  command.get("attr", ""),
@@ -264,3 +720,26 @@ class UDPRemoteControl(SensorBase):
             elif command_["cmd"] == "stop_sound":
                 if self._sound_player:
                     self._sound_player.stop(command_["name"])
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    """
+    Bindeglied zwischen der asyncio Event Loop und `UDPRemoteControl`.
+    """
+
+    def __init__(self, remote_control):
+        """
+        Konstruktor. Parameter:
+            * remote_control: UDPRemoteControl-Objekt, an das die Datagramme weitergereicht werden
+        """
+        self._remote_control = remote_control
+        self._transport      = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data, address):
+        self._remote_control._handle_datagram(data, address, self._transport.sendto)
+
+    def error_received(self, exc):
+        print(f"Socket-Fehler: {exc}")
@@ -0,0 +1,142 @@
+import asyncio, time
+
+class TickScheduler:
+    """
+    Taktgeber für die Hauptschleife des Fahrzeugs. Im Gegensatz zu einer einfachen
+    Pause nach jedem Durchlauf wird hier mit absoluten Zeitpunkten (Deadlines) gerechnet,
+    so dass sich Laufzeitschwankungen einzelner Durchläufe nicht aufsummieren und die
+    Schleife im Mittel exakt mit der gewünschten Frequenz läuft.
+
+    Dauert ein Durchlauf länger als ein Takt, gibt es zwei Strategien:
+
+        * SKIP: Verpasste Takte werden übersprungen und der nächste Durchlauf findet
+          zum nächsten regulären Taktzeitpunkt statt. (Standard)
+
+        * CATCH_UP: Verpasste Takte werden ohne Pause nachgeholt, höchstens jedoch
+          `max_catch_up` Takte. Liegt die Schleife weiter zurück, wird neu synchronisiert.
+
+    Zur Diagnose werden folgende Zähler geführt und können jederzeit ausgelesen werden:
+
+        * ticks: Anzahl der bisherigen Durchläufe
+        * overruns: Anzahl der Durchläufe, die ihren Takt überschritten haben
+        * skipped_ticks: Anzahl der übersprungenen Takte
+        * jitter_s: Verspätung des letzten Durchlaufs gegenüber seiner Deadline
+        * max_jitter_s: Größte bisher gemessene Verspätung
+        * mean_jitter_s: Durchschnittliche Verspätung
+    """
+
+    SKIP, CATCH_UP = 0, 1
+
+    def __init__(self, frequency, policy=SKIP, max_catch_up=5):
+        """
+        Konstruktor. Parameter:
+            * frequency: Anzahl der Durchläufe pro Sekunde
+            * policy: Strategie bei verpassten Takten (SKIP oder CATCH_UP)
+            * max_catch_up: Maximal nachzuholende Takte bei CATCH_UP
+        """
+        if frequency <= 0:
+            raise ValueError("Die Taktfrequenz muss größer als 0 sein")
+
+        self.frequency     = frequency
+        self.period_s      = 1.0 / frequency
+        self.policy        = policy
+        self.max_catch_up  = max_catch_up
+
+        self._deadline_s   = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Alle Zähler auf null zurücksetzen.
+        """
+        self.ticks          = 0
+        self.overruns       = 0
+        self.skipped_ticks  = 0
+        self.jitter_s       = 0.0
+        self.max_jitter_s   = 0.0
+        self._jitter_sum_s  = 0.0
+
+    @property
+    def mean_jitter_s(self):
+        """
+        Durchschnittliche Verspätung aller bisherigen Durchläufe in Sekunden.
+        """
+        return self._jitter_sum_s / self.ticks if self.ticks else 0.0
+
+    @property
+    def stats(self):
+        """
+        Gibt alle Zähler als Dictionary zurück, z.B. zur Übertragung an die Fernsteuerung.
+        """
+        return {
+            "frequency":     self.frequency,
+            "ticks":         self.ticks,
+            "overruns":      self.overruns,
+            "skipped_ticks": self.skipped_ticks,
+            "jitter_s":      self.jitter_s,
+            "max_jitter_s":  self.max_jitter_s,
+            "mean_jitter_s": self.mean_jitter_s,
+        }
+
+    def wait(self):
+        """
+        Thread bis zur nächsten Deadline schlafen legen. Muss einmal je Durchlauf der
+        Schleife aufgerufen werden. Gibt die Verspätung des aktuellen Durchlaufs zurück.
+        """
+        now_s = time.monotonic()
+
+        if self._deadline_s is None:
+            # Erster Aufruf: Sofort loslaufen und von hier aus takten
+            self._deadline_s = now_s
+        elif now_s < self._deadline_s:
+            time.sleep(self._deadline_s - now_s)
+            now_s = time.monotonic()
+
+        return self._advance(now_s)
+
+    async def wait_async(self):
+        """
+        Wie `wait()`, aber als Coroutine für asyncio. Pausiert nur den aktuellen Task,
+        so dass andere Tasks bis zur nächsten Deadline weiterlaufen können.
+        """
+        now_s = time.monotonic()
+
+        if self._deadline_s is None:
+            self._deadline_s = now_s
+        elif now_s < self._deadline_s:
+            await asyncio.sleep(self._deadline_s - now_s)
+            now_s = time.monotonic()
+
+        return self._advance(now_s)
+
+    def _advance(self, now_s):
+        """
+        Zähler aktualisieren und nächste Deadline berechnen, nachdem der aktuelle
+        Zeitpunkt `now_s` erreicht wurde.
+        """
+        jitter_s = now_s - self._deadline_s
+
+        self.ticks         += 1
+        self.jitter_s       = jitter_s
+        self._jitter_sum_s += jitter_s
+
+        if jitter_s > self.max_jitter_s:
+            self.max_jitter_s = jitter_s
+
+        if jitter_s < self.period_s:
+            self._deadline_s += self.period_s
+            return jitter_s
+
+        # Takt überschritten: Mindestens eine Deadline wurde verpasst
+        self.overruns += 1
+        missed = int(jitter_s / self.period_s)
+
+        if self.policy == self.CATCH_UP and missed <= self.max_catch_up:
+            # Verpasste Takte ohne Pause nachholen
+            self._deadline_s += self.period_s
+        else:
+            # Verpasste Takte überspringen und auf das Taktraster zurückkehren
+            self.skipped_ticks += missed
+            self._deadline_s   += (missed + 1) * self.period_s
+
+        return jitter_s
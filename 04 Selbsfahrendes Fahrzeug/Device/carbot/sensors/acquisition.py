@@ -0,0 +1,133 @@
+import asyncio, collections, threading, time, traceback
+from carbot.scheduler import TickScheduler
+
+# Einzelner Messwert mit Zeitstempel (time.monotonic) der Messung
+Sample = collections.namedtuple("Sample", ["value", "timestamp_s"])
+
+class Sampler:
+    """
+    Hilfsklasse zum Auslesen langsamer Hardware außerhalb der Hauptschleife. Die
+    übergebene Lesefunktion wird in einem eigenen Hintergrundthread mit fester Frequenz
+    aufgerufen und ihr Ergebnis samt Zeitstempel als letzter Messwert abgelegt.
+
+    Die Sensoren lesen in ihrer `update()`-Methode dann nur noch den zwischengespeicherten
+    Wert, so dass die Dauer eines Takts der Hauptschleife nicht mehr davon abhängt, wie
+    schnell die Hardware antwortet. Ist der letzte Messwert älter als `max_age_s`, gilt er
+    als veraltet, was über das Attribut `is_stale` geprüft werden kann.
+
+    Der Messwert wird als unveränderliches Tupel in einem einzigen Attribut abgelegt.
+    Das Lesen und Schreiben ist damit ohne zusätzliche Sperre threadsicher.
+
+    Statt mit `start()` einen eigenen Thread zu starten, kann mit `start_async()` auch ein
+    asyncio-Task gestartet werden. Die Lesefunktion wird dann im Thread-Pool der Event Loop
+    ausgeführt, so dass sie die Event Loop nicht blockiert.
+    """
+
+    def __init__(self, read, frequency, max_age_s=None):
+        """
+        Konstruktor. Parameter:
+            * read: Funktion ohne Parameter, die einen neuen Messwert liefert
+            * frequency: Anzahl der Messungen pro Sekunde
+            * max_age_s: Alter, ab dem ein Messwert als veraltet gilt (Default: drei Messintervalle)
+        """
+        self._read      = read
+        self._frequency = frequency
+        self._max_age_s = max_age_s if max_age_s else 3.0 / frequency
+        self._running   = False
+        self._thread    = None
+        self._task      = None
+        self._failing   = False
+
+        self.sample = Sample(None, 0.0)
+        self.errors = 0
+
+    def start(self):
+        """
+        Hintergrundthread für die Messungen starten, sofern er nicht schon läuft.
+        """
+        if self._running:
+            return
+
+        self._running = True
+        self._thread  = threading.Thread(target=self._thread_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def start_async(self):
+        """
+        Messungen als Task in der laufenden asyncio Event Loop starten, sofern sie nicht
+        schon laufen.
+        """
+        if self._running:
+            return
+
+        self._running = True
+        self._task    = asyncio.get_running_loop().create_task(self._task_loop())
+
+    def stop(self):
+        """
+        Hintergrundthread bzw. Task nach der laufenden Messung beenden.
+        """
+        self._running = False
+
+    async def _task_loop(self):
+        """
+        Hauptschleife des asyncio-Tasks.
+        """
+        loop = asyncio.get_running_loop()
+        scheduler = TickScheduler(self._frequency)
+
+        while self._running:
+            await scheduler.wait_async()
+            await loop.run_in_executor(None, self.acquire)
+
+    def _thread_loop(self):
+        """
+        Hauptschleife des Hintergrundthreads.
+        """
+        scheduler = TickScheduler(self._frequency)
+
+        while self._running:
+            scheduler.wait()
+            self.acquire()
+
+    def acquire(self):
+        """
+        Einen neuen Messwert lesen und ablegen. Fehler beim Lesen werden gezählt und
+        beim ersten Auftreten ausgegeben. Der alte Messwert bleibt dann erhalten und
+        veraltet mit der Zeit.
+        """
+        try:
+            value = self._read()
+        except Exception as exc:
+            if not self._failing:
+                print(f"Fehler beim Auslesen eines Sensors: {exc}")
+                traceback.print_exc()
+
+            self.errors  += 1
+            self._failing = True
+            return
+
+        self._failing = False
+        self.sample   = Sample(value, time.monotonic())
+
+    @property
+    def value(self):
+        """
+        Zuletzt gemessener Wert oder None, wenn noch keine Messung erfolgt ist.
+        """
+        return self.sample.value
+
+    @property
+    def age_s(self):
+        """
+        Alter des letzten Messwerts in Sekunden.
+        """
+        return time.monotonic() - self.sample.timestamp_s
+
+    @property
+    def is_stale(self):
+        """
+        True, wenn noch kein Messwert vorliegt oder der letzte Messwert veraltet ist.
+        """
+        return self.sample.value is None or self.age_s > self._max_age_s
@@ -9,8 +9,30 @@ class SensorBase(abc.ABC):
     echten Sensor einen Wert misst und dann daraufhin Geschwindigkeit und Richtung
     des Fahrzeugs versucht zu ändern. Die Klasse kann stattdessen aber auch die
     Fahrparameter auslesen und mit einem Aktor eine Aktion auslösen.
+
+    Über das Klassenattribut `update_frequency` legt jeder Sensor fest, wie oft seine
+    `update()`-Methode aufgerufen werden soll:
+
+        * EVERY_TICK: In jedem Durchlauf der Hauptschleife (Standard)
+        * Zahl > 0: Ungefähr so oft pro Sekunde, höchstens aber in jedem Durchlauf
+        * ON_DEMAND: Nur dann, wenn der Sensor das Attribut `pending` auf True setzt
+
+    Sensoren, die im Hintergrund arbeiten müssen (z.B. Hardware auslesen oder Netzwerkpakete
+    empfangen), starten diese Arbeit nicht im Konstruktor, sondern erst in einer der beiden
+    Methoden `start()` oder `start_async()`. Welche davon aufgerufen wird, hängt davon ab,
+    ob das Fahrzeug mit `loop_forever()` oder `loop_async()` gestartet wurde.
     """
+    EVERY_TICK, ON_DEMAND = None, 0
+
     is_active = True
+    update_frequency = EVERY_TICK
+    pending = False
+
+    # Rückruffunktion, die beim Aktivieren/Deaktivieren aufgerufen wird.
+    # Wird vom Fahrzeug gesetzt, um seinen Ablaufplan neu zu berechnen.
+    # Sensoren, die nicht von dieser Klasse erben, müssen sie selbst aufrufen,
+    # wenn sich `is_active` ändert.
+    on_state_change = None
 
     def __init__(self):
         """
@@ -23,13 +45,42 @@ class SensorBase(abc.ABC):
         Sensor aktivieren, wenn er inaktiv war.
         """
         self.is_active = True
+
+        if self.on_state_change:
+            self.on_state_change()
     
     def disable(self):
         """
         Sensor deaktivieren, wenn er aktiv war.
         """
         self.is_active = False
+
+        if self.on_state_change:
+            self.on_state_change()
     
+    def attach(self, vehicle):
+        """
+        Wird von `Vehicle.add_sensor()` aufgerufen, sobald der Sensor dem Fahrzeug
+        hinzugefügt wurde. Sensoren, die das Fahrzeug auch außerhalb von `update()`
+        benötigen, können es sich hier merken.
+        """
+        pass
+
+    def start(self):
+        """
+        Wird von `Vehicle.loop_forever()` vor dem ersten Takt aufgerufen. Hier können
+        bei Bedarf Hintergrundthreads gestartet werden.
+        """
+        pass
+
+    async def start_async(self):
+        """
+        Wird von `Vehicle.loop_async()` innerhalb der asyncio Event Loop vor dem ersten
+        Takt aufgerufen. Hier können bei Bedarf Tasks gestartet werden. Die Methode selbst
+        sollte dabei nicht dauerhaft blockieren.
+        """
+        pass
+
     @abc.abstractmethod
     def update(self, vehicle):
         """
@@ -6,12 +6,14 @@ class DirectionServo(SensorBase):
     Servomotor, mit dem die Kamera und der Ultraschall-Sensor in
     Fahrtrichtung gedreht werden kann.
     """
+    # Entspricht in etwa der Pulsfrequenz des Servos
+    update_frequency = 50
 
     def __init__(self, pca, pwmChannel, min_pulse=450, max_pulse=2150):
         """
         Konsturktor. Parameter:
 
-            * pca: PCA9685-Objekt für die PWM-Steuerung
+            * pca: PCA9685- oder PCA9685Outputs-Objekt für die PWM-Steuerung
             * pwmChannel: PWM-Kanal zur Ausrichtung des Servos
             * min_pulse: Pulsdauer für Position ganz links
             * max_pulse: Pulsdauer für Position ganz rechts
@@ -19,12 +21,17 @@ class DirectionServo(SensorBase):
         super().__init__()
 
         self._servo = servo.Servo(pca.channels[pwmChannel], min_pulse=min_pulse, max_pulse=max_pulse)
+        self._angle = None
 
     def update(self, vehicle):
         """
         Servo anhand der Fahrtichtung drehen. Die Fahrtrichtung wird als
         Zahl [-1...1] gesteuert und hier in einen Winkel von [10°-170°]
-        umgerechnet.
+        umgerechnet. Der Servo wird nur bei einer Änderung neu angesteuert.
         """
-        self._servo.angle = (((vehicle.direction * -1) + 1) * 80) + 10
+        angle = (((vehicle.direction * -1) + 1) * 80) + 10
+
+        if angle != self._angle:
+            self._angle = angle
+            self._servo.angle = angle
 
@@ -1,16 +1,28 @@
-from gpiozero import LineSensor as LineSensor_
+from gpiozero import Device, DigitalInputDevice
+from carbot.sensors.acquisition import Sampler
 from carbot.sensors.base import SensorBase
+from carbot.state import LINE_SENSOR_COUNT
+
+# http://abyz.me.uk/rpi/pigpio/python.html#read_bank_1
 
 class LineSensor(SensorBase):
     """
     Infrarot-Linesensor zur Erkennung von Farbahnmarkierungen auf dem Boden.
     Der Sensor leuchtet hierfür fünf nebeneinander liegenden Punkte mit
     Infrarotlicht aus und misst die Reflektion.
+
+    Alle Messpunkte werden gemeinsam in einem einzigen Hintergrundthread
+    ausgelesen. Wird pigpio verwendet, geschieht dies mit einem einzigen Zugriff
+    auf die GPIO-Bank, ansonsten Pin für Pin. Das Ergebnis wird als Bitmaske
+    (Bit 0 = erster Pin) samt Zeitstempel im Fahrzeugobjekt abgelegt.
     """
 
     BLACK, WHITE = 0, 1
 
-    def __init__(self, pins, line_color=BLACK):
+    # Schnelle Abfrage, damit der Linienfolger rechtzeitig reagieren kann
+    update_frequency = 200
+
+    def __init__(self, pins, line_color=BLACK, sample_frequency=200):
         """
         Konstruktor. Parameter:
 
@@ -18,25 +30,84 @@ class LineSensor(SensorBase):
             * line_color: Farbe der Fahrlinie
                 * BLACK = Schwarze Linie auf weißem Grund
                 * WHITE = Weiße Linie auf schwarzem Grund
+            * sample_frequency: Anzahl der Messungen pro Sekunde
+        """
+        super().__init__()
+
+        if len(pins) > LINE_SENSOR_COUNT:
+            raise ValueError(f"Höchstens {LINE_SENSOR_COUNT} Pins werden unterstützt")
+
+        self._pins = tuple(pins)
+
+        # Bei schwarzer Linie ist der Pin auf der Linie LOW, daher die Bits umkehren
+        self._invert_mask = (1 << len(pins)) - 1 if line_color == self.BLACK else 0
+
+        # pigpio-Verbindung von gpiozero mitbenutzen, falls vorhanden
+        self._pi = getattr(Device.pin_factory, "connection", None)
+
+        if self._pi is not None:
+            import pigpio
+
+            # Pull-Down wie bei gpiozero.LineSensor, damit offene Pins nicht zufällig schalten
+            for pin in self._pins:
+                self._pi.set_mode(pin, pigpio.INPUT)
+                self._pi.set_pull_up_down(pin, pigpio.PUD_DOWN)
+
+            self.sampler = Sampler(self._read_bank, sample_frequency)
+        else:
+            self._inputs = tuple(DigitalInputDevice(pin) for pin in self._pins)
+            self.sampler = Sampler(self._read_pins, sample_frequency)
+
+    def start(self):
+        """
+        Messungen in einem Hintergrundthread starten.
         """
-        self._line_color = line_color
-        self._sensors = []
+        self.sampler.start()
 
-        for pin in pins:
-            self._sensors.append(LineSensor_(pin))
+    async def start_async(self):
+        """
+        Messungen als asyncio-Task starten.
+        """
+        self.sampler.start_async()
+
+    def _read_bank(self):
+        """
+        Im Hintergrundthread aufgerufene Methode zum Auslesen aller Pins mit
+        einem einzigen pigpio-Aufruf. Gibt die Bitmaske zurück.
+        """
+        levels = self._pi.read_bank_1()
+        mask = 0
+
+        for bit, pin in enumerate(self._pins):
+            mask |= ((levels >> pin) & 1) << bit
+
+        return mask ^ self._invert_mask
+
+    def _read_pins(self):
+        """
+        Im Hintergrundthread aufgerufene Methode zum Auslesen der Pins ohne
+        pigpio. Gibt die Bitmaske zurück.
+        """
+        mask = 0
+
+        for bit, input_ in enumerate(self._inputs):
+            if input_.value:
+                mask |= 1 << bit
+
+        return mask ^ self._invert_mask
 
     def update(self, vehicle):
         """
-        Sensoren prüfen und die erkannte Markierung im Fahrzeugobjekt zur
-        Auswertung beim autonomen Fahren ablegen.
+        Zuletzt erkannte Markierung im Fahrzeugobjekt zur Auswertung beim
+        autonomen Fahren ablegen. Ist die letzte Messung veraltet, weil der
+        Hintergrundthread hängt, gilt die Fahrlinie als verloren, statt mit
+        einer alten Markierung weiterzulenken.
         """
-        line_pattern = []
+        if self.sampler.is_stale:
+            vehicle.line_mask = 0
+            return
 
-        if self._line_color == self.BLACK:
-            for sensor in self._sensors:
-                line_pattern.append(1 if sensor.value < 0.5 else 0)
-        else:
-            for sensor in self._sensors:
-                line_pattern.append(1 if sensor.value > 0.5 else 0)
-        
-        vehicle.line_pattern = tuple(line_pattern)
+        mask, timestamp_s = self.sampler.sample
+
+        vehicle.line_mask = mask
+        vehicle.line_timestamp_s = timestamp_s
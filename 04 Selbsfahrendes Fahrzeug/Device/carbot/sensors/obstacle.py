@@ -1,12 +1,21 @@
 from gpiozero import DistanceSensor
+from carbot.sensors.acquisition import Sampler
 from carbot.sensors.base import SensorBase
 
 class ObstacleSensor(SensorBase):
     """
     Ultraschall-Sensor zur Erkennung von Hindernissen in der Fahrlinie.
+
+    gpiozero misst den Abstand bereits in einem eigenen Thread und mittelt die
+    Messungen in einer Warteschlange. Das Auslesen von `distance` wartet jedoch,
+    bis diese Warteschlange gefüllt ist, was bei ausbleibendem Echo beliebig lange
+    dauern kann. Deshalb wird der Wert zusätzlich von einem `Sampler` außerhalb der
+    Hauptschleife gelesen. Dessen Zeitstempel zeigen zudem, wenn keine neuen Werte
+    mehr kommen. Das Fahrzeug wird dann über `sensor_fault` angehalten.
     """
+    update_frequency = 15
     
-    def __init__(self, trigger, echo, min_cm, max_cm):
+    def __init__(self, trigger, echo, min_cm, max_cm, sample_frequency=20):
         """
         Konsturktor. Parameter:
 
@@ -14,6 +23,7 @@ class ObstacleSensor(SensorBase):
             * echo: Pinnummer für Echo-Signal
             * min_cm: Einzuhalteneder Mindestabstand in cm
             * max_cm: Abstand in cm ab wann das Fahrzeug abgebremst wird
+            * sample_frequency: Anzahl der Messungen pro Sekunde
         """
         super().__init__()
 
@@ -21,16 +31,56 @@ class ObstacleSensor(SensorBase):
         self._min_cm   = min_cm
         self._max_cm   = max_cm
         self._range_cm = self._max_cm - self._min_cm
+
+        self.sampler = Sampler(lambda: self._sensor.distance, sample_frequency)
+
+        # Fahrzeug, bei dem zuletzt `sensor_fault` gesetzt wurde
+        self._fault_vehicle = None
+
+    def start(self):
+        """
+        Messungen in einem Hintergrundthread starten.
+        """
+        self.sampler.start()
+
+    async def start_async(self):
+        """
+        Messungen als asyncio-Task starten.
+        """
+        self.sampler.start_async()
+
+    def disable(self):
+        """
+        Sensor deaktivieren. Ein von ihm gesetzter `sensor_fault` wird dabei zurückgenommen,
+        damit das Fahrzeug ohne den Sensor weiterfahren kann.
+        """
+        super().disable()
+
+        if self._fault_vehicle:
+            self._fault_vehicle.sensor_fault = False
+            self._fault_vehicle = None
     
     def update(self, vehicle):
         """
-        Sensor prüfen und Fahrzeugparameter anpassen.
+        Zuletzt gemessenen Abstand auswerten und Fahrzeugparameter anpassen.
+        Liegt noch keine Messung vor oder ist die letzte Messung veraltet, weil der
+        Hintergrundthread hängt, wird das Fahrzeug über `sensor_fault` angehalten.
         """
-        distance_cm = self._sensor.distance * 100
+        if self.sampler.is_stale:
+            vehicle.sensor_fault = True
+            vehicle.obstacle_pushback = 1
+            self._fault_vehicle = vehicle
+            return
+
+        if self._fault_vehicle:
+            vehicle.sensor_fault = False
+            self._fault_vehicle = None
+
+        distance_cm = self.sampler.sample.value * 100
 
         if distance_cm < self._min_cm:
             vehicle.obstacle_pushback = 1
         elif distance_cm > self._max_cm:
             vehicle.obstacle_pushback = 0
         else:
-            vehicle.obstacle_pushback = (distance_cm - self._min_cm) / self._range_cm
\ No newline at end of file
+            vehicle.obstacle_pushback = (distance_cm - self._min_cm) / self._range_cm
@@ -1,4 +1,4 @@
-import collections, os, shutil, subprocess
+import asyncio, collections, os, shutil, subprocess, traceback
 from carbot.sensors.base import SensorBase
 
 class SoundPlayer(SensorBase):
@@ -13,7 +13,11 @@ class SoundPlayer(SensorBase):
     Threads parallel aufgerufen werden können, beispielsweise aus einem Serverthread, der
     Steuerbefehle über das Netzwerk empfängt. Die tatsächliche Wiedergabe wird dann in der
     update()-Methode im Hauptthread des Fahrzeugs ausgeführt.
+
+    Läuft das Fahrzeug mit `loop_async()`, werden die Wiedergabeprogramme mit asyncio
+    gestartet und ihr Ende in einem eigenen Task abgewartet, statt regelmäßig nachzufragen.
     """
+    update_frequency = 5
 
     def __init__(self, player="aplay", media_dir=None):
         """
@@ -32,16 +36,24 @@ class SoundPlayer(SensorBase):
         
         self._pending_commands = collections.deque()
         self._player_processes = collections.deque()
+        self._play_tasks       = set()
+        self._loop             = None
+
+    async def start_async(self):
+        """
+        Event Loop merken, damit die Wiedergabe künftig mit asyncio gestartet wird.
+        """
+        self._loop = asyncio.get_running_loop()
     
     def update(self, vehicle):
         """
         Von SensorBase geerbte, abstrakte Methode. Hier werden die aus den anderen Threads
         empfangenen Befehle im Hauptthread des Fahrzeugs ausgeführt.
         """
-        # Empfangene Befehle abarbeiten
+        # Empfangene Befehle in der Reihenfolge ihres Eintreffens abarbeiten
         while True:
             try:
-                command = self._pending_commands.pop()
+                command = self._pending_commands.popleft()
             except IndexError:
                 break
         
@@ -50,7 +62,11 @@ class SoundPlayer(SensorBase):
             elif command["cmd"] == "stop":
                 self._stop(command["soundfile"])
         
-        # Liste mit den laufenden Wiedergabeprogrammen aufräumen
+        # Liste mit den laufenden Wiedergabeprogrammen aufräumen. Mit asyncio
+        # erledigt dies der Task, der auf das Ende des Programms wartet.
+        if self._loop:
+            return
+
         active_players = []
 
         for process in self._player_processes.copy():
@@ -103,12 +119,40 @@ class SoundPlayer(SensorBase):
         Aufgerufen im Hauptthread des Fahrzeugs, um die Wiedergabe eines Sounds zu starten.
         """
         filename = os.path.join(self._media_dir, soundfile)
+
+        if self._loop:
+            # Referenz auf den Task halten, damit er nicht vorzeitig aufgeräumt wird
+            task = self._loop.create_task(self._play_async(soundfile, filename))
+            task.add_done_callback(self._play_tasks.discard)
+            self._play_tasks.add(task)
+            return
+
         process = subprocess.Popen([self._player, filename])
 
         if process.returncode == None:
             process._soundfile_ = soundfile
             self._player_processes.append(process)
 
+    async def _play_async(self, soundfile, filename):
+        """
+        Task zum Abspielen eines Sounds mit asyncio. Entfernt das Wiedergabeprogramm
+        aus der Liste, sobald es beendet wurde.
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(self._player, filename)
+        except Exception as exc:
+            print(f"Fehler beim Abspielen von {soundfile}: {exc}")
+            traceback.print_exc()
+            return
+
+        process._soundfile_ = soundfile
+        self._player_processes.append(process)
+
+        try:
+            await process.wait()
+        finally:
+            self._player_processes.remove(process)
+
     def stop(self, soundfile):
         """
         Aus beliebigen Threads aufrufbare Methode, um den Abbruch eines Sounds anzufordern.
@@ -123,7 +167,8 @@ class SoundPlayer(SensorBase):
         Aufgerufen im Hauptthread des Fahrzeugs, um die Wiedergabe eines Sounds zu stoppen.
         """
         for process in self._player_processes:
-            process.poll()
+            if isinstance(process, subprocess.Popen):
+                process.poll()
 
             if process._soundfile_ == soundfile and process.returncode == None:
                 process.terminate()
@@ -0,0 +1,163 @@
+# Anzahl der Messpunkte des Linesensors
+LINE_SENSOR_COUNT = 5
+
+# Linienmuster als Tupel für jede mögliche Bitmaske des Linesensors. Bit 0 entspricht
+# dem ersten Messpunkt, Bit 4 dem letzten. Die Tupel werden einmalig erzeugt, damit die
+# Umrechnung keinen Speicher anfordern muss.
+LINE_PATTERNS = tuple(
+    tuple((mask >> bit) & 1 for bit in range(LINE_SENSOR_COUNT))
+    for mask in range(1 << LINE_SENSOR_COUNT)
+)
+
+def line_mask(line_pattern):
+    """
+    Gegenstück zu `LINE_PATTERNS`: Rechnet ein Linienmuster als Tupel in eine Bitmaske um.
+    """
+    mask = 0
+
+    for bit, value in enumerate(line_pattern):
+        if value:
+            mask |= 1 << bit
+
+    return mask
+
+class VehicleState:
+    """
+    Kompakte Momentaufnahme der Fahrzeugparameter am Ende eines Takts. Dank `__slots__`
+    benötigt jedes Objekt nur wenig Speicher und besitzt kein eigenes Dictionary. Die
+    Objekte werden nicht für jeden Takt neu erzeugt, sondern immer wieder überschrieben.
+    """
+
+    # Fahrzeugparameter, wie sie auch an die Fernsteuerung übertragen werden.
+    # Das Linienmuster wird intern als Bitmaske `line_mask` gespeichert.
+    FIELDS = (
+        "line_pattern",
+        "target_speed",
+        "obstacle_pushback",
+        "direction",
+        "speed_total",
+        "speed_left",
+        "speed_right",
+    )
+
+    __slots__ = (
+        "tick",
+        "timestamp_s",
+        "line_mask",
+        "line_timestamp_s",
+        "target_speed",
+        "obstacle_pushback",
+        "direction",
+        "speed_total",
+        "speed_left",
+        "speed_right",
+    )
+
+    def __init__(self):
+        """
+        Konstruktor. Alle Werte starten bei null.
+        """
+        self.tick              = 0
+        self.timestamp_s       = 0.0
+        self.line_mask         = 0
+        self.line_timestamp_s  = 0.0
+        self.target_speed      = 0.0
+        self.obstacle_pushback = 0.0
+        self.direction         = 0.0
+        self.speed_total       = 0.0
+        self.speed_left        = 0.0
+        self.speed_right       = 0.0
+
+    def copy_from(self, other):
+        """
+        Alle Werte aus einem anderen VehicleState-Objekt übernehmen.
+        """
+        self.tick              = other.tick
+        self.timestamp_s       = other.timestamp_s
+        self.line_mask         = other.line_mask
+        self.line_timestamp_s  = other.line_timestamp_s
+        self.target_speed      = other.target_speed
+        self.obstacle_pushback = other.obstacle_pushback
+        self.direction         = other.direction
+        self.speed_total       = other.speed_total
+        self.speed_left        = other.speed_left
+        self.speed_right       = other.speed_right
+
+    @property
+    def line_pattern(self):
+        """
+        Linienmuster als Tupel, abgeleitet aus der Bitmaske.
+        """
+        return LINE_PATTERNS[self.line_mask]
+
+    def as_dict(self):
+        """
+        Fahrzeugparameter als Dictionary zurückgeben, z.B. für die Übertragung als JSON.
+        """
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+class StateBuffer:
+    """
+    Doppelpuffer für VehicleState-Objekte, über den der Fahrzeug-Thread seinen Zustand
+    an andere Threads (z.B. den Netzwerk-Thread der Fernsteuerung) weitergibt, ohne
+    dass hierfür eine Sperre benötigt wird.
+
+    Der Fahrzeug-Thread schreibt immer in den gerade nicht veröffentlichten Puffer und
+    schaltet danach um. Eine Sequenznummer (Seqlock) zeigt an, welcher Puffer aktuell
+    gültig ist: Ungerade Werte bedeuten, dass gerade geschrieben wird. Lesende Threads
+    kopieren den gültigen Puffer und prüfen anschließend anhand der Sequenznummer, ob
+    der Puffer während des Kopierens überschrieben wurde. Nur dann wird das Kopieren
+    wiederholt, was in der Praxis kaum vorkommt.
+    """
+
+    def __init__(self):
+        """
+        Konstruktor.
+        """
+        self._buffers  = (VehicleState(), VehicleState())
+        self._sequence = 0
+
+    @property
+    def version(self):
+        """
+        Anzahl der bisher veröffentlichten Momentaufnahmen.
+        """
+        return self._sequence >> 1
+
+    def publish(self, vehicle, timestamp_s):
+        """
+        Aktuelle Werte des Fahrzeugs als neue Momentaufnahme veröffentlichen. Darf nur
+        vom Fahrzeug-Thread aufgerufen werden.
+        """
+        sequence = self._sequence
+        state = self._buffers[((sequence >> 1) + 1) & 1]
+
+        # Ungerade Sequenznummer: Der inaktive Puffer wird gerade beschrieben
+        self._sequence = sequence + 1
+
+        state.tick              = (sequence >> 1) + 1
+        state.timestamp_s       = timestamp_s
+        state.line_mask         = vehicle.line_mask
+        state.line_timestamp_s  = vehicle.line_timestamp_s
+        state.target_speed      = vehicle.target_speed
+        state.obstacle_pushback = vehicle.obstacle_pushback
+        state.direction         = vehicle.direction
+        state.speed_total       = vehicle.speed_total
+        state.speed_left        = vehicle.speed_left
+        state.speed_right       = vehicle.speed_right
+
+        # Gerade Sequenznummer: Der eben beschriebene Puffer ist nun gültig
+        self._sequence = sequence + 2
+
+    def read(self, into):
+        """
+        Zuletzt veröffentlichte Momentaufnahme in das übergebene VehicleState-Objekt kopieren.
+        Kann aus beliebigen Threads aufgerufen werden und gibt das Objekt wieder zurück.
+        """
+        while True:
+            sequence = self._sequence & ~1
+            into.copy_from(self._buffers[(sequence >> 1) & 1])
+
+            # Erst zwei Veröffentlichungen später wird derselbe Puffer wieder beschrieben
+            if self._sequence - sequence <= 2:
+                return into
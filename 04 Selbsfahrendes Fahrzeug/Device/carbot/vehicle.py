@@ -1,5 +1,10 @@
 import time
 
+from carbot.executor import SensorExecutor
+from carbot.profiler import TimingHistogram
+from carbot.scheduler import TickScheduler
+from carbot.state import LINE_PATTERNS, StateBuffer, VehicleState, line_mask
+
 def clip(value, min_value, max_value):
     """
     Hilfsfunktion, die sicherstellt, dass das übergebene Wert innerhalb
@@ -13,9 +18,11 @@ class Vehicle:
     Programms, in der mehrmals je Sekunde die Sensoren abgefragt und die
     Motorgeschwindigkeit entsprechend reguliert wird.
     """
-    # Erkannte Fahrbahnmarkierung unter dem Fahrzeug.
-    # Kann beim Selbstfahren ausgewertet werden, um einer Bodenlinie zu folgen.
-    line_pattern: tuple[int] = (0,0,0,0,0)
+    # Erkannte Fahrbahnmarkierung unter dem Fahrzeug als Bitmaske (Bit 0 = erster
+    # Messpunkt) und Zeitpunkt der Messung (time.monotonic). Kann beim Selbstfahren
+    # ausgewertet werden, um einer Bodenlinie zu folgen.
+    line_mask: int = 0
+    line_timestamp_s: float = 0.0
 
     # Zielgeschwindigkeit [-1...1]: -1 = rückwärts, 1 = vorwärts
     target_speed: float = 0.0
@@ -28,6 +35,10 @@ class Vehicle:
     # Richtung [-1...1]: -1 = links, 0 = gerade aus, 1 = rechts
     direction: float = 0.0
 
+    # Wird von Sensoren gesetzt, solange keine verlässlichen Messwerte vorliegen,
+    # z.B. weil ihr Hintergrundthread hängt. Die Motoren stehen dann still.
+    sensor_fault: bool = False
+
     def __init__(self, motor_left, motor_right):
         """
         Konstruktor. Parameter:
@@ -45,16 +56,63 @@ class Vehicle:
         # Sonstige Sensoren und Aktoren
         self._sensors = []
         self._sensors_by_name = {}
+        self._executor = SensorExecutor()
+        self._outputs = []
+
+        # Zwischengespeicherter Sensorstatus, wird nur bei Änderungen neu aufgebaut
+        self._sensor_status = {}
+        self._sensor_status_version = -1
+
+        # Momentaufnahmen des Fahrzeugzustands für andere Threads
+        self._state = StateBuffer()
+
+        # Taktgeber der Hauptschleife, wird in loop_forever() bzw. loop_async() erzeugt
+        self.scheduler = None
+
+        # Optionaler Flugschreiber (`FlightRecorder`), der jeden Takt aufzeichnet
+        self.recorder = None
+
+        # Laufzeitmessung der gesamten Takte
+        self._tick_timing = TimingHistogram()
+        self._perf_reset_requested = False
+
+    @property
+    def line_pattern(self):
+        """
+        Erkannte Fahrbahnmarkierung als Tupel mit einer 0 oder 1 je Messpunkt.
+        Wird nur bei Bedarf aus `line_mask` abgeleitet.
+        """
+        return LINE_PATTERNS[self.line_mask]
+
+    @line_pattern.setter
+    def line_pattern(self, line_pattern):
+        self.line_mask = line_mask(line_pattern)
 
     def add_sensor(self, name, sensor):
         """
         Fügt einen Sensor wie z.B. einen Abstandsmesser dem Fahrzeugobjekt
         hinzu. Der Sensor wird, sofern er aktiv ist, in der Hauptschleife
+        mit der von ihm vorgegebenen Frequenz (Attribut `update_frequency`)
         abgefragt, um die Steuerungsparameter des Fahrzeugs anzupassen.
         """
         self._sensors.append(sensor)
         self._sensors_by_name[name] = sensor
+        self._executor.add(name, sensor)
+
+        attach = getattr(sensor, "attach", None)
+
+        if attach:
+            attach(self)
     
+    def add_output(self, output):
+        """
+        Fügt ein Ausgabeobjekt wie z.B. `PCA9685Outputs` hinzu, dessen Methode
+        `flush()` am Ende jedes Takts aufgerufen wird. Dadurch können die in
+        einem Takt gesammelten Änderungen an der Hardware gebündelt übertragen
+        werden.
+        """
+        self._outputs.append(output)
+
     def get_sensor(self, name):
         """
         Sucht einen Sensor anhand seines Namens. Wirft einen `KeyError`, wenn
@@ -66,21 +124,61 @@ class Vehicle:
     def sensor_status(self):
         """
         Gibt ein Dictionary mit einem Flag je Sensor zurück, ob der jeweilige
-        Sensor aktiv oder inaktiv ist.
+        Sensor aktiv oder inaktiv ist. Das Dictionary wird nur neu aufgebaut,
+        wenn ein Sensor hinzugefügt, aktiviert oder deaktiviert wurde, und
+        darf daher nicht verändert werden. Kann aus beliebigen Threads
+        aufgerufen werden.
         """
-        sensor_status = {}
+        version = self._executor.version
 
-        for name in self._sensors_by_name.keys():
-            sensor = self._sensors_by_name[name]
+        if version != self._sensor_status_version:
+            sensor_status = {}
 
-            if hasattr(sensor, "is_active"):
-                sensor_status[name] = sensor.is_active
-            else:
-                sensor_status[name] = True
+            for name, sensor in list(self._sensors_by_name.items()):
+                sensor_status[name] = getattr(sensor, "is_active", True)
 
-        return sensor_status
+            self._sensor_status = sensor_status
+            self._sensor_status_version = version
 
-    def loop_forever(self, update_frequency=10):
+        return self._sensor_status
+
+    @property
+    def state_version(self):
+        """
+        Anzahl der bisher veröffentlichten Momentaufnahmen des Fahrzeugzustands.
+        """
+        return self._state.version
+
+    def snapshot(self, into=None):
+        """
+        Gibt eine in sich stimmige Kopie des Fahrzeugzustands am Ende des letzten
+        Takts als `VehicleState`-Objekt zurück. Kann aus beliebigen Threads ohne
+        Sperre aufgerufen werden. Wird ein eigenes VehicleState-Objekt übergeben,
+        wird dieses befüllt, statt ein neues Objekt zu erzeugen.
+        """
+        return self._state.read(into if into is not None else VehicleState())
+
+    def perf_stats(self):
+        """
+        Gibt die Laufzeitstatistik der Hauptschleife als Dictionary zurück. Diese
+        enthält je Sensor sowie für den gesamten Takt die Anzahl der Aufrufe und
+        Mittelwert, Median (p50), 99. Perzentil und Maximum der Laufzeit in Sekunden.
+        Zusätzlich ist die Taktstatistik des `TickScheduler` enthalten.
+        """
+        return {
+            "tick":      self._tick_timing.stats,
+            "sensors":   {name: timing.stats for name, timing in list(self._executor.timings.items())},
+            "scheduler": self.scheduler.stats if self.scheduler else {},
+        }
+
+    def reset_perf_stats(self):
+        """
+        Laufzeitstatistik zurücksetzen. Kann aus beliebigen Threads aufgerufen werden,
+        das eigentliche Zurücksetzen erfolgt zu Beginn des nächsten Takts.
+        """
+        self._perf_reset_requested = True
+
+    def loop_forever(self, update_frequency=10, policy=TickScheduler.SKIP):
         """
         Hauptschleife zur Steuerung des Fahrzeugs. Muss aufgerufen werden,
         damit das Fahrzeug regelmäßig seine Sensoren prüft und basierend
@@ -88,69 +186,143 @@ class Vehicle:
 
         Parameter:
             * update_frequency: Anzahl der Sensorprüfungen pro Sekunde.
+            * policy: Verhalten bei verpassten Takten, siehe `TickScheduler`
+
+        Die Taktstatistik (Jitter, Überschreitungen) kann während der Laufzeit
+        über das Attribut `scheduler` ausgelesen werden.
+
+        Die Sensoren werden hier im Thread-Betrieb gestartet (Methode `start()`),
+        d.h. sie nutzen bei Bedarf eigene Hintergrundthreads. Siehe `loop_async()`
+        für die Alternative mit asyncio.
         """
-        target_delay_s = 1 / update_frequency
-        prev_time_s = 0
-        needed_delay_s = 0
+        self._prepare(update_frequency, policy)
+
+        for sensor in self._sensors:
+            if hasattr(sensor, "start"):
+                sensor.start()
 
         while True:
-            # Thread pausieren, um CPU-Leistung einzusparen
-            current_time_s = time.monotonic()
-            needed_delay_s = target_delay_s - (current_time_s - prev_time_s)
-
-            if needed_delay_s > 0:
-                time.sleep(needed_delay_s)
-            
-            # Sensorwerte prüfen
-            for sensor in self._sensors:
-                if hasattr(sensor, "is_active"):
-                    if not sensor.is_active:
-                        continue
-                
-                if hasattr(sensor, "update"):
-                    sensor.update(self)
-            
-            # Angestrebte Geschwindigkeit einstellen
-            prev_speed_total = self._speed_total
-            self._speed_total = clip(self.target_speed, -1, 1)
-            
-            if self.target_speed > 0 and self.obstacle_pushback > 0 \
-            or self.target_speed < 0 and self.obstacle_pushback < 0:
-                self._speed_total -= clip(self.obstacle_pushback, 0, 1)
-
-            if self._speed_total > 0:
-                self._speed_total = max(self._speed_total, 0.4)
-            elif self._speed_total < 0:
-                self._speed_total = min(self._speed_total, -0.4)
-
-            # # Richtung umkehren, wenn einem Hinderniss ausgewichen wird
-            # if prev_speed_total > 0 and self._speed_total < 0 \
-            # or prev_speed_total < 0 and self._speed_total > 0:
-            #     self.direction *= -1
-
-            #     if self.direction >= -0.3 and self.direction <= 0.3:
-            #         self.direction = clip(self.direction + 0.5, -1, 1)
-
-            # Einzelgeschwindigkeiten anpassen für Lenkung
-            self._speed_left  = self._speed_total
-            self._speed_right = self._speed_total
-
-            if self._speed_total != 0:
-                if self.direction > 0:
-                    # Richtung rechts: Rechten Motor verlangsamen, damit sich das Fahrzeug dreht
-                    self._speed_right *= 1 - self.direction
-                elif self.direction < 0:
-                    # Richtung links: Linken Motor verlangsamen, damit sich das Fahrzeug dreht
-                    self._speed_left *= 1 + self.direction
-
-            if self.obstacle_pushback != 0:
-                # Richtung tauschen, wenn rückwärts einem Hinderniss ausgewichen wird
-                self._speed_left *= -1
-                self._speed_right *= -1
-            
-            # Berechnete Motorgeschwindigkeiten übernehmen
-            self._motor_left.value  = self._speed_left
+            # Thread bis zum nächsten Takt pausieren, um CPU-Leistung einzusparen
+            self.scheduler.wait()
+            self.tick()
+
+    async def loop_async(self, update_frequency=10, policy=TickScheduler.SKIP):
+        """
+        Hauptschleife zur Steuerung des Fahrzeugs als asyncio-Coroutine. Entspricht
+        `loop_forever()`, mit dem Unterschied, dass alle Sensoren, der Netzwerkempfang
+        und die Audiowiedergabe als Tasks in derselben Event Loop laufen (Methode
+        `start_async()` der Sensoren). Blockierende Hardwarezugriffe werden dabei an den
+        Thread-Pool der Event Loop abgegeben. Teile des Programms, die gerade nichts zu
+        tun haben, warten somit ohne Rechenzeit zu verbrauchen.
+
+        Aufruf z.B. mit `asyncio.run(vehicle.loop_async(200))`.
+        """
+        self._prepare(update_frequency, policy)
+
+        for sensor in self._sensors:
+            if hasattr(sensor, "start_async"):
+                await sensor.start_async()
+
+        while True:
+            # Task bis zum nächsten Takt pausieren, damit die anderen Tasks laufen können
+            await self.scheduler.wait_async()
+            self.tick()
+
+    def _prepare(self, update_frequency, policy):
+        """
+        Taktgeber und Ablaufplan für die Hauptschleife vorbereiten.
+        """
+        self.scheduler = TickScheduler(update_frequency, policy=policy)
+        self._executor.tick_frequency = update_frequency
+
+        if self.recorder:
+            self.recorder.open(self._executor.timings)
+
+    def tick(self):
+        """
+        Ein einzelner Durchlauf der Hauptschleife: Fällige Sensoren abfragen, die
+        Motoren ansteuern und den neuen Fahrzeugzustand veröffentlichen. Wird von
+        `loop_forever()` bzw. `loop_async()` im vorgegebenen Takt aufgerufen.
+        """
+        tick_start_s = time.perf_counter()
+
+        if self._perf_reset_requested:
+            self._perf_reset_requested = False
+            self._tick_timing.reset()
+
+            if self.scheduler:
+                self.scheduler.reset_stats()
+
+            for timing in self._executor.timings.values():
+                timing.reset()
+
+        # Fällige Sensoren abfragen
+        self._executor.run(self)
+        
+        # Angestrebte Geschwindigkeit einstellen
+        prev_speed_total = self._speed_total
+        prev_speed_left  = self._speed_left
+        prev_speed_right = self._speed_right
+        self._speed_total = clip(self.target_speed, -1, 1)
+        
+        if self.target_speed > 0 and self.obstacle_pushback > 0 \
+        or self.target_speed < 0 and self.obstacle_pushback < 0:
+            self._speed_total -= clip(self.obstacle_pushback, 0, 1)
+
+        if self._speed_total > 0:
+            self._speed_total = max(self._speed_total, 0.4)
+        elif self._speed_total < 0:
+            self._speed_total = min(self._speed_total, -0.4)
+
+        # Ohne verlässliche Sensorwerte nicht blind weiterfahren
+        if self.sensor_fault:
+            self._speed_total = 0.0
+
+        # # Richtung umkehren, wenn einem Hinderniss ausgewichen wird
+        # if prev_speed_total > 0 and self._speed_total < 0 \
+        # or prev_speed_total < 0 and self._speed_total > 0:
+        #     self.direction *= -1
+
+        #     if self.direction >= -0.3 and self.direction <= 0.3:
+        #         self.direction = clip(self.direction + 0.5, -1, 1)
+
+        # Einzelgeschwindigkeiten anpassen für Lenkung
+        self._speed_left  = self._speed_total
+        self._speed_right = self._speed_total
+
+        if self._speed_total != 0:
+            if self.direction > 0:
+                # Richtung rechts: Rechten Motor verlangsamen, damit sich das Fahrzeug dreht
+                self._speed_right *= 1 - self.direction
+            elif self.direction < 0:
+                # Richtung links: Linken Motor verlangsamen, damit sich das Fahrzeug dreht
+                self._speed_left *= 1 + self.direction
+
+        if self.obstacle_pushback != 0:
+            # Richtung tauschen, wenn rückwärts einem Hinderniss ausgewichen wird
+            self._speed_left *= -1
+            self._speed_right *= -1
+        
+        # Berechnete Motorgeschwindigkeiten übernehmen, sofern sie sich geändert haben
+        if self._speed_left != prev_speed_left:
+            self._motor_left.value = self._speed_left
+
+        if self._speed_right != prev_speed_right:
             self._motor_right.value = self._speed_right
+
+        # Gesammelte Änderungen an die Hardware übertragen
+        for output in self._outputs:
+            output.flush()
+
+        # Neuen Fahrzeugzustand für andere Threads veröffentlichen
+        timestamp_s = time.monotonic()
+        self._state.publish(self, timestamp_s)
+
+        tick_s = time.perf_counter() - tick_start_s
+        self._tick_timing.add(tick_s)
+
+        if self.recorder:
+            self.recorder.record(self, timestamp_s, tick_s)
     
     def stop(self):
         """
@@ -159,6 +331,12 @@ class Vehicle:
         self._motor_left.value  = 0
         self._motor_right.value = 0
 
+        for output in self._outputs:
+            output.flush()
+
+        if self.recorder:
+            self.recorder.close()
+
     @property
     def speed_total(self):
         """
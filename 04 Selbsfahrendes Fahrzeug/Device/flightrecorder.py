@@ -0,0 +1,53 @@
+#! /usr/bin/env python3
+"""
+Startskript zum Auswerten einer Flugschreiber-Datei des carbot-Programms.
+Gibt eine Zusammenfassung der aufgezeichneten Takte aus und kann die Datensätze
+optional als CSV-Datei speichern. Benötigt das Paket numpy.
+
+Aufruf: ./flightrecorder.py <datei> [<csv-datei>]
+"""
+
+import sys
+from carbot.recorder import load
+
+def main(path, csv_path=None):
+    records = load(path)
+
+    if not len(records):
+        print("Die Datei enthält keine Datensätze")
+        return
+
+    import numpy as np
+
+    duration_s = records["timestamp_s"][-1] - records["timestamp_s"][0]
+    print(f"{len(records)} Takte von Takt {records['tick'][0]} bis {records['tick'][-1]} ({duration_s:.1f} s)")
+    print()
+    print(f"{'Feld':<20} {'Mittelwert':>12} {'Minimum':>12} {'Maximum':>12}")
+
+    for name in records.dtype.names:
+        if name in ("tick", "timestamp_s", "line_mask"):
+            continue
+
+        values = records[name]
+
+        if np.all(np.isnan(values)):
+            continue
+
+        print(f"{name:<20} {np.nanmean(values):>12.6f} {np.nanmin(values):>12.6f} {np.nanmax(values):>12.6f}")
+
+    if csv_path:
+        np.savetxt(csv_path, records, delimiter=";", header=";".join(records.dtype.names), comments="",
+            fmt=["%d" if records.dtype[name].kind == "u" else "%.9g" for name in records.dtype.names])
+
+        print()
+        print(f"Datensätze gespeichert in {csv_path}")
+
+if __name__ == "__main__":
+    if not 2 <= len(sys.argv) <= 3:
+        print(__doc__.strip())
+        sys.exit(1)
+
+    try:
+        main(*sys.argv[1:])
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,548 @@
+import asyncio, socket, time, traceback
+from carbot_rc import protocol
+from carbot_rc.latency import LatencyEstimator
+from carbot_rc.status import StatusAssembler
+
+class Fleet:
+    """
+    asyncio-Client zur Steuerung beliebig vieler Fahrzeuge aus einer einzigen Ereignisschleife,
+    z.B. für Testaufbauten oder Skripte, die mehrere Fahrzeuge gleichzeitig fahren lassen. Im
+    Gegensatz zur Klasse `RemoteConnection` gibt es weder einen Thread je Fahrzeug noch
+    Rückruffunktionen. Stattdessen werden Befehle mit `await` gesendet und der Status mit
+    `async for` gelesen:
+
+        async with Fleet() as fleet:
+            cars = await asyncio.gather(*(fleet.connect(ip) for ip in ("192.168.178.121", "192.168.178.122")))
+            await fleet.set(target_speed=0.5, direction=0.0)
+
+            async for status in cars[0].updates():
+                if status["obstacle_pushback"] > 0.5:
+                    break
+
+            await fleet.stop()
+
+    Alle Fahrzeuge teilen sich einen UDP-Socket oder einen kleinen Pool von `sockets` Sockets,
+    denen die Fahrzeuge reihum fest zugeordnet werden. Empfangene Datagramme werden anhand der
+    Absenderadresse dem jeweiligen Fahrzeug zugeordnet. Eine einzige Hintergrund-Task übernimmt
+    für alle Fahrzeuge die Laufzeitmessung (zugleich Lebenszeichen für den Totmannschalter), die
+    Erneuerung der Abonnements sowie die Statusabfrage bei Fahrzeugen ohne Abonnement.
+
+    Mit `discover()` können die Fahrzeuge im lokalen Netz gesucht werden, bevor sie verbunden
+    werden.
+    """
+
+    # Anzahl der Versuche und Wartezeit, das Binärformat auszuhandeln, bevor bei JSON geblieben wird
+    _HELLO_ATTEMPTS  = 5
+    _HELLO_TIMEOUT_S = 0.2
+
+    # Erneutes Abonnieren, wenn so lange keine Aktualisierung eingetroffen ist
+    _RESUBSCRIBE_S = 2.5
+
+    # Status abfragen, wenn so lange nach dem ersten Abonnieren keine Aktualisierung
+    # eingetroffen ist, z.B. bei älteren Fahrzeugprogrammen ohne Abonnements
+    _POLL_AFTER_S = 0.5
+
+    # Abstand der Laufzeitmessungen. Muss deutlich kürzer als der Totmannschalter sein.
+    _PING_INTERVAL_S = 0.25
+
+    # Maximale Anzahl Befehle je Batch, damit ein Batch in ein Datagramm passt
+    _MAX_BATCH_OPS = 32
+
+    def __init__(self, host="", port=0, sockets=1, update_frequency=20):
+        """
+        Konstruktor. Parameter:
+            * host: Hostname, an den die UDP-Sockets gebunden werden
+            * port: Portnummer des ersten UDP-Sockets, weitere Sockets erhalten die folgenden
+              Portnummern. Bei 0 wählt das Betriebssystem freie Ports.
+            * sockets: Anzahl der UDP-Sockets, auf die die Fahrzeuge verteilt werden
+            * update_frequency: Anzahl abonnierter Aktualisierungen je Sekunde und Fahrzeug
+
+        Die Sockets werden erst mit `open()` bzw. beim Eintritt in `async with` geöffnet.
+        """
+        self.update_frequency = update_frequency
+
+        self._host         = host
+        self._port         = port
+        self._socket_count = sockets
+        self._transports   = []
+        self._cars         = {}
+        self._reassembler  = protocol.Reassembler()
+        self._task         = None
+        self._discovered   = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def cars(self):
+        """
+        Liste aller verbundenen Fahrzeuge.
+        """
+        return list(self._cars.values())
+
+    async def open(self):
+        """
+        UDP-Sockets öffnen und die Hintergrund-Task starten.
+        """
+        loop = asyncio.get_running_loop()
+
+        for i in range(self._socket_count):
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _FleetProtocol(self),
+                local_addr      = (self._host or "0.0.0.0", self._port + i if self._port else 0),
+                family          = socket.AF_INET,
+                allow_broadcast = True,
+            )
+
+            self._transports.append(transport)
+
+        self._task = asyncio.create_task(self._housekeeping_task())
+
+    async def close(self):
+        """
+        Verbindungen zu allen Fahrzeugen trennen, die Hintergrund-Task beenden und die
+        UDP-Sockets schließen.
+        """
+        for car in self.cars:
+            await car.close()
+
+        if self._task:
+            self._task.cancel()
+
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+            self._task = None
+
+        for transport in self._transports:
+            transport.close()
+
+        self._transports = []
+
+    async def connect(self, remote_ip, remote_port=9876, fields=None, timeout_s=2.0):
+        """
+        Verbindung zu einem Fahrzeug herstellen. Parameter:
+            * remote_ip: IP-Adresse oder Hostname des Fahrzeugs
+            * remote_port: Portnummer des UDP-Sockets auf dem Fahrzeug
+            * fields: Abonnierte Einträge des Status oder `None` für alle
+            * timeout_s: Maximale Wartezeit auf den ersten Status
+
+        Kehrt zurück, sobald der erste Status des Fahrzeugs eingetroffen ist, und gibt das
+        dazugehörige `Car`-Objekt zurück. Antwortet das Fahrzeug nicht, wird ein `TimeoutError`
+        geworfen.
+        """
+        try:
+            # IP-Adressen ohne Namensauflösung übernehmen, die asyncio in einem Thread ausführen würde
+            socket.inet_pton(socket.AF_INET, remote_ip)
+            address = (remote_ip, remote_port)
+        except OSError:
+            loop = asyncio.get_running_loop()
+            address_info = await loop.getaddrinfo(remote_ip, remote_port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            address = address_info[0][4][:2]
+
+        if address in self._cars:
+            return self._cars[address]
+
+        transport = self._transports[len(self._cars) % len(self._transports)]
+        car = Car(self, address, transport, fields)
+        self._cars[address] = car
+
+        try:
+            await asyncio.wait_for(car._connect(), timeout_s)
+        except asyncio.TimeoutError:
+            self._remove(car)
+            car.connected = False
+            raise TimeoutError(f"Fahrzeug {address[0]}:{address[1]} antwortet nicht") from None
+        except BaseException:
+            self._remove(car)
+            car.connected = False
+            raise
+
+        return car
+
+    async def discover(self, remote_port=9876, timeout_s=1.0, targets=("255.255.255.255", protocol.DISCOVERY_GROUP)):
+        """
+        Fahrzeuge im lokalen Netz suchen. Parameter:
+            * remote_port: Portnummer des UDP-Sockets auf den Fahrzeugen
+            * timeout_s: Wartezeit auf die Antworten
+            * targets: Adressen, an die die Suchanfrage gesendet wird. Standardmäßig die
+              Broadcast-Adresse und die Multicast-Gruppe der Fahrzeuge. Es können aber auch
+              z.B. die Broadcast-Adresse eines bestimmten Netzes oder einzelne IP-Adressen
+              angegeben werden.
+
+        Gibt eine Liste der gefundenen Fahrzeuge als `discover_response`-Dictionaries zurück,
+        die zusätzlich die Adresse des Fahrzeugs im Eintrag `address` enthalten.
+        """
+        self._discovered = {}
+
+        try:
+            for target in targets:
+                for datagram in protocol.encode({"cmd": "discover"}, protocol.JSON):
+                    try:
+                        self._transports[0].sendto(datagram, (target, remote_port))
+                    except OSError as exc:
+                        print(f"Suchanfrage an {target} nicht möglich: {exc}")
+
+            await asyncio.sleep(timeout_s)
+            return list(self._discovered.values())
+        finally:
+            self._discovered = None
+
+    async def set(self, cars=None, **values):
+        """
+        Fahrzeugparameter bei allen bzw. den übergebenen Fahrzeugen ändern. Die Datagramme
+        werden unmittelbar nacheinander gesendet, so dass alle Fahrzeuge die Änderung nahezu
+        gleichzeitig erhalten.
+        """
+        await asyncio.gather(*(car.set(**values) for car in (cars if cars is not None else self.cars)))
+
+    async def stop(self, cars=None):
+        """
+        Alle bzw. die übergebenen Fahrzeuge anhalten.
+        """
+        await self.set(cars, target_speed=0.0)
+
+    def _remove(self, car):
+        """
+        Fahrzeug nach dem Trennen der Verbindung entfernen.
+        """
+        if self._cars.get(car.address) is car:
+            del self._cars[car.address]
+
+    def _datagram_received(self, data, address):
+        """
+        Empfangenes Datagramm dem Fahrzeug mit der passenden Absenderadresse zuordnen.
+        """
+        car = self._cars.get(address[:2])
+
+        if car is None and self._discovered is None:
+            return
+
+        received_s = time.time()
+
+        try:
+            command = self._reassembler.add(data, address)
+
+            if not command or not "cmd" in command:
+                return
+
+            if command["cmd"] == "discover_response" and self._discovered is not None:
+                self._discovered[address[:2]] = dict(command, address=address[:2])
+            elif car is not None:
+                car._handle(command, received_s)
+        except Exception as exc:
+            print(f"Fehler beim Verarbeiten einer Nachricht von {address}: {exc}")
+            traceback.print_exc()
+
+    async def _housekeeping_task(self):
+        """
+        Hintergrund-Task für die regelmäßigen Nachrichten an alle Fahrzeuge.
+        """
+        interval_s = min(self._PING_INTERVAL_S, 1.0 / self.update_frequency)
+
+        while True:
+            now_s = time.monotonic()
+
+            for car in self.cars:
+                try:
+                    car._housekeeping(now_s)
+                except Exception as exc:
+                    print(f"Fehler bei der Kommunikation mit {car.address}: {exc}")
+                    traceback.print_exc()
+
+            await asyncio.sleep(interval_s)
+
+class _FleetProtocol(asyncio.DatagramProtocol):
+    """
+    asyncio-Protokoll eines UDP-Sockets der Klasse `Fleet`.
+    """
+
+    def __init__(self, fleet):
+        self._fleet = fleet
+
+    def datagram_received(self, data, address):
+        self._fleet._datagram_received(data, address)
+
+    def error_received(self, exc):
+        # Z.B. ICMP "Port Unreachable", solange das Programm auf dem Fahrzeug nicht läuft
+        pass
+
+class Car:
+    """
+    Verbindung zu einem einzelnen Fahrzeug innerhalb einer `Fleet`. Wird mit `Fleet.connect()`
+    erzeugt. Der zuletzt empfangene Status steht jederzeit im Attribut `status` und hat dasselbe
+    Format wie die `status_update`-Nachrichten des Fahrzeugs: Die Fahrzeugparameter direkt
+    sowie die Einträge `sensor_status` und `sound_status`.
+
+    Alle Befehle werden als Batch gesendet, sofern das Fahrzeug dies unterstützt, und dann vom
+    Fahrzeug im selben Takt übernommen. Die Methoden kehren zurück, sobald die Befehle gesendet
+    wurden. Eine Bestätigung durch das Fahrzeug gibt es bei UDP nicht. Soll auf die Wirkung
+    gewartet werden, kann hierfür `wait_for()` verwendet werden.
+    """
+
+    def __init__(self, fleet, address, transport, fields):
+        """
+        Konstruktor. Parameter:
+            * fleet: Übergeordnetes `Fleet`-Objekt
+            * address: Adresse des Fahrzeugs als Tupel aus IP-Adresse und Portnummer
+            * transport: asyncio-Transport des zugeordneten UDP-Sockets
+            * fields: Abonnierte Einträge des Status oder `None` für alle
+        """
+        self.address   = address
+        self.connected = True
+        self.protocol  = protocol.JSON
+        self.features  = []
+        self.status    = {}
+        self.latency   = LatencyEstimator()
+
+        self._fleet     = fleet
+        self._transport = transport
+        self._fields    = fields
+        self._sequence  = 0
+        self._assembler = StatusAssembler()
+        self._hello     = asyncio.get_running_loop().create_future()
+        self._version   = 0
+        self._waiters   = []
+        self._ack_frame = None
+
+        self._last_update_s     = None
+        self._last_subscribe_s  = None
+        self._first_subscribe_s = None
+        self._last_ping_s      = None
+
+    def __repr__(self):
+        return f"<Car {self.address[0]}:{self.address[1]}>"
+
+    async def _connect(self):
+        """
+        Nachrichtenformat aushandeln, den Status abonnieren und auf den ersten Status warten.
+        """
+        for _ in range(self._fleet._HELLO_ATTEMPTS):
+            self._send({"cmd": "hello", "protocols": [protocol.BINARY, protocol.JSON], "version": protocol.VERSION})
+
+            try:
+                await asyncio.wait_for(asyncio.shield(self._hello), self._fleet._HELLO_TIMEOUT_S)
+                break
+            except asyncio.TimeoutError:
+                continue
+
+        self._housekeeping(time.monotonic())
+        await self.wait_for(lambda status: bool(status))
+
+    async def close(self):
+        """
+        Abonnement beenden und das Fahrzeug aus der `Fleet` entfernen. Wartende `updates()`
+        und `wait_for()` werden beendet.
+        """
+        if not self.connected:
+            return
+
+        self._send({"cmd": "unsubscribe"})
+        self.connected = False
+        self._fleet._remove(self)
+        self._notify()
+
+    async def send(self, *commands):
+        """
+        Beliebige Befehle an das Fahrzeug senden, z.B. `{"cmd": "enable_sensor", "name": "..."}`.
+        Mehrere Befehle werden gemeinsam als Batch gesendet.
+        """
+        if not self.connected:
+            raise ConnectionError(f"Keine Verbindung zu Fahrzeug {self.address[0]}:{self.address[1]}")
+
+        self._send_batch(list(commands))
+
+    async def set(self, **values):
+        """
+        Einen oder mehrere Fahrzeugparameter ändern, z.B. `await car.set(target_speed=0.5, direction=0.2)`.
+        """
+        await self.send(*({"cmd": "set", "attr": attribute, "value": value} for attribute, value in values.items()))
+
+    async def stop(self):
+        """
+        Fahrzeug anhalten.
+        """
+        await self.set(target_speed=0.0)
+
+    async def enable_sensor(self, name, enabled=True):
+        """
+        Einen Sensor ein- oder ausschalten.
+        """
+        await self.send({"cmd": "enable_sensor" if enabled else "disable_sensor", "name": name})
+
+    async def play_sound(self, name, play=True):
+        """
+        Wiedergabe eines Sounds starten oder stoppen.
+        """
+        await self.send({"cmd": "play_sound" if play else "stop_sound", "name": name})
+
+    async def updates(self):
+        """
+        Asynchroner Iterator über den Status des Fahrzeugs. Liefert bei jeder Änderung eine
+        Kopie des Status. Kommt die Schleife mit dem Verarbeiten nicht hinterher, werden
+        Zwischenstände übersprungen und nur der jeweils neueste geliefert. Endet, sobald die
+        Verbindung getrennt wird.
+        """
+        version = None
+
+        while self.connected:
+            if version == self._version:
+                await self._changed()
+                continue
+
+            version = self._version
+            yield dict(self.status)
+
+    async def wait_for(self, predicate, timeout_s=None):
+        """
+        Warten, bis der Status die Bedingung `predicate(status)` erfüllt, und den Status
+        zurückgeben, z.B. `await car.wait_for(lambda status: status["speed_total"] > 0.4)`.
+        Wirft einen `ConnectionError`, wenn die Verbindung vorher getrennt wird.
+        """
+        async def _wait():
+            while not predicate(self.status):
+                if not self.connected:
+                    raise ConnectionError(f"Keine Verbindung zu Fahrzeug {self.address[0]}:{self.address[1]}")
+
+                await self._changed()
+
+            return dict(self.status)
+
+        return await asyncio.wait_for(_wait(), timeout_s)
+
+    def _changed(self):
+        """
+        Gibt ein Future zurück, das bei der nächsten Statusänderung erfüllt wird.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        return future
+
+    def _notify(self):
+        """
+        Alle auf eine Statusänderung wartenden Futures erfüllen.
+        """
+        self._version += 1
+        waiters, self._waiters = self._waiters, []
+
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    def _send(self, command):
+        """
+        Einzelnen Befehl mit fortlaufender Sequenznummer senden.
+        """
+        self._sequence = (self._sequence + 1) & 0xFFFFFFFF
+        command = dict(command, seq=self._sequence)
+
+        for datagram in protocol.encode(command, self.protocol):
+            self._transport.sendto(datagram, self.address)
+
+    def _send_batch(self, commands):
+        """
+        Mehrere Befehle möglichst gemeinsam in einem Datagramm senden.
+        """
+        if "batch" not in self.features:
+            for command in commands:
+                self._send(command)
+
+            return
+
+        for start in range(0, len(commands), Fleet._MAX_BATCH_OPS):
+            chunk = commands[start:start + Fleet._MAX_BATCH_OPS]
+            self._send(chunk[0] if len(chunk) == 1 else {"cmd": "batch", "ops": chunk})
+
+    def _send_ack(self):
+        """
+        Neueste empfangene Aktualisierung bestätigen. Wird erst nach allen im selben Durchlauf
+        der Ereignisschleife empfangenen Datagrammen aufgerufen, so dass je Durchlauf nur eine
+        Bestätigung gesendet wird.
+        """
+        frame, self._ack_frame = self._ack_frame, None
+
+        if self.connected and frame is not None:
+            self._send({"cmd": "ack", "frame": frame})
+
+    def _handle(self, command, received_s):
+        """
+        Empfangene Nachricht des Fahrzeugs verarbeiten.
+        """
+        if command["cmd"] == "hello_response":
+            # Nachrichtenformat ausgehandelt
+            self.features = list(command.get("features") or [])
+
+            if command.get("protocol") == protocol.BINARY and command.get("version") == protocol.VERSION:
+                self.protocol = protocol.BINARY
+
+            if not self._hello.done():
+                self._hello.set_result(None)
+        elif command["cmd"] == "pong":
+            # Antwort auf die Laufzeitmessung mit dem tatsächlichen Empfangszeitpunkt
+            self.latency.add(command.get("t0", 0.0), command.get("t1", 0.0), command.get("t2", 0.0), received_s)
+        elif command["cmd"] == "status_update" and "data" in command:
+            # Alle Aktualisierungen anwenden, da sie aufeinander aufbauen. Bestätigt wird nur die neueste.
+            self._last_update_s = time.monotonic()
+
+            if self._ack_frame is None:
+                asyncio.get_running_loop().call_soon(self._send_ack)
+
+            self._ack_frame = max(self._ack_frame or 0, command.get("frame", 0))
+
+            if self._assembler.apply(command):
+                self.status = self._assembler.status
+                self._notify()
+        elif command["cmd"] in ("vehicle_status_response", "sensor_status_response", "sound_status_response") \
+        and "data" in command:
+            # Antwort auf eine Statusabfrage, solange kein Abonnement besteht
+            if command["cmd"] == "vehicle_status_response":
+                self.status = dict(self.status, **command["data"])
+            else:
+                self.status = dict(self.status, **{command["cmd"][:-len("_response")]: command["data"]})
+
+            self._notify()
+
+    def _housekeeping(self, now_s):
+        """
+        Regelmäßig von der `Fleet` aufgerufene Methode für Laufzeitmessung, Abonnement und
+        Statusabfrage.
+        """
+        commands = []
+
+        if self._last_ping_s is None or now_s - self._last_ping_s >= Fleet._PING_INTERVAL_S:
+            # Laufzeit messen und die letzte Schätzung an das Fahrzeug melden
+            self._last_ping_s = now_s
+            commands.append({
+                "cmd":      "ping",
+                "t0":       time.time(),
+                "rtt_s":    self.latency.rtt_smoothed_s,
+                "offset_s": self.latency.offset_s,
+            })
+
+        subscribed = self._last_update_s is not None and now_s - self._last_update_s < Fleet._RESUBSCRIBE_S
+
+        if not subscribed:
+            if self._last_subscribe_s is None or now_s - self._last_subscribe_s >= Fleet._RESUBSCRIBE_S:
+                self._last_subscribe_s  = now_s
+                self._first_subscribe_s = self._first_subscribe_s or now_s
+                subscribe = {"cmd": "subscribe", "rate": self._fleet.update_frequency}
+
+                if self._fields is not None:
+                    subscribe["fields"] = list(self._fields)
+
+                commands.append(subscribe)
+
+            # Nur abfragen, wenn das Fahrzeug keine Aktualisierungen sendet
+            if self._first_subscribe_s is not None and now_s - self._first_subscribe_s >= Fleet._POLL_AFTER_S:
+                commands.append({"cmd": "vehicle_status"})
+                commands.append({"cmd": "sensor_status"})
+                commands.append({"cmd": "sound_status"})
+
+        if commands:
+            self._send_batch(commands)
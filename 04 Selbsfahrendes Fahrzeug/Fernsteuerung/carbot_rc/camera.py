@@ -0,0 +1,254 @@
+import http.client, io, socket, threading, time, traceback
+from PIL import Image
+
+class CameraStream:
+    """
+    Empfang des MJPEG-Livestreams der Fahrzeugkamera (siehe `Device/camera/main.py`) für die
+    Anzeige im Hauptfenster. Der Stream ist eine HTTP-Antwort vom Typ `multipart/x-mixed-replace`,
+    in der die Kamerabilder als einzelne JPEG-Dateien nacheinander übertragen werden.
+
+    Die Arbeit verteilt sich auf zwei Hintergrund-Threads, damit das UI davon nichts merkt:
+
+        * Der Empfangs-Thread zerlegt den Stream in die einzelnen Bilder und legt jeweils nur
+          das neueste, noch nicht dekodierte Bild ab.
+        * Der Dekodier-Thread dekodiert immer nur dieses neueste Bild und verkleinert es auf die
+          Anzeigegröße. Dank `Image.draft()` wird das JPEG dabei bereits beim Dekodieren verkleinert.
+
+    Das UI holt sich mit `latest()` das neueste fertige Bild ab. Bilder, die eintreffen, bevor das
+    vorherige dekodiert oder angezeigt wurde, werden verworfen und nur gezählt. Das Bild auf dem
+    Bildschirm hinkt der Kamera dadurch nie mehr als ein Bild hinterher.
+
+    Sendet die Kamera den Aufnahmezeitpunkt im Header `X-Timestamp` mit, kann zusammen mit der
+    Uhrenabweichung der Fernsteuerung die Verzögerung von der Kamera bis zum Bildschirm berechnet
+    werden. Ansonsten ist nur der Empfangszeitpunkt bekannt.
+    """
+
+    # Wartezeit bis zum nächsten Verbindungsversuch
+    _RECONNECT_S = 2.0
+
+    # Timeout für den Verbindungsaufbau und beim Lesen des Streams
+    _TIMEOUT_S = 5.0
+
+    def __init__(self, size=(320, 240), port=8000, path="/stream.mjpg"):
+        """
+        Konstruktor. Parameter:
+            * size: Maximale Anzeigegröße der Bilder in Pixeln
+            * port: Portnummer des Kamera-Webservers auf dem Fahrzeug
+            * path: Pfad des MJPEG-Streams
+        """
+        self.size  = size
+        self._port = port
+        self._path = path
+
+        self._condition = threading.Condition()
+        self._jpeg      = None
+        self._frame     = None
+        self._stop      = None
+        self._socket    = None
+
+        self.error    = ""
+        self.received = 0
+        self.decoded  = 0
+        self.dropped  = 0
+
+    def start(self, host):
+        """
+        Empfang des Streams vom angegebenen Fahrzeug starten. Kann der Kamera-Webserver nicht
+        erreicht werden, wird es regelmäßig erneut versucht.
+        """
+        self.stop()
+
+        stop = threading.Event()
+        self._stop = stop
+
+        threading.Thread(target=self._receive_thread, args=(host, stop), daemon=True).start()
+        threading.Thread(target=self._decode_thread, args=(stop,), daemon=True).start()
+
+    def stop(self):
+        """
+        Empfang des Streams beenden.
+        """
+        if self._stop is None:
+            return
+
+        self._stop.set()
+        self._stop = None
+
+        with self._condition:
+            socket_ = self._socket
+
+            self._jpeg  = None
+            self._frame = None
+            self.error  = ""
+            self._condition.notify_all()
+
+        if socket_ is not None:
+            # Blockierendes Lesen im Empfangs-Thread abbrechen
+            try:
+                socket_.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def latest(self):
+        """
+        Gibt das neueste dekodierte Bild zurück oder `None`, wenn seit dem letzten Aufruf kein
+        neues Bild dekodiert wurde. Das Bild ist ein Tupel aus:
+
+            * dem PIL-Bild in Anzeigegröße
+            * dem Aufnahmezeitpunkt nach der Uhr des Fahrzeugs (time.time) oder `None`
+            * dem Empfangszeitpunkt nach der eigenen Uhr (time.time)
+        """
+        with self._condition:
+            frame       = self._frame
+            self._frame = None
+
+        return frame
+
+    def _receive_thread(self, host, stop):
+        """
+        Hintergrund-Thread zum Empfang des Streams.
+        """
+        while not stop.is_set():
+            connection = http.client.HTTPConnection(host, self._port, timeout=self._TIMEOUT_S)
+
+            try:
+                connection.request("GET", self._path)
+                response = connection.getresponse()
+
+                if response.status != 200:
+                    raise OSError(f"HTTP-Status {response.status}")
+
+                boundary = self._boundary(response.getheader("Content-Type", ""))
+
+                with self._condition:
+                    if stop.is_set():
+                        break
+
+                    self._socket = connection.sock
+                    self.error   = ""
+
+                self._read_parts(response, boundary, stop)
+            except (OSError, http.client.HTTPException, ValueError) as exc:
+                if not stop.is_set():
+                    if str(exc) != self.error:
+                        print(f"Kamera-Stream nicht verfügbar: {exc}")
+
+                    self.error = str(exc)
+            except Exception as exc:
+                print(f"Fehler beim Empfang des Kamera-Streams: {exc}")
+                traceback.print_exc()
+            finally:
+                with self._condition:
+                    self._socket = None
+
+                connection.close()
+
+            stop.wait(self._RECONNECT_S)
+
+    def _boundary(self, content_type):
+        """
+        Trennzeichenfolge der einzelnen Bilder aus dem Content-Type-Header ermitteln.
+        """
+        mime_type, _, parameters = content_type.partition(";")
+
+        if mime_type.strip() != "multipart/x-mixed-replace":
+            raise ValueError(f"Unerwarteter Content-Type: {content_type}")
+
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.strip().partition("=")
+
+            if key.lower() == "boundary":
+                return b"--" + value.strip('"').encode("ascii")
+
+        raise ValueError(f"Keine Boundary im Content-Type: {content_type}")
+
+    def _read_parts(self, response, boundary, stop):
+        """
+        Einzelne Bilder aus dem Stream lesen, bis die Verbindung getrennt wird. Von jedem
+        Bild werden nur die Header und die genaue Anzahl Bytes gelesen, die `Content-Length`
+        angibt. Das Bild selbst wird hier nicht angefasst, sondern nur abgelegt.
+        """
+        while not stop.is_set():
+            line = response.readline()
+
+            if not line:
+                raise OSError("Verbindung vom Kamera-Webserver getrennt")
+
+            if not line.startswith(boundary):
+                continue
+
+            headers = {}
+
+            while True:
+                line = response.readline()
+
+                if not line:
+                    raise OSError("Verbindung vom Kamera-Webserver getrennt")
+
+                line = line.strip()
+
+                if not line:
+                    break
+
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            try:
+                length = int(headers["content-length"])
+            except (KeyError, ValueError):
+                raise ValueError("Bild ohne gültige Content-Length im Kamera-Stream") from None
+
+            data = response.read(length)
+            received = time.time()
+
+            try:
+                captured = float(headers["x-timestamp"])
+            except (KeyError, ValueError):
+                captured = None
+
+            with self._condition:
+                # Nach `stop()` kein Bild der alten Verbindung mehr ablegen
+                if stop.is_set():
+                    return
+
+                if self._jpeg is not None:
+                    self.dropped += 1
+
+                self._jpeg = (data, captured, received)
+                self.received += 1
+                self._condition.notify()
+
+    def _decode_thread(self, stop):
+        """
+        Hintergrund-Thread zum Dekodieren und Verkleinern des jeweils neuesten Bildes.
+        """
+        while True:
+            with self._condition:
+                while self._jpeg is None and not stop.is_set():
+                    self._condition.wait()
+
+                if stop.is_set():
+                    return
+
+                data, captured, received = self._jpeg
+                self._jpeg = None
+
+            try:
+                image = Image.open(io.BytesIO(data))
+                image.draft("RGB", self.size)
+                image = image.convert("RGB")
+                image.thumbnail(self.size)
+            except Exception as exc:
+                print(f"Fehler beim Dekodieren eines Kamerabildes: {exc}")
+                traceback.print_exc()
+                continue
+
+            with self._condition:
+                if stop.is_set():
+                    return
+
+                if self._frame is not None:
+                    self.dropped += 1
+
+                self._frame = (image, captured, received)
+                self.decoded += 1
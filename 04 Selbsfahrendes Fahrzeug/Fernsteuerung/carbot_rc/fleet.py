@@ -0,0 +1,204 @@
+import asyncio, threading, time, traceback
+from carbot_rc.aio import Fleet
+
+class FleetConnection:
+    """
+    Verbindung zu allen Fahrzeugen der Flottenansicht. Statt eines Threads je Fahrzeug läuft
+    ein einziger Netzwerk-Thread mit einer asyncio Event Loop, in der eine `Fleet` alle
+    Fahrzeuge über einen gemeinsamen UDP-Socket bedient. Die Methoden dieser Klasse werden
+    vom UI-Thread aufgerufen und reichen ihre Aufgaben nur an die Event Loop weiter.
+
+    Den Status der Fahrzeuge liest das UI mit `cars()` beim Neuzeichnen selbst aus. Da jedes
+    Fahrzeug bei einer Änderung ein neues Status-Dictionary erhält, statt das vorhandene zu
+    verändern, ist hierfür keine weitere Synchronisation notwendig.
+
+    Mit `send_control()` an alle Fahrzeuge gesendete Steuerwerte werden wie bei der Klasse
+    `RemoteConnection` zusammengefasst und mit höchstens `control_rate` Nachrichten je Sekunde
+    gesendet.
+    """
+
+    def __init__(self, remote_port=9876, update_frequency=10, control_rate=20):
+        """
+        Konstruktor. Parameter:
+            * remote_port: Portnummer des UDP-Sockets auf den Fahrzeugen
+            * update_frequency: Anzahl abonnierter Aktualisierungen je Sekunde und Fahrzeug
+            * control_rate: Maximale Anzahl an alle gesendeter Steuerwerte je Sekunde
+        """
+        self._remote_port = remote_port
+        self._fleet       = Fleet(update_frequency=update_frequency)
+        self._loop        = None
+        self._names       = {}
+        self._tasks       = set()
+
+        self._control_period_s  = 1.0 / control_rate
+        self._control_lock      = threading.Lock()
+        self._control           = None
+        self._control_immediate = False
+        self._control_scheduled = False
+        self._next_control_s    = 0.0
+
+        self.discovering = False
+
+    def start(self):
+        """
+        Netzwerk-Thread starten, sofern er nicht bereits läuft, und warten, bis der UDP-Socket
+        geöffnet wurde.
+        """
+        if self._loop:
+            return
+
+        self._loop = asyncio.new_event_loop()
+        opened     = threading.Event()
+
+        network_thread = threading.Thread(target=self._network_thread_loop, args=(opened,), daemon=True)
+        network_thread.start()
+        opened.wait()
+
+    def _network_thread_loop(self, opened):
+        """
+        Hauptschleife des Netzwerk-Threads.
+        """
+        asyncio.set_event_loop(self._loop)
+
+        try:
+            try:
+                self._loop.run_until_complete(self._fleet.open())
+            finally:
+                opened.set()
+
+            self._loop.run_forever()
+        except Exception as exc:
+            print(f"Fehler im Netzwerk-Thread der Flotte: {exc}")
+            traceback.print_exc()
+
+    def _run(self, coroutine):
+        """
+        Coroutine in der Event Loop des Netzwerk-Threads ausführen. Fehler werden nur ausgegeben.
+        """
+        self.start()
+        asyncio.run_coroutine_threadsafe(self._guarded(coroutine), self._loop)
+
+    async def _guarded(self, coroutine):
+        """
+        Coroutine ausführen und Fehler nur ausgeben, z.B. wenn ein Fahrzeug gleichzeitig
+        aus der Flotte entfernt wird.
+        """
+        try:
+            await coroutine
+        except TimeoutError as exc:
+            print(exc)
+        except Exception as exc:
+            print(f"Fehler im Netzwerk-Thread der Flotte: {exc}")
+            traceback.print_exc()
+
+    def cars(self):
+        """
+        Vom UI-Thread aufgerufene Methode. Gibt für alle verbundenen Fahrzeuge ein Tupel aus
+        Adresse, Name, Status und geglätteter Paketlaufzeit zurück.
+        """
+        return [
+            (car.address, self._names.get(car.address, ""), car.status, car.latency.rtt_smoothed_s)
+            for car in self._fleet.cars
+        ]
+
+    def discover(self, timeout_s=1.0):
+        """
+        Vom UI-Thread aufgerufene Methode, um die Fahrzeuge im lokalen Netz zu suchen und
+        alle gefundenen Fahrzeuge zu verbinden.
+        """
+        async def _discover():
+            self.discovering = True
+
+            try:
+                found = await self._fleet.discover(self._remote_port, timeout_s)
+            finally:
+                self.discovering = False
+
+            for info in found:
+                self._names[info["address"]] = info.get("name", "")
+
+            await asyncio.gather(*(self._connect(info["address"][0], info["address"][1]) for info in found))
+
+        self._run(_discover())
+
+    def connect(self, remote_ip):
+        """
+        Vom UI-Thread aufgerufene Methode, um ein Fahrzeug anhand seiner IP-Adresse zur
+        Flotte hinzuzufügen.
+        """
+        self._run(self._connect(remote_ip, self._remote_port))
+
+    async def _connect(self, remote_ip, remote_port):
+        """
+        Fahrzeug verbinden. Nicht erreichbare Fahrzeuge werden nur gemeldet.
+        """
+        try:
+            await self._fleet.connect(remote_ip, remote_port)
+        except TimeoutError as exc:
+            print(exc)
+
+    def disconnect(self, address):
+        """
+        Vom UI-Thread aufgerufene Methode, um ein Fahrzeug aus der Flotte zu entfernen.
+        """
+        async def _disconnect():
+            for car in self._fleet.cars:
+                if car.address == tuple(address):
+                    await car.close()
+
+        self._run(_disconnect())
+
+    def stop_all(self):
+        """
+        Vom UI-Thread aufgerufene Methode, um alle Fahrzeuge sofort anzuhalten.
+        """
+        with self._control_lock:
+            self._control = None
+
+        self._run(self._fleet.stop())
+
+    def send_control(self, values, immediate=False):
+        """
+        Vom UI-Thread aufgerufene Methode, um Fahrzeugparameter bei allen Fahrzeugen gleichzeitig
+        zu ändern, z.B. beim Ziehen auf der Steuerfläche. Es wird nur der jeweils neueste Wert
+        gemerkt und höchstens mit `control_rate` Nachrichten je Sekunde gesendet. Mit `immediate`
+        wird der Wert sofort gesendet.
+        """
+        with self._control_lock:
+            self._control           = values
+            self._control_immediate = self._control_immediate or immediate
+            schedule                = immediate or not self._control_scheduled
+            self._control_scheduled = True
+
+        if schedule:
+            self.start()
+            self._loop.call_soon_threadsafe(self._flush_control)
+
+    def _flush_control(self):
+        """
+        In der Event Loop aufgerufene Methode, die die neuesten Steuerwerte sendet, sobald
+        der Mindestabstand seit dem letzten Senden erreicht ist.
+        """
+        now_s = time.monotonic()
+
+        with self._control_lock:
+            values = self._control
+
+            if values is None:
+                self._control_scheduled = False
+                return
+
+            if not self._control_immediate and now_s < self._next_control_s:
+                self._loop.call_at(self._loop.time() + self._next_control_s - now_s, self._flush_control)
+                return
+
+            self._control           = None
+            self._control_immediate = False
+            self._control_scheduled = False
+
+        self._next_control_s = now_s + self._control_period_s
+
+        # Referenz auf den Task halten, damit er nicht vorzeitig aufgeräumt wird
+        task = self._loop.create_task(self._guarded(self._fleet.set(**values)))
+        task.add_done_callback(self._tasks.discard)
+        self._tasks.add(task)
@@ -0,0 +1,198 @@
+import time
+import tkinter as tk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+class FleetWindow:
+    """
+    Flottenansicht mit einer Zeile je Fahrzeug. Die Fahrzeuge werden per `discover` im lokalen
+    Netz gesucht oder von Hand über ihre IP-Adresse hinzugefügt. Ein Doppelklick auf eine Zeile
+    wechselt die Steuerung im Hauptfenster zu diesem Fahrzeug. Zusätzlich können alle Fahrzeuge
+    gemeinsam angehalten oder über die Steuerfläche des Hauptfensters gemeinsam gesteuert werden.
+
+    Das Fenster hat keine eigene Bildaktualisierung, sondern wird vom Hauptfenster in dessen
+    Zeichenzyklus mit `redraw()` aktualisiert. Dabei werden höchstens alle `_REDRAW_INTERVAL_S`
+    Sekunden nur die Zeilen geändert, deren angezeigte Werte sich geändert haben.
+    """
+
+    # Mindestabstand beim Aktualisieren der Tabelle
+    _REDRAW_INTERVAL_S = 0.1
+
+    # Spalten der Tabelle: Name, Überschrift, Breite in Pixeln
+    _COLUMNS = (
+        ("name",              "Name",              140),
+        ("address",           "Adresse",           160),
+        ("target_speed",      "target_speed",      100),
+        ("speed_total",       "speed_total",       100),
+        ("direction",         "direction",         100),
+        ("obstacle_pushback", "obstacle_pushback", 130),
+        ("sensors",           "Sensoren",           80),
+        ("rtt",               "Laufzeit",           80),
+    )
+
+    def __init__(self, fleet, on_select):
+        """
+        Konstruktor. Parameter:
+            * fleet: Instanz der Klasse FleetConnection
+            * on_select: Rückruffunktion mit der Adresse (IP, Port) als Parameter, die bei
+              einem Doppelklick auf ein Fahrzeug aufgerufen wird
+        """
+        self._fleet     = fleet
+        self._on_select = on_select
+        self._rows      = {}
+        self._redraw_s  = 0.0
+
+        self._window = ttk.Toplevel(title="Carbot Flotte", size=(920, 420))
+        self._window.columnconfigure(0, weight=1)
+        self._window.rowconfigure(1, weight=1)
+        self._window.protocol("WM_DELETE_WINDOW", self.hide)
+
+        # Werkzeugleiste
+        toolbar = ttk.Frame(self._window, bootstyle=SECONDARY, padding=6)
+        toolbar.grid(row=0, column=0, sticky=(N,E,S,W))
+        toolbar.columnconfigure(2, weight=1)
+
+        self._discover_button = ttk.Button(toolbar, text="Fahrzeuge suchen", bootstyle=PRIMARY, command=self._on_discover)
+        self._discover_button.grid(row=0, column=0, sticky=(W))
+
+        self._broadcast = tk.IntVar(value=0)
+        broadcast_button = ttk.Checkbutton(toolbar, text="Steuerfläche an alle senden", variable=self._broadcast, bootstyle="round-toggle", padding=6)
+        broadcast_button.grid(row=0, column=1, sticky=(W), padx=12)
+
+        self._remote_ip = tk.StringVar(value="")
+        remote_ip_entry = ttk.Entry(toolbar, width=16, textvariable=self._remote_ip)
+        remote_ip_entry.grid(row=0, column=3, sticky=(E))
+        remote_ip_entry.bind("<Return>", lambda event: self._on_add())
+
+        add_button = ttk.Button(toolbar, text="Hinzufügen", bootstyle=SECONDARY, command=self._on_add)
+        add_button.grid(row=0, column=4, sticky=(E))
+
+        stop_button = ttk.Button(toolbar, text="Alle anhalten", bootstyle=DANGER, command=self._fleet.stop_all)
+        stop_button.grid(row=0, column=5, sticky=(E), padx=(12, 0))
+
+        # Tabelle mit einer Zeile je Fahrzeug
+        self._tree = ttk.Treeview(self._window, columns=[column for column, _, _ in self._COLUMNS], show=HEADINGS, bootstyle=PRIMARY)
+        self._tree.grid(row=1, column=0, sticky=(N,E,S,W))
+        self._tree.bind("<Double-1>", self._on_double_click)
+        self._tree.bind("<Delete>", self._on_delete)
+
+        for column, text, width in self._COLUMNS:
+            self._tree.heading(column, text=text)
+            self._tree.column(column, width=width, anchor=W if column in ("name", "address") else E)
+
+        self._status_text = tk.StringVar(value="")
+        ttk.Label(self._window, textvariable=self._status_text, padding=6).grid(row=2, column=0, sticky=(W))
+
+    @property
+    def broadcast(self):
+        """
+        Gibt an, ob die Steuerfläche des Hauptfensters an alle Fahrzeuge senden soll.
+        """
+        return bool(self._window.winfo_viewable()) and self._broadcast.get() == 1
+
+    def show(self):
+        """
+        Fenster anzeigen und in den Vordergrund holen.
+        """
+        self._fleet.start()
+        self._window.deiconify()
+        self._window.lift()
+
+    def hide(self):
+        """
+        Fenster verstecken. Die Fahrzeuge bleiben dabei verbunden.
+        """
+        self._window.withdraw()
+
+    def _on_discover(self):
+        """
+        Klick auf den Button zum Suchen der Fahrzeuge.
+        """
+        self._fleet.discover()
+
+    def _on_add(self):
+        """
+        Fahrzeug mit der eingegebenen IP-Adresse hinzufügen.
+        """
+        remote_ip = self._remote_ip.get().strip()
+
+        if remote_ip:
+            self._fleet.connect(remote_ip)
+            self._remote_ip.set("")
+
+    def _on_double_click(self, event):
+        """
+        Steuerung im Hauptfenster zum ausgewählten Fahrzeug wechseln.
+        """
+        iid = self._tree.identify_row(event.y)
+
+        if iid in self._rows:
+            self._on_select(self._rows[iid][0])
+
+    def _on_delete(self, event):
+        """
+        Ausgewählte Fahrzeuge aus der Flotte entfernen.
+        """
+        for iid in self._tree.selection():
+            if iid in self._rows:
+                self._fleet.disconnect(self._rows[iid][0])
+
+    def redraw(self):
+        """
+        Vom Hauptfenster in dessen Zeichenzyklus aufgerufene Methode zur Aktualisierung der
+        Tabelle. Neue Fahrzeuge erhalten eine Zeile, getrennte werden entfernt, und nur Zeilen
+        mit geänderten Werten werden neu gesetzt.
+        """
+        now_s = time.monotonic()
+
+        if now_s - self._redraw_s < self._REDRAW_INTERVAL_S or not self._window.winfo_viewable():
+            return
+
+        self._redraw_s = now_s
+        cars = self._fleet.cars()
+        iids = set()
+
+        for address, name, status, rtt_s in cars:
+            iid    = f"{address[0]}:{address[1]}"
+            values = self._row_values(address, name, status, rtt_s)
+            iids.add(iid)
+
+            if iid not in self._rows:
+                self._tree.insert("", END, iid=iid, values=values)
+            elif self._rows[iid][1] != values:
+                self._tree.item(iid, values=values)
+            else:
+                continue
+
+            self._rows[iid] = (address, values)
+
+        for iid in [iid for iid in self._rows if iid not in iids]:
+            self._tree.delete(iid)
+            del self._rows[iid]
+
+        status_text = "Suche läuft …" if self._fleet.discovering else f"{len(cars)} Fahrzeuge verbunden"
+
+        if self._status_text.get() != status_text:
+            self._status_text.set(status_text)
+
+    def _row_values(self, address, name, status, rtt_s):
+        """
+        Angezeigte Werte einer Zeile. Die Zahlen werden auf zwei Nachkommastellen gerundet,
+        damit kleinste Änderungen nicht jedes Mal ein Neuzeichnen der Zeile auslösen.
+        """
+        def _number(field):
+            value = status.get(field)
+            return f"{value:+.2f}" if isinstance(value, (int, float)) else ""
+
+        sensors = status.get("sensor_status") or {}
+
+        return (
+            name,
+            f"{address[0]}:{address[1]}",
+            _number("target_speed"),
+            _number("speed_total"),
+            _number("direction"),
+            _number("obstacle_pushback"),
+            f"{sum(1 for active in sensors.values() if active)}/{len(sensors)}",
+            f"{rtt_s * 1000:.1f} ms" if rtt_s is not None else "",
+        )
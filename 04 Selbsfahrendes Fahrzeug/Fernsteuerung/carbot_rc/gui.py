@@ -1,25 +1,82 @@
+import time
+import numpy as np
 import tkinter as tk
 import ttkbootstrap as ttk
+from PIL import ImageTk
 from ttkbootstrap.constants import *
+from carbot_rc.fleet_window import FleetWindow
 
 class MainWindow:
     """
     Hauptfenster der Anwendung.
+
+    Die vom Netzwerk-Thread empfangenen Daten werden nicht sofort angezeigt, sondern nur
+    in einem Fach je Art (Fahrzeugparameter, Sensoren, Audiowiedergabe, Laufzeit) abgelegt,
+    wobei neuere Daten ältere überschreiben. Das UI zeichnet mit fester Bildrate und
+    übernimmt dabei nur den jeweils neuesten Stand. Geändert werden nur die Widgets, deren
+    angezeigter Wert sich tatsächlich geändert hat. Treffen die Daten schneller ein, als Tk
+    sie zeichnen kann, wird somit nichts aufgestaut und das UI hinkt dem Fahrzeug nicht
+    hinterher.
+
+    Dasselbe gilt für das Bild der Fahrzeugkamera: Es wird im Hintergrund von der Klasse
+    CameraStream empfangen und dekodiert. Das UI übernimmt mit jedem Neuzeichnen nur das
+    neueste fertige Bild, alle anderen werden verworfen.
+
+    Der Verlauf der Fahrzeugparameter wird hingegen vollständig vom Netzwerk-Thread in der
+    Klasse TelemetryHistory aufgezeichnet. Die Diagramme werden mit einer geringeren Bildrate
+    und nur bei neuen Werten gezeichnet, wobei je Pixelspalte nur Minimum und Maximum als
+    senkrechter Strich einer einzigen Linie je Fahrzeugparameter dargestellt werden.
+
+    Optional kann eine Flottenansicht (FleetWindow) geöffnet werden, in der alle Fahrzeuge im
+    Netz mit ihrem Status aufgelistet werden. Sie wird im selben Zeichenzyklus aktualisiert.
     """
 
-    def __init__(self, connection):
+    # Abstand der Bildaktualisierungen (ca. 30 Bilder je Sekunde)
+    _REDRAW_INTERVAL_MS = 33
+
+    # Abstand der Aktualisierungen von Bildrate und Verzögerung der Kamera
+    _CAMERA_STATS_INTERVAL_S = 0.5
+
+    # Mindestabstand beim Neuzeichnen der Diagramme (max. 10 Bilder je Sekunde)
+    _CHART_INTERVAL_S = 0.1
+    _CHART_HEIGHT_PX  = 200
+
+    # Linienfarben der Fahrzeugparameter im Diagramm
+    _CHART_COLORS = {
+        "target_speed":      "#2780E3",
+        "obstacle_pushback": "#FF0039",
+        "direction":         "#9954BB",
+        "speed_total":       "#3FB618",
+        "speed_left":        "#FF7518",
+        "speed_right":       "#00B8D4",
+    }
+
+    def __init__(self, connection, camera=None, history=None, fleet=None):
         """
-        Konstruktor. Hier werden die tkinter-Widgets erstellt. Als Parameter muss ein zuvor
-        erzeugte Instanz der Klasse RemoteConnection übergeben werden.
+        Konstruktor. Hier werden die tkinter-Widgets erstellt. Parameter:
+            * connection: Zuvor erzeugte Instanz der Klasse RemoteConnection
+            * camera: Optional eine Instanz der Klasse CameraStream zur Anzeige des Kamerabildes
+            * history: Optional eine Instanz der Klasse TelemetryHistory zur Anzeige des Verlaufs
+            * fleet: Optional eine Instanz der Klasse FleetConnection für die Flottenansicht
         """
         # Das Fenster selbst
-        self._root = ttk.Window(title="Carbot Fernsteuerung", size=(1400, 540), resizable=(False, False))
+        width  = 1400 + (camera.size[0] + 24 if camera else 0)
+        height = 540 + (self._CHART_HEIGHT_PX + 24 if history else 0)
+        self._root = ttk.Window(title="Carbot Fernsteuerung", size=(width, height), resizable=(False, False))
         self._root.columnconfigure(1, weight=1)
         self._root.place_window_center()
 
+        # Neuester empfangener Stand je Art und zuletzt angezeigte Werte
+        self._latest = {}
+        self._shown  = {}
+
         # Verbindung zum Fahrzeug
         connection_frame = self._create_row_frame(self._root, row=0, text="IP-Adresse", dark=True)
         connection_frame.columnconfigure(0, weight=1)
+
+        self._link_text = tk.StringVar(value="")
+        link_label = ttk.Label(connection_frame, textvariable=self._link_text, padding=(0, 0, 12, 0))
+        link_label.grid(row=0, column=0, sticky=(E))
         
         self._remote_ip = tk.StringVar(value="192.168.178.121")
         self._remote_ip_entry = ttk.Entry(connection_frame, width=20, textvariable=self._remote_ip)
@@ -29,6 +86,16 @@ class MainWindow:
         self._connect_button = ttk.Button(connection_frame, textvariable=self._connect_button_text, bootstyle=PRIMARY, command=self._on_toggle_connection)
         self._connect_button.grid(row=0, column=2, sticky=(W))
 
+        # Flottenansicht, wird erst beim ersten Öffnen erzeugt
+        self._fleet        = fleet
+        self._fleet_window = None
+        self._switch_to    = None
+        self._fleet_car    = None
+
+        if fleet:
+            fleet_button = ttk.Button(connection_frame, text="Flotte", bootstyle=SECONDARY, command=self._on_show_fleet)
+            fleet_button.grid(row=0, column=3, sticky=(W), padx=(6, 0))
+
         self._connected = False
         self._update_connection_widgets()
 
@@ -119,7 +186,7 @@ class MainWindow:
         self._control_canvas = tk.Canvas(vehicle_frame)
         self._control_canvas.grid(row=0, column=6, rowspan=2, sticky=(N,E,S,W))
         self._control_canvas.bind("<Button-1>", self._on_control_canvas_click)
-        self._control_canvas.bind("<B1-Motion>", self._on_control_canvas_click)
+        self._control_canvas.bind("<B1-Motion>", self._on_control_canvas_motion)
         self._control_canvas.bind("<ButtonRelease-1>", self._on_control_canvas_release)
 
         self._control_canvas.create_rectangle(0, 0, self._control_canvas_size_px, self._control_canvas_size_px, fill="#FFF0C0", outline="black")
@@ -134,9 +201,47 @@ class MainWindow:
             fill="red", outline="black"
         )
 
+        # Kamerabild
+        self._camera = camera
+
+        if camera:
+            self._camera_canvas = tk.Canvas(vehicle_frame, width=camera.size[0], height=camera.size[1], background="black", highlightthickness=0)
+            self._camera_canvas.grid(row=0, column=7, rowspan=2, padx=(24, 0))
+            self._camera_photo = None
+            self._camera_image = self._camera_canvas.create_image(camera.size[0] / 2, camera.size[1] / 2, anchor=CENTER)
+
+            self._camera_text = tk.StringVar(value="")
+            camera_label = ttk.Label(vehicle_frame, textvariable=self._camera_text)
+            camera_label.grid(row=2, column=7, sticky=(N), padx=(24, 0))
+
+            self._camera_frames  = 0
+            self._camera_delays  = []
+            self._camera_synced  = False
+            self._camera_stats_s = time.monotonic()
+
+        # Verlauf der Fahrzeugparameter
+        self._history = history
+
+        if history:
+            chart_frame = self._create_row_frame(self._root, row=4, text="Verlauf")
+            chart_frame.columnconfigure(0, weight=1)
+
+            self._chart_canvas = tk.Canvas(chart_frame, height=self._CHART_HEIGHT_PX, background="white", highlightthickness=0)
+            self._chart_canvas.grid(row=0, column=0, sticky=(N,E,S,W))
+
+            self._chart_grid   = [self._chart_canvas.create_line(0, 0, 0, 0, fill=color, dash=dash) for color, dash in (("black", ()), ("#C0C0C0", (2, 4)), ("#C0C0C0", (2, 4)))]
+            self._chart_lines  = {}
+            self._chart_drawn  = None
+            self._chart_draw_s = 0.0
+
+            for i, field in enumerate(history.fields):
+                color = self._CHART_COLORS.get(field, "black")
+                self._chart_lines[field] = self._chart_canvas.create_line(0, 0, 0, 0, fill=color, state=HIDDEN)
+                self._chart_canvas.create_text(8 + i * 140, 8, text=field, fill=color, anchor=NW)
+
         # Dummy zum Ausfüllen des Fensters nach unten
-        self._root.rowconfigure(4, weight=1)
-        self._create_row_frame(self._root, row=4)
+        self._root.rowconfigure(5, weight=1)
+        self._create_row_frame(self._root, row=5)
 
         # Rückruffunktionen für die Klasse RemoteConnection registrieren
         self._connection = connection
@@ -145,6 +250,9 @@ class MainWindow:
         connection.on_receive_vehicle_status = self._on_receive_vehicle_status
         connection.on_receive_sensor_status  = self._on_receive_sensor_status
         connection.on_receive_sound_status   = self._on_receive_sound_status
+        connection.on_receive_link_status    = self._on_receive_link_status
+
+        self._root.after(self._REDRAW_INTERVAL_MS, self._redraw)
     
     def _create_row_frame(self, root, row, text="", dark=False):
         """
@@ -177,10 +285,89 @@ class MainWindow:
         """
         if not self._connected:
             remote_ip = self._remote_ip.get()
-            self._connection.connect(remote_ip)
+
+            # Portnummer eines in der Flottenansicht gewählten Fahrzeugs übernehmen, solange
+            # dessen IP-Adresse nicht von Hand geändert wurde
+            if self._fleet_car and self._fleet_car[0] == remote_ip:
+                self._connection.connect(remote_ip, self._fleet_car[1])
+            else:
+                self._connection.connect(remote_ip)
+
+            if self._camera:
+                self._camera.start(remote_ip)
         else:
             self._connection.disconnect()
 
+            if self._camera:
+                self._camera.stop()
+                self._clear_camera_frame()
+
+    def _on_show_fleet(self):
+        """
+        Klick auf den Button zum Öffnen der Flottenansicht.
+        """
+        if not self._fleet_window:
+            self._fleet_window = FleetWindow(self._fleet, self._on_select_car)
+
+        self._fleet_window.show()
+
+    def _on_select_car(self, address):
+        """
+        Steuerung zu einem in der Flottenansicht ausgewählten Fahrzeug mit der Adresse
+        (IP, Port) wechseln. Eine bestehende Verbindung wird vorher getrennt und die neue
+        erst danach hergestellt.
+        """
+        address = tuple(address)
+
+        if not self._connected:
+            self._fleet_car = address
+            self._remote_ip.set(address[0])
+            self._on_toggle_connection()
+        elif address != self._connection.remote_address:
+            self._switch_to = address
+            self._on_toggle_connection()
+
+    def _redraw(self):
+        """
+        Mit fester Bildrate aufgerufene Methode, die den jeweils neuesten empfangenen Stand
+        anzeigt. Unveränderte Stände werden übersprungen.
+        """
+        try:
+            for kind, update in (
+                ("vehicle_status", self._show_vehicle_status),
+                ("sensor_status",  self._show_sensor_status),
+                ("sound_status",   self._show_sound_status),
+                ("link_status",    self._show_link_status),
+            ):
+                try:
+                    value = self._latest.pop(kind)
+                except KeyError:
+                    continue
+
+                update(value)
+
+            if self._camera:
+                self._show_camera_frame()
+
+            if self._history:
+                self._show_charts()
+
+            if self._fleet_window:
+                self._fleet_window.redraw()
+        finally:
+            self._root.after(self._REDRAW_INTERVAL_MS, self._redraw)
+
+    def _set_variable(self, key, variable, value):
+        """
+        Tk-Variable nur dann setzen, wenn sich der angezeigte Wert geändert hat. Jede
+        Zuweisung löst sonst ein Neuzeichnen der damit verbundenen Widgets aus.
+        """
+        if key in self._shown and self._shown[key] == value:
+            return
+
+        self._shown[key] = value
+        variable.set(value)
+
     def _on_connection_change(self, connected):
         """
         Vom Netzwerk-Thread aufgerufene Rückruffunktion zur Aktualisierung des UIs nach
@@ -191,6 +378,8 @@ class MainWindow:
             self._update_connection_widgets()
 
             if not connected:
+                self._latest.clear()
+
                 self._sensor_status = {}
                 self._update_sensor_widgets()
 
@@ -200,8 +389,159 @@ class MainWindow:
                 self._vehicle_status = {}
                 self._update_vehicle_widgets()
 
+                self._set_variable("link", self._link_text, "")
+
+                if self._history:
+                    self._history.clear()
+
+                if self._switch_to:
+                    # Wechsel zu einem anderen Fahrzeug aus der Flottenansicht
+                    self._fleet_car = self._switch_to
+                    self._remote_ip.set(self._switch_to[0])
+                    self._switch_to = None
+                    self._on_toggle_connection()
+
         self._root.after_idle(_in_ui_thread)
 
+    def _on_receive_link_status(self, link_status):
+        """
+        Vom Netzwerk-Thread aufgerufene Rückruffunktion zur Anzeige der gemessenen
+        Paketlaufzeit und Uhrenabweichung.
+        """
+        self._latest["link_status"] = link_status
+
+    def _show_link_status(self, link_status):
+        """
+        Gemessene Paketlaufzeit und Uhrenabweichung anzeigen.
+        """
+        if link_status.get("rtt_smoothed_s") is None:
+            return
+
+        self._set_variable("link", self._link_text, "Laufzeit: {:.1f} ms (±{:.1f} ms)   Uhrenabweichung: {:+.1f} ms".format(
+            link_status["rtt_smoothed_s"] * 1000,
+            link_status["jitter_s"] * 1000,
+            link_status["offset_s"] * 1000,
+        ))
+
+    # ----------
+    # Kamerabild
+    # ----------
+    def _show_camera_frame(self):
+        """
+        Neuestes Kamerabild anzeigen, sofern seit dem letzten Neuzeichnen eines dekodiert wurde.
+        Das vorhandene PhotoImage wird dabei wiederverwendet, solange sich die Bildgröße nicht
+        ändert. Bildrate und Verzögerung werden über einige Bilder gemittelt angezeigt, damit
+        der Text nicht bei jedem Bild neu gezeichnet werden muss.
+        """
+        frame = self._camera.latest()
+        now_s = time.monotonic()
+
+        if frame:
+            image, captured, received = frame
+
+            if self._camera_photo and (self._camera_photo.width(), self._camera_photo.height()) == image.size:
+                self._camera_photo.paste(image)
+            else:
+                self._camera_photo = ImageTk.PhotoImage(image)
+                self._camera_canvas.itemconfigure(self._camera_image, image=self._camera_photo)
+
+            # Verzögerung von der Kamera (Uhr des Fahrzeugs) bzw. vom Empfang bis zur Anzeige
+            offset_s = self._connection.link_status.get("offset_s")
+
+            self._camera_synced = captured is not None and offset_s is not None
+
+            if self._camera_synced:
+                self._camera_delays.append(time.time() + offset_s - captured)
+            else:
+                self._camera_delays.append(time.time() - received)
+
+            self._camera_frames += 1
+
+        if now_s - self._camera_stats_s < self._CAMERA_STATS_INTERVAL_S:
+            return
+
+        if self._camera.error:
+            text = f"Kamera nicht verfügbar: {self._camera.error}"
+        elif self._camera_delays:
+            text = "Kamera: {:.0f} fps   Verzögerung: {:.0f} ms{}   Verworfen: {}".format(
+                self._camera_frames / (now_s - self._camera_stats_s),
+                sum(self._camera_delays) / len(self._camera_delays) * 1000,
+                "" if self._camera_synced else " (ab Empfang)",
+                self._camera.dropped,
+            )
+        elif self._camera_photo:
+            text = "Kamera: 0 fps"
+        else:
+            text = ""
+
+        self._set_variable("camera", self._camera_text, text)
+
+        self._camera_frames  = 0
+        self._camera_delays  = []
+        self._camera_stats_s = now_s
+
+    def _clear_camera_frame(self):
+        """
+        Kamerabild nach dem Trennen der Verbindung entfernen.
+        """
+        self._camera_photo = None
+        self._camera_canvas.itemconfigure(self._camera_image, image="")
+        self._set_variable("camera", self._camera_text, "")
+
+    # -----------------------------
+    # Verlauf der Fahrzeugparameter
+    # -----------------------------
+    def _show_charts(self):
+        """
+        Diagramme mit dem Verlauf der Fahrzeugparameter neu zeichnen, sofern neue Werte
+        vorliegen oder sich die Größe geändert hat, höchstens aber alle `_CHART_INTERVAL_S`
+        Sekunden. Je Fahrzeugparameter wird nur die Koordinatenliste einer vorhandenen Linie
+        ausgetauscht, die in jeder Pixelspalte vom Minimum zum Maximum verläuft.
+        """
+        now_s = time.monotonic()
+
+        if now_s - self._chart_draw_s < self._CHART_INTERVAL_S:
+            return
+
+        width  = self._chart_canvas.winfo_width()
+        height = self._chart_canvas.winfo_height()
+        drawn  = (self._history.count, width, height)
+
+        if drawn == self._chart_drawn:
+            return
+
+        self._chart_drawn  = drawn
+        self._chart_draw_s = now_s
+
+        # Nulllinie und die Linien für ±1
+        margin_px = 24
+        scale_px  = (height - 2 * margin_px) / 2
+
+        for item, value in zip(self._chart_grid, (0.0, 1.0, -1.0)):
+            y = height / 2 - value * scale_px
+            self._chart_canvas.coords(item, 0, y, width, y)
+
+        columns, minimum, maximum = self._history.decimate(width)
+
+        for i, field in enumerate(self._history.fields):
+            item  = self._chart_lines[field]
+            valid = ~np.isnan(minimum[i])
+
+            if not valid.any():
+                self._chart_canvas.itemconfigure(item, state=HIDDEN)
+                continue
+
+            # Je Spalte ein senkrechter Strich vom Minimum zum Maximum
+            x = columns[valid]
+            coords = np.empty(len(x) * 4)
+            coords[0::4] = x
+            coords[1::4] = height / 2 - minimum[i][valid] * scale_px
+            coords[2::4] = x
+            coords[3::4] = height / 2 - maximum[i][valid] * scale_px
+
+            self._chart_canvas.coords(item, coords.tolist())
+            self._chart_canvas.itemconfigure(item, state=NORMAL)
+
     def _update_connection_widgets(self):
         """
         Widgets zur Verbindung mit dem Fahrzeug aktualisieren.
@@ -225,11 +565,17 @@ class MainWindow:
         Vom Netzwerk-Thread aufgerufene Rückruffunktion zur Aktualisierung des UIs nach
         dem Empfang neuer Sensorinformationen.
         """
-        def _in_ui_thread():
-            self._sensor_status = sensor_status
-            self._update_sensor_widgets()
+        self._latest["sensor_status"] = sensor_status
 
-        self._root.after_idle(_in_ui_thread)
+    def _show_sensor_status(self, sensor_status):
+        """
+        Neuen Sensorstatus anzeigen, sofern er sich geändert hat.
+        """
+        if sensor_status == self._sensor_status:
+            return
+
+        self._sensor_status = sensor_status
+        self._update_sensor_widgets()
 
     def _update_sensor_widgets(self):
         """
@@ -285,11 +631,17 @@ class MainWindow:
         Vom Netzwerk-Thread aufgerufene Rückruffunktion zur Aktualisierung des UIs nach
         dem Empfang neuer Statusinformationen des Audioplayers.
         """
-        def _in_ui_thread():
-            self._sound_status = sound_status
-            self._update_sound_widgets()
+        self._latest["sound_status"] = sound_status
 
-        self._root.after_idle(_in_ui_thread)
+    def _show_sound_status(self, sound_status):
+        """
+        Neuen Status des Audioplayers anzeigen, sofern er sich geändert hat.
+        """
+        if sound_status == self._sound_status:
+            return
+
+        self._sound_status = sound_status
+        self._update_sound_widgets()
 
     def _update_sound_widgets(self):
         """
@@ -368,44 +720,89 @@ class MainWindow:
         Vom Netzwerk-Thread aufgerufene Rückruffunktion zur Aktualisierung des UIs nach
         dem Empfang neuer Fahrzeugparameter.
         """
-        def _in_ui_thread():
-            self._vehicle_status = vehicle_status
-            self._update_vehicle_widgets()
+        self._latest["vehicle_status"] = vehicle_status
 
-        self._root.after_idle(_in_ui_thread)
+        if self._history:
+            self._history.add(time.monotonic(), vehicle_status)
+
+    def _show_vehicle_status(self, vehicle_status):
+        """
+        Neue Fahrzeugparameter anzeigen, sofern sie sich geändert haben.
+        """
+        if vehicle_status == self._vehicle_status:
+            return
+
+        self._vehicle_status = vehicle_status
+        self._update_vehicle_widgets()
 
     def _update_vehicle_widgets(self):
         """
-        Widgets für die Fahrzeugdaten aktualisieren.
+        Widgets für die Fahrzeugdaten aktualisieren. Es werden nur die Widgets geändert,
+        deren angezeigter Wert sich geändert hat. Die Schieberegler werden hierfür auf
+        zwei Nachkommastellen gerundet, was ihrer Auflösung am Bildschirm entspricht.
         """
         target_speed = int(self._vehicle_status.get("target_speed", 0) * 100)
-        self._target_speed_value.set(target_speed)
-        self._target_speed_text.set("vorwärts" if target_speed >= 0 else "rückwärts")
+        self._set_variable("target_speed", self._target_speed_value, target_speed)
+        self._set_variable("target_speed_text", self._target_speed_text, "vorwärts" if target_speed >= 0 else "rückwärts")
 
         speed_total = int(self._vehicle_status.get("speed_total", 0) * 100)
-        self._speed_total_value.set(speed_total)
-        self._speed_total_text.set("vorwärts" if speed_total >= 0 else "rückwärts")
+        self._set_variable("speed_total", self._speed_total_value, speed_total)
+        self._set_variable("speed_total_text", self._speed_total_text, "vorwärts" if speed_total >= 0 else "rückwärts")
 
-        self._obstacle_pushback.set(self._vehicle_status.get("obstacle_pushback", 0))
-        self._direction.set(self._vehicle_status.get("direction", 0))
-        self._speed_left.set(self._vehicle_status.get("speed_left", 0))
-        self._speed_right.set(self._vehicle_status.get("speed_right", 0))
+        self._set_variable("obstacle_pushback", self._obstacle_pushback, round(self._vehicle_status.get("obstacle_pushback", 0), 2))
+        self._set_variable("direction", self._direction, round(self._vehicle_status.get("direction", 0), 2))
+        self._set_variable("speed_left", self._speed_left, round(self._vehicle_status.get("speed_left", 0), 2))
+        self._set_variable("speed_right", self._speed_right, round(self._vehicle_status.get("speed_right", 0), 2))
 
         line_pattern = self._vehicle_status.get("line_pattern", [])
         for i in range(len(line_pattern)):
-            self._line_pattern[i].set(line_pattern[i])
+            self._set_variable(f"line_pattern_{i}", self._line_pattern[i], line_pattern[i])
 
     # ------------
     # Steuerfläche
     # ------------
 
+    def _broadcast_control(self):
+        """
+        Prüft, ob die Steuerfläche laut Flottenansicht an alle Fahrzeuge senden soll.
+        """
+        return self._fleet_window is not None and self._fleet_window.broadcast
+
+    def _send_control(self, values, immediate=False):
+        """
+        Steuerwerte an das verbundene Fahrzeug und ggf. an alle Fahrzeuge der Flotte senden.
+        """
+        if self._connected:
+            self._connection.send_control(values, immediate)
+
+        if self._broadcast_control():
+            self._fleet.send_control(values, immediate)
+
     def _on_control_canvas_click(self, event):
         """
-        Fahrzeugparameter bei Klick auf die Steuerfläche ändern.
+        Fahrzeugparameter bei Klick auf die Steuerfläche sofort ändern.
         """
-        if not self._connected:
+        if not self._connected and not self._broadcast_control():
             return
-        
+
+        self._send_control(self._move_control_marker(event), immediate=True)
+
+    def _on_control_canvas_motion(self, event):
+        """
+        Fahrzeugparameter beim Ziehen mit der Maus ändern. Die Maus liefert hierbei deutlich
+        mehr Ereignisse, als sinnvoll gesendet werden können. Die Verbindung merkt sich daher
+        nur den neuesten Wert und sendet ihn mit fester Rate.
+        """
+        if not self._connected and not self._broadcast_control():
+            return
+
+        self._send_control(self._move_control_marker(event))
+
+    def _move_control_marker(self, event):
+        """
+        Markierung auf der Steuerfläche an die Mausposition verschieben und die daraus
+        folgenden Fahrzeugparameter zurückgeben.
+        """
         if event.x < 0:
             event.x = 0
         if event.x > self._control_canvas_size_px:
@@ -427,14 +824,13 @@ class MainWindow:
         target_speed = -1.0 * (event.y - self._control_canvas_size_px / 2) / (self._control_canvas_size_px / 2)
         direction = (event.x - self._control_canvas_size_px / 2) / (self._control_canvas_size_px / 2)
 
-        self._connection.send_set_attribute("target_speed", target_speed)
-        self._connection.send_set_attribute("direction", direction)
+        return {"target_speed": target_speed, "direction": direction}
     
     def _on_control_canvas_release(self, event):
         """
         Fahrzeug stoppen, wenn die Maus losgelassen wird.
         """
-        if not self._connected:
+        if not self._connected and not self._broadcast_control():
             return
         
         self._control_canvas.coords(
@@ -445,8 +841,7 @@ class MainWindow:
             (self._control_canvas_size_px / 2) + self._control_marker_size_px,
         )
 
-        self._connection.send_set_attribute("target_speed", 0.0)
-        self._connection.send_set_attribute("direction", 0.0)
+        self._send_control({"target_speed": 0.0, "direction": 0.0}, immediate=True)
 
     # --------------------
     # Öffentliche Methoden
@@ -0,0 +1,82 @@
+import collections
+
+class LatencyEstimator:
+    """
+    Schätzung der Paketlaufzeit (Round Trip Time) und der Abweichung zwischen der Uhr des
+    Fahrzeugs und der eigenen Uhr nach dem Vorbild von NTP. Hierfür wird regelmäßig ein `ping`
+    mit dem Sendezeitpunkt t0 an das Fahrzeug gesendet. Das Fahrzeug antwortet mit einem `pong`,
+    das zusätzlich den Empfangszeitpunkt t1 und den Sendezeitpunkt t2 nach seiner Uhr enthält.
+    Zusammen mit dem Empfangszeitpunkt t3 des `pong` ergibt sich:
+
+        * Laufzeit:        (t3 - t0) - (t2 - t1)
+        * Uhrenabweichung: ((t1 - t0) + (t2 - t3)) / 2
+
+    Die Uhrenabweichung ist nur genau, wenn Hin- und Rückweg gleich lange dauern. Verzögerungen
+    durch volle Warteschlangen treffen meist nur eine Richtung, weshalb wie bei NTP die Messung
+    mit der kürzesten Laufzeit aus den letzten `window` Messungen verwendet wird. Die geglättete
+    Laufzeit und ihre Schwankung (Jitter) werden wie bei TCP (RFC 6298) berechnet.
+    """
+
+    def __init__(self, window=16, alpha=0.125, beta=0.25):
+        """
+        Konstruktor. Parameter:
+            * window: Anzahl der Messungen für die Schätzung der Uhrenabweichung
+            * alpha: Glättungsfaktor für die Laufzeit
+            * beta: Glättungsfaktor für die Schwankung der Laufzeit
+        """
+        self._samples = collections.deque(maxlen=window)
+        self._alpha   = alpha
+        self._beta    = beta
+
+        self.reset()
+
+    def reset(self):
+        """
+        Alle Messungen verwerfen, z.B. nach einem Verbindungsabbruch.
+        """
+        self._samples.clear()
+
+        self.count          = 0
+        self.rtt_s          = None
+        self.rtt_smoothed_s = None
+        self.rtt_min_s      = None
+        self.jitter_s       = None
+        self.offset_s       = None
+
+    def add(self, t0, t1, t2, t3):
+        """
+        Neue Messung hinzufügen. Parameter:
+            * t0: Sendezeitpunkt des `ping` (eigene Uhr)
+            * t1: Empfangszeitpunkt des `ping` (Uhr des Fahrzeugs)
+            * t2: Sendezeitpunkt des `pong` (Uhr des Fahrzeugs)
+            * t3: Empfangszeitpunkt des `pong` (eigene Uhr)
+        """
+        rtt_s    = max((t3 - t0) - (t2 - t1), 0.0)
+        offset_s = ((t1 - t0) + (t2 - t3)) / 2
+
+        if self.rtt_smoothed_s is None:
+            self.rtt_smoothed_s = rtt_s
+            self.jitter_s       = rtt_s / 2
+        else:
+            self.jitter_s       = (1 - self._beta) * self.jitter_s + self._beta * abs(self.rtt_smoothed_s - rtt_s)
+            self.rtt_smoothed_s = (1 - self._alpha) * self.rtt_smoothed_s + self._alpha * rtt_s
+
+        self._samples.append((rtt_s, offset_s))
+
+        self.count    += 1
+        self.rtt_s     = rtt_s
+        self.rtt_min_s = min(self._samples)[0]
+        self.offset_s  = min(self._samples)[1]
+
+    def as_dict(self):
+        """
+        Aktuelle Schätzung als Dictionary, z.B. für die Anzeige im UI.
+        """
+        return {
+            "count":          self.count,
+            "rtt_s":          self.rtt_s,
+            "rtt_smoothed_s": self.rtt_smoothed_s,
+            "rtt_min_s":      self.rtt_min_s,
+            "jitter_s":       self.jitter_s,
+            "offset_s":       self.offset_s,
+        }
@@ -1,5 +1,8 @@
+from carbot_rc.camera import CameraStream
+from carbot_rc.fleet import FleetConnection
 from carbot_rc.gui import MainWindow
 from carbot_rc.remote import RemoteConnection
+from carbot_rc.telemetry import TelemetryHistory
 
 def main():
     """
@@ -8,6 +11,9 @@ def main():
     """
     print("carbot_rc sagt Hallo!")
 
-    connection = RemoteConnection(host="", port=6789, remote_port=9876, update_frequency=10)
-    window = MainWindow(connection)
+    connection = RemoteConnection(host="", port=6789, remote_port=9876, update_frequency=50, control_rate=50)
+    camera = CameraStream(size=(320, 240), port=8000)
+    history = TelemetryHistory(seconds=30, rate=50)
+    fleet = FleetConnection(remote_port=9876, update_frequency=10)
+    window = MainWindow(connection, camera, history, fleet)
     window.mainloop()
\ No newline at end of file
@@ -1,4 +1,7 @@
-import collections, errno, json, socket, threading, time, traceback
+import collections, errno, selectors, socket, threading, time, traceback
+from carbot_rc import protocol
+from carbot_rc.latency import LatencyEstimator
+from carbot_rc.status import StatusAssembler
 
 class RemoteConnection:
     """
@@ -25,17 +28,64 @@ class RemoteConnection:
         Wird beim Empfang neuer Statusinformationen des Audioplayers aufgerufen, um das UI
         zu aktualisieren. sound_status ist ein Dictionary mit den beiden Attributen soundfiles
         und playing. Beide beinhalten jeweils eine Liste mit den Namen der Audiodateien.
+
+      * on_receive_link_status(link_status):
+        Wird nach jeder Laufzeitmessung aufgerufen. link_status ist ein Dictionary mit der
+        gemessenen Paketlaufzeit und der Uhrenabweichung zum Fahrzeug, siehe `LatencyEstimator`.
+
+    Nach dem Verbinden wird mit dem Fahrzeug das Nachrichtenformat ausgehandelt. Unterstützt
+    das Fahrzeug das Binärformat aus `protocol.py`, wird dieses verwendet, ansonsten JSON.
+
+    Anschließend wird der Status mit `subscribe` beim Fahrzeug abonniert. Das Fahrzeug sendet
+    dann von sich aus nur noch die geänderten Werte, die hier wieder zum vollständigen Status
+    zusammengesetzt werden. Die Rückruffunktionen werden dabei nur für die Teile des Status
+    aufgerufen, die sich tatsächlich geändert haben. Treffen kurz nach dem Abonnieren keine
+    Aktualisierungen ein (z.B. bei älteren Fahrzeugprogrammen) oder bleiben sie aus, wird der
+    Status wie bisher periodisch abgefragt.
+
+    Versteht das Fahrzeug Batches (Eintrag `batch` in `features` der `hello_response`), werden
+    alle innerhalb eines Durchlaufs anfallenden Befehle gemeinsam in einem einzigen Datagramm
+    gesendet. Mit `send_set_attributes()` gleichzeitig geänderte Fahrzeugparameter werden vom
+    Fahrzeug dann garantiert im selben Takt übernommen.
+
+    Für die laufende Steuerung, z.B. mit der Maus, ist `send_control()` gedacht. Dabei wird
+    nur der jeweils neueste Wert gemerkt und mit höchstens `control_rate` Nachrichten je
+    Sekunde gesendet, egal wie oft das UI neue Werte liefert. Auf Wunsch wird ein Wert
+    sofort gesendet (z.B. beim Loslassen der Maustaste), wofür der Netzwerk-Thread über ein
+    Socket-Paar aus dem Selector geweckt wird.
+
+    Zur Messung der Paketlaufzeit wird regelmäßig ein `ping` gesendet. Diese dienen dem
+    Fahrzeug zugleich als Lebenszeichen für seinen Totmannschalter, so dass es auch dann
+    weiterfährt, wenn das UI gerade keine Befehle sendet.
     """
 
     _BUFFER_SIZE = 4096
+
+    # Anzahl der Versuche, das Binärformat auszuhandeln, bevor bei JSON geblieben wird
+    _HELLO_ATTEMPTS = 5
+
+    # Erneutes Abonnieren, wenn so lange keine Aktualisierung eingetroffen ist
+    _RESUBSCRIBE_S = 2.5
+
+    # Status abfragen, wenn so lange nach dem ersten Abonnieren keine Aktualisierung
+    # eingetroffen ist, z.B. bei älteren Fahrzeugprogrammen ohne Abonnements
+    _POLL_AFTER_S = 0.5
+
+    # Maximale Anzahl Befehle je Batch, damit ein Batch in ein Datagramm passt
+    _MAX_BATCH_OPS = 32
+
+    # Abstand der Laufzeitmessungen. Muss deutlich kürzer als der Totmannschalter sein.
+    _PING_INTERVAL_S = 0.25
     
-    def __init__(self, host, port, remote_port, update_frequency):
+    def __init__(self, host, port, remote_port, update_frequency, control_rate=50):
         """
         Konstruktor. Parameter:
             * host: Hostname, an den der UDP-Socket gebunden wird
             * port: Portnummer, an den der UDP-Socket gebunden wird
-            * remote_port: Portnummer des UDP-Sockets auf dem Fahrzeug
-            * update_frequency: Anzahl angefragter Aktualisierungen je Sekunde
+            * remote_port: Portnummer des UDP-Sockets auf dem Fahrzeug, sofern bei `connect()`
+              keine andere angegeben wird
+            * update_frequency: Anzahl angefragter bzw. abonnierter Aktualisierungen je Sekunde
+            * control_rate: Maximale Anzahl gesendeter Steuerwerte je Sekunde, siehe `send_control()`
         
         Wird für `host` ein leerer String übergeben, lauscht der UDP-Socket auf allen Adressen und
         allen Netzwerkschnittstellen.
@@ -44,25 +94,59 @@ class RemoteConnection:
         self.on_receive_vehicle_status = None
         self.on_receive_sensor_status  = None
         self.on_receive_sound_status   = None
+        self.on_receive_link_status    = None
 
         self._host             = host or None
         self._port             = port
         self._connected        = False
         self._remote_ip        = None
         self._remote_port      = remote_port
-        self._timeout_s        = 1.0 / update_frequency
+        self._default_port     = remote_port
+        self._update_frequency = update_frequency
+        self._send_period_s    = 1.0 / update_frequency
         self._pending_commands = collections.deque()
+        self._protocol         = protocol.JSON
+        self._sequence         = 0
+        self._status           = StatusAssembler()
+        self._latency          = LatencyEstimator()
+
+        # Neueste Steuerwerte des UI, siehe send_control()
+        self._control_period_s  = 1.0 / control_rate
+        self._control_lock      = threading.Lock()
+        self._control           = None
+        self._control_immediate = False
+
+        # Socket-Paar zum Aufwecken des Netzwerk-Threads
+        self._wakeup_receive, self._wakeup_send = socket.socketpair()
+        self._wakeup_receive.setblocking(False)
+        self._wakeup_send.setblocking(False)
 
-    def connect(self, remote_ip):
+    @property
+    def link_status(self):
+        """
+        Aktuelle Schätzung der Paketlaufzeit und der Uhrenabweichung zum Fahrzeug.
+        """
+        return self._latency.as_dict()
+
+    @property
+    def remote_address(self):
+        """
+        Adresse (IP, Port) des zuletzt verbundenen Fahrzeugs.
+        """
+        return (self._remote_ip, self._remote_port)
+
+    def connect(self, remote_ip, remote_port=None):
         """
         Vom UI-Thread aufgerufene Methode, um eine Verbindung mit dem Fahrzeug herzustellen.
         Startet lediglich den Netzwerk-Thread mit der eigentlichen Verbindungslogik, sofern
-        dieser nicht sowieso schon läuft.
+        dieser nicht sowieso schon läuft. Ohne `remote_port` wird die im Konstruktor
+        angegebene Portnummer verwendet.
         """
         if self._connected:
             return
 
-        self._remote_ip = remote_ip
+        self._remote_ip   = remote_ip
+        self._remote_port = remote_port or self._default_port
 
         network_thread   = threading.Thread(target=self._network_thread_loop)
         network_thread.setDaemon(True)
@@ -79,12 +163,51 @@ class RemoteConnection:
         
         self._pending_commands.append({"cmd": "_disconnect"})
 
+    def _wake(self):
+        """
+        Netzwerk-Thread aufwecken, damit er ohne Verzögerung sendet.
+        """
+        try:
+            self._wakeup_send.send(b"\0")
+        except OSError:
+            # Puffer voll: Der Thread wird ohnehin geweckt
+            pass
+
     def send_set_attribute(self, attribute, value):
         """
         Vom UI-Thread aufgerufene Methode, um einen Fahrzeugparameter zu ändern.
         """
         self._pending_commands.append({"cmd": "set", "attr": attribute, "value": value})
 
+    def send_set_attributes(self, values):
+        """
+        Vom UI-Thread aufgerufene Methode, um mehrere Fahrzeugparameter gleichzeitig zu ändern.
+        `values` ist ein Dictionary mit den Parameternamen und ihren neuen Werten. Die Änderungen
+        werden als ein Batch gesendet und vom Fahrzeug im selben Takt übernommen.
+        """
+        self._pending_commands.append({
+            "cmd": "batch",
+            "ops": [{"cmd": "set", "attr": attribute, "value": value} for attribute, value in values.items()],
+        })
+
+    def send_control(self, values, immediate=False):
+        """
+        Vom UI-Thread aufgerufene Methode, um laufend Fahrzeugparameter zu ändern, z.B. beim
+        Ziehen mit der Maus. `values` ist ein Dictionary mit den Parameternamen und ihren neuen
+        Werten. Es wird immer nur der neueste Wert gemerkt und höchstens mit `control_rate`
+        Nachrichten je Sekunde als Batch gesendet. Mit `immediate` wird der Wert sofort
+        gesendet, z.B. beim Drücken und Loslassen der Maustaste, damit das Fahrzeug ohne
+        Verzögerung anfährt und anhält.
+        """
+        with self._control_lock:
+            wake = self._control is None or immediate
+
+            self._control           = values
+            self._control_immediate = self._control_immediate or immediate
+
+        if wake:
+            self._wake()
+
     def send_enable_sensor(self, name, enabled):
         """
         Vom UI-Thread aufgerufene Methode, um einen Sensor ein- oder auszuschalten.
@@ -102,8 +225,12 @@ class RemoteConnection:
 
     def _network_thread_loop(self):
         """
-        Hauptschleife des Netzwerk-Threads. Sendet periodisch eine Statusanfrage an das Fahrzeug
-        und verarbeitet die daraufhin empfangenen Antworten.
+        Hauptschleife des Netzwerk-Threads. Wartet mit einem Selector, bis entweder Daten vom
+        Fahrzeug eintreffen oder der nächste Sendezeitpunkt erreicht ist. Eingetroffene Daten
+        werden vollständig abgeholt, an das UI wird aber je Art nur die neueste Nachricht
+        weitergereicht. So zeigt das UI immer den aktuellen Stand, auch wenn es mit dem
+        Verarbeiten nicht hinterherkommt. Im Takt von `update_frequency` werden die
+        Statusanfragen und die vom UI vorgemerkten Befehle gesendet.
         """
         # Sockets öffnen sowohl für IPv6 als auch IPv4
         sockets = []
@@ -138,70 +265,234 @@ class RemoteConnection:
         self._connected = True
         self.on_connection_change(self._connected) if self.on_connection_change else None
 
+        # Bis zur erfolgreichen Aushandlung JSON verwenden
+        self._protocol = protocol.JSON
+        hello_attempts = 0
+        negotiated     = False
+        batch          = False
+        reassembler    = protocol.Reassembler()
+
+        # Status abonnieren, sobald das Nachrichtenformat feststeht
+        self._status.reset()
+        last_update_s     = None
+        last_subscribe_s  = None
+        first_subscribe_s = None
+        last_ping_s       = None
+        self._latency.reset()
+
         def _sendto(address, command):
-            bytes = json.dumps(command).encode()
+            # Fortlaufende Sequenznummer, damit das Fahrzeug verspätete Befehle erkennt
+            self._sequence = (self._sequence + 1) & 0xFFFFFFFF
+            command = dict(command, seq=self._sequence)
+
+            for datagram in protocol.encode(command, self._protocol):
+                for socket_ in sockets:
+                    try:
+                        socket_.sendto(datagram, address)
+                    except Exception:
+                        continue
+
+        def _flush(address, commands):
+            # Alle Befehle eines Durchlaufs möglichst gemeinsam in einem Datagramm senden
+            ops = []
+
+            for command in commands:
+                if command.get("cmd") == "batch":
+                    if not batch:
+                        # Fahrzeug versteht keine Batches: Befehle einzeln senden
+                        for op in command.get("ops", []):
+                            _sendto(address, op)
 
-            for socket_ in sockets:
+                        continue
+
+                    ops.extend(command.get("ops", []))
+                else:
+                    ops.append(command)
+
+            if not batch:
+                for op in ops:
+                    _sendto(address, op)
+
+                return
+
+            for start in range(0, len(ops), self._MAX_BATCH_OPS):
+                chunk = ops[start:start + self._MAX_BATCH_OPS]
+                _sendto(address, chunk[0] if len(chunk) == 1 else {"cmd": "batch", "ops": chunk})
+
+        def _receive(socket_, latest):
+            # Alle bis jetzt eingetroffenen Datagramme abholen. Antworten werden dabei nur in
+            # `latest` gesammelt, so dass ältere Nachrichten von neueren überschrieben werden.
+            nonlocal negotiated, batch, last_update_s
+
+            while True:
                 try:
-                    socket_.sendto(bytes, address)
-                except Exception:
-                    continue
+                    data, address = socket_.recvfrom(self._BUFFER_SIZE)
+                    received_s = time.time()
+                    command = reassembler.add(data, address)
+
+                    if not command or not "cmd" in command:
+                        continue
+
+                    if command["cmd"] == "hello_response":
+                        # Nachrichtenformat ausgehandelt
+                        negotiated = True
+                        batch      = "batch" in (command.get("features") or [])
+
+                        if command.get("protocol") == protocol.BINARY and command.get("version") == protocol.VERSION:
+                            self._protocol = protocol.BINARY
+                    elif command["cmd"] == "pong":
+                        # Antwort auf die Laufzeitmessung mit dem tatsächlichen Empfangszeitpunkt
+                        self._latency.add(command.get("t0", 0.0), command.get("t1", 0.0), command.get("t2", 0.0), received_s)
+                        latest["link_status"] = True
+                    elif command["cmd"] == "status_update" and "data" in command:
+                        # Abonnierte Aktualisierungen müssen alle angewendet werden, da sie
+                        # aufeinander aufbauen. Bestätigt wird nur die neueste.
+                        last_update_s = time.monotonic()
+
+                        for kind in self._status.apply(command):
+                            latest[kind] = None
+
+                        latest["ack"] = max(latest.get("ack", 0), command.get("frame", 0))
+                    elif command["cmd"] in ("vehicle_status_response", "sensor_status_response", "sound_status_response") \
+                    and "data" in command:
+                        latest[command["cmd"][:-len("_response")]] = command["data"]
+                except OSError as err:
+                    if err.errno == errno.EAGAIN or err.errno == errno.EWOULDBLOCK:
+                        break
+                    else:
+                        print(f"Socket-Fehler: {err}")
+                        traceback.print_exc()
+                        break
+                except Exception as exc:
+                    print(f"Fehler im Netzwerk-Thread: {exc}")
+                    traceback.print_exc()
+
+        selector = selectors.DefaultSelector()
+
+        for socket_ in sockets:
+            selector.register(socket_, selectors.EVENT_READ)
+
+        selector.register(self._wakeup_receive, selectors.EVENT_READ)
+
+        next_send_s    = time.monotonic()
+        next_control_s = next_send_s
+
+        with self._control_lock:
+            self._control           = None
+            self._control_immediate = False
 
         while self._connected:
-            ## FIXME: Prüfen
-            # Kleine Pause zur Entlastung der CPU
-            time.sleep(self._timeout_s)
+            remote_address = (self._remote_ip, self._remote_port)
+
+            # Warten, bis Daten eintreffen oder die nächste Anfrage fällig ist. Eingetroffene
+            # Antworten werden so ohne Verzögerung verarbeitet und stauen sich nicht im Socket.
+            latest    = {}
+            timeout_s = next_send_s - time.monotonic()
+
+            if self._control is not None:
+                timeout_s = min(timeout_s, next_control_s - time.monotonic())
+
+            for key, _ in selector.select(max(timeout_s, 0.0)):
+                if key.fileobj is self._wakeup_receive:
+                    try:
+                        while self._wakeup_receive.recv(64):
+                            pass
+                    except OSError:
+                        pass
+                else:
+                    _receive(key.fileobj, latest)
+
+            if "ack" in latest:
+                _sendto(remote_address, {"cmd": "ack", "frame": latest["ack"]})
+
+            # Jeweils nur den neuesten Stand an das UI weiterreichen
+            for kind, callback in (
+                ("vehicle_status", self.on_receive_vehicle_status),
+                ("sensor_status",  self.on_receive_sensor_status),
+                ("sound_status",   self.on_receive_sound_status),
+            ):
+                if kind in latest and callback:
+                    callback(latest[kind] if latest[kind] is not None else self._status.part(kind))
+
+            if "link_status" in latest and self.on_receive_link_status:
+                self.on_receive_link_status(self._latency.as_dict())
+
+            now_s = time.monotonic()
+
+            # Neueste Steuerwerte senden, sofern fällig oder sofort gewünscht
+            with self._control_lock:
+                control = self._control
+
+                if control is not None and (self._control_immediate or now_s >= next_control_s):
+                    self._control           = None
+                    self._control_immediate = False
+                else:
+                    control = None
+
+            if control is not None:
+                next_control_s = now_s + self._control_period_s
+                _flush(remote_address, [{
+                    "cmd": "batch",
+                    "ops": [{"cmd": "set", "attr": attribute, "value": value} for attribute, value in control.items()],
+                }])
+
+            if now_s < next_send_s:
+                continue
+
+            next_send_s += self._send_period_s
+
+            if next_send_s < now_s:
+                # Nach einer längeren Pause nicht nachholen, sondern neu takten
+                next_send_s = now_s + self._send_period_s
 
             # Statusanfragen und vom UI vorgemerkte Befehle an das Fahrzeug senden
-            remote_address = (self._remote_ip, self._remote_port)
+            if not negotiated and hello_attempts < self._HELLO_ATTEMPTS:
+                hello_attempts += 1
+                _sendto(remote_address, {"cmd": "hello", "protocols": [protocol.BINARY, protocol.JSON], "version": protocol.VERSION})
+
+            subscribed = last_update_s is not None and now_s - last_update_s < self._RESUBSCRIBE_S
+            outgoing = []
 
-            _sendto(remote_address, {"cmd": "vehicle_status"})
-            _sendto(remote_address, {"cmd": "sensor_status"})
-            _sendto(remote_address, {"cmd": "sound_status"})
+            if not subscribed:
+                if (negotiated or hello_attempts >= self._HELLO_ATTEMPTS) \
+                and (last_subscribe_s is None or now_s - last_subscribe_s >= self._RESUBSCRIBE_S):
+                    last_subscribe_s  = now_s
+                    first_subscribe_s = first_subscribe_s or now_s
+                    outgoing.append({"cmd": "subscribe", "rate": self._update_frequency})
 
+                # Nur abfragen, wenn das Fahrzeug keine Aktualisierungen sendet
+                if first_subscribe_s is not None and now_s - first_subscribe_s >= self._POLL_AFTER_S:
+                    outgoing.append({"cmd": "vehicle_status"})
+                    outgoing.append({"cmd": "sensor_status"})
+                    outgoing.append({"cmd": "sound_status"})
+
+            if last_ping_s is None or now_s - last_ping_s >= self._PING_INTERVAL_S:
+                # Laufzeit messen und die letzte Schätzung an das Fahrzeug melden
+                last_ping_s = now_s
+                outgoing.append({
+                    "cmd":      "ping",
+                    "t0":       time.time(),
+                    "rtt_s":    self._latency.rtt_smoothed_s,
+                    "offset_s": self._latency.offset_s,
+                })
+
+            # Befehle in der Reihenfolge senden, in der sie vom UI vorgemerkt wurden
             while True:
                 try:
-                    command = self._pending_commands.pop()
+                    command = self._pending_commands.popleft()
                 except IndexError:
                     break
                 
                 if command.get("cmd", "") == "_disconnect":
                     self._connected = False
+                    outgoing.append({"cmd": "unsubscribe"})
                     continue
                 
-                _sendto(remote_address, command)
-
-            # Antworten vom Fahrzeug empfangen und verarbeiten
-            for socket_ in sockets:
-                try:
-                    # Neue Daten vom Socket empfangen und verarbeiten
-                    data = socket_.recv(self._BUFFER_SIZE)
-                    command = json.loads(data.decode())
+                outgoing.append(command)
 
-                    if not "cmd" in command or not "data" in command:
-                        continue
+            _flush(remote_address, outgoing)
 
-                    if command["cmd"] == "vehicle_status_response":
-                        # Neue Fahrzeugparameter empfangen
-                        if self.on_receive_vehicle_status:
-                            self.on_receive_vehicle_status(command["data"])
-                    elif command["cmd"] == "sensor_status_response":
-                        # Neue Sensorinformationen empfangen
-                        if self.on_receive_sensor_status:
-                            self.on_receive_sensor_status(command["data"])
-                    elif command["cmd"] == "sound_status_response":
-                        # Neuer Soundstatus empfangen
-                        if self.on_receive_sound_status:
-                            self.on_receive_sound_status(command["data"])
-                except OSError as err:
-                    if err.errno == errno.EAGAIN or err.errno == errno.EWOULDBLOCK:
-                        continue
-                    else:
-                        print(f"Socket-Fehler: {err}")
-                        traceback.print_exc()
-                except Exception as exc:
-                    print(f"Fehler im Netzwerk-Thread: {exc}")
-                    traceback.print_exc()
+        selector.close()
 
         for socket_ in sockets:
             try:
@@ -210,4 +501,4 @@ class RemoteConnection:
                 print(f"Socket-Fehler: {exc}")
                 traceback.print_exc()
 
-        self.on_connection_change(self._connected) if self.on_connection_change else None
\ No newline at end of file
+        self.on_connection_change(self._connected) if self.on_connection_change else None
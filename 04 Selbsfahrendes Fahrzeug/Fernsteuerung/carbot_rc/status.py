@@ -0,0 +1,85 @@
+from carbot_rc import protocol
+
+class StatusAssembler:
+    """
+    Setzt die abonnierten `status_update`-Nachrichten eines Fahrzeugs wieder zum vollständigen
+    Status zusammen. Jede Nachricht enthält nur die Änderungen gegenüber dem Stand `base`, der
+    vom Client zuletzt bestätigt wurde, oder bei `base` = 0 den vollständigen Status (Keyframe).
+    Hierfür werden die letzten Stände gemerkt, bis das Fahrzeug sie nicht mehr benötigt.
+    """
+
+    # Maximale Anzahl gemerkter Stände für die Anwendung von Änderungen
+    _MAX_FRAMES = 64
+
+    def __init__(self):
+        """
+        Konstruktor.
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Alle Stände verwerfen, z.B. beim Herstellen einer neuen Verbindung.
+        """
+        self._frames = {}
+        self.frame   = 0
+        self.status  = {}
+
+    def apply(self, command):
+        """
+        Empfangene `status_update`-Nachricht auf den zuletzt bestätigten Stand anwenden.
+        Gibt die Namen der geänderten Teile des Status zurück (`vehicle_status`,
+        `sensor_status` und `sound_status`), deren neuer Inhalt anschließend mit
+        `part()` abgefragt werden kann.
+        """
+        frame = command.get("frame", 0)
+        base  = command.get("base", 0)
+        data  = command["data"]
+
+        if base == 0:
+            # Keyframe mit vollständigem Status
+            status = dict(data)
+        elif base in self._frames:
+            status = dict(self._frames[base])
+            status.update(data)
+        else:
+            # Bezugsstand unbekannt: Auf den nächsten Keyframe warten
+            return ()
+
+        # Ältere Stände als der Bezugsstand werden nicht mehr benötigt
+        self._frames[frame] = status
+
+        for old_frame in [old_frame for old_frame in self._frames if old_frame < base]:
+            del self._frames[old_frame]
+
+        while len(self._frames) > self._MAX_FRAMES:
+            del self._frames[min(self._frames)]
+
+        # Verspätet eingetroffene, ältere Aktualisierungen nicht mehr anzeigen
+        if frame <= self.frame and base != 0:
+            return ()
+
+        self.frame  = frame
+        self.status = status
+        changed     = []
+
+        if any(field in data for field in protocol.VEHICLE_FIELDS):
+            changed.append("vehicle_status")
+
+        if "sensor_status" in data:
+            changed.append("sensor_status")
+
+        if "sound_status" in data:
+            changed.append("sound_status")
+
+        return changed
+
+    def part(self, kind):
+        """
+        Gibt einen Teil des zuletzt zusammengesetzten Status im Format der dazugehörigen
+        Antwort (`vehicle_status_response` usw.) zurück.
+        """
+        if kind == "vehicle_status":
+            return {field: self.status[field] for field in protocol.VEHICLE_FIELDS if field in self.status}
+
+        return self.status.get(kind, {})
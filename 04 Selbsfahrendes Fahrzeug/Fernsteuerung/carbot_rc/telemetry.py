@@ -0,0 +1,109 @@
+import threading
+import numpy as np
+
+class TelemetryHistory:
+    """
+    Verlauf der Fahrzeugparameter für die Diagramme im Hauptfenster. Die Werte werden in
+    vorab angelegten NumPy-Arrays als Ringpuffer gespeichert. Ist der Puffer voll, werden die
+    ältesten Werte überschrieben. Der Speicherbedarf bleibt somit konstant, egal wie lange
+    die Fernsteuerung läuft.
+
+    Zum Zeichnen werden die Werte mit `decimate()` auf die Breite des Diagramms in Pixeln
+    reduziert. Je Pixelspalte bleiben dabei nur der kleinste und der größte Wert übrig, so dass
+    auch kurze Ausschläge (z.B. ein Schwingen der Lenkung) sichtbar bleiben. Der Aufwand zum
+    Zeichnen hängt dadurch nur noch von der Breite des Diagramms und nicht von der Anzahl der
+    gespeicherten Werte ab.
+
+    Neue Werte werden vom Netzwerk-Thread hinzugefügt, die Diagramme vom UI-Thread gezeichnet.
+    Die Zugriffe sind daher mit einem Lock geschützt.
+    """
+
+    # Aufgezeichnete Fahrzeugparameter
+    FIELDS = ("target_speed", "obstacle_pushback", "direction", "speed_total", "speed_left", "speed_right")
+
+    def __init__(self, seconds=30, rate=50, fields=FIELDS):
+        """
+        Konstruktor. Parameter:
+            * seconds: Dauer des angezeigten Verlaufs in Sekunden
+            * rate: Erwartete Anzahl Werte je Sekunde, bestimmt die Größe des Ringpuffers
+            * fields: Namen der aufgezeichneten Fahrzeugparameter
+        """
+        self.seconds = seconds
+        self.fields  = tuple(fields)
+        self.count   = 0
+
+        self._capacity = int(seconds * rate)
+        self._times    = np.zeros(self._capacity)
+        self._values   = np.full((len(self.fields), self._capacity), np.nan)
+        self._index    = {field: i for i, field in enumerate(self.fields)}
+        self._lock     = threading.Lock()
+
+    def clear(self):
+        """
+        Alle Werte verwerfen, z.B. nach dem Trennen der Verbindung.
+        """
+        with self._lock:
+            self.count = 0
+            self._values.fill(np.nan)
+
+    def add(self, time_s, vehicle_status):
+        """
+        Neue Fahrzeugparameter hinzufügen. Parameter:
+            * time_s: Empfangszeitpunkt (time.monotonic)
+            * vehicle_status: Dictionary mit den Fahrzeugparametern. Fehlende oder nicht
+              numerische Einträge werden als NaN gespeichert.
+        """
+        with self._lock:
+            position = self.count % self._capacity
+            column   = self._values[:, position]
+
+            self._times[position] = time_s
+            column.fill(np.nan)
+
+            for field, value in vehicle_status.items():
+                try:
+                    column[self._index[field]] = value
+                except (KeyError, TypeError, ValueError):
+                    pass
+
+            self.count += 1
+
+    def decimate(self, width):
+        """
+        Verlauf der letzten `seconds` Sekunden bis zum neuesten Wert auf `width` Pixelspalten
+        reduzieren. Gibt ein Tupel aus drei Arrays zurück:
+
+            * Pixelspalten, in denen mindestens ein Wert liegt (aufsteigend)
+            * Kleinster Wert je Spalte und Fahrzeugparameter (Zeilen wie `fields`)
+            * Größter Wert je Spalte und Fahrzeugparameter
+
+        Ist noch kein Wert vorhanden, sind alle Arrays leer.
+        """
+        with self._lock:
+            size = min(self.count, self._capacity)
+
+            if self.count <= self._capacity:
+                times  = self._times[:size].copy()
+                values = self._values[:, :size].copy()
+            else:
+                # Ringpuffer ab dem ältesten Wert auslesen
+                position = self.count % self._capacity
+                times  = np.concatenate((self._times[position:], self._times[:position]))
+                values = np.concatenate((self._values[:, position:], self._values[:, :position]), axis=1)
+
+        if not size or width < 1:
+            return np.empty(0, dtype=int), np.empty((len(self.fields), 0)), np.empty((len(self.fields), 0))
+
+        # Pixelspalte je Wert, ältere Werte als `seconds` fallen heraus
+        columns = ((times - (times[-1] - self.seconds)) / self.seconds * (width - 1)).astype(int)
+        visible = columns >= 0
+        columns = columns[visible]
+        values  = values[:, visible]
+
+        # Da die Zeitpunkte aufsteigen, bilden die Werte je Spalte zusammenhängende Abschnitte
+        starts = np.flatnonzero(np.diff(columns, prepend=-1))
+
+        minimum = np.fmin.reduceat(values, starts, axis=1)
+        maximum = np.fmax.reduceat(values, starts, axis=1)
+
+        return columns[starts], minimum, maximum